@@ -0,0 +1,46 @@
+# shared fixtures for the benchmark suite
+#
+# Sizes run from 10k events up to ECP_BENCH_MAX_EVENTS (default 100k, since
+# the per-pixel loops in some filters take minutes at 1M events). Use
+# ECP_BENCH_MAX_EVENTS=10000000 to record the full scaling curves.
+
+import os
+from functools import cache
+
+import pytest
+
+from eventcamprocessing.synthetic import synthetic_events, synthetic_particles
+
+ALL_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+MAX_EVENTS = int(os.environ.get("ECP_BENCH_MAX_EVENTS", 100_000))
+EVENT_SIZES = [n for n in ALL_SIZES if n <= MAX_EVENTS]
+EVENT_RATE = float(os.environ.get("ECP_BENCH_EVENT_RATE", 10e6))
+
+
+@cache
+def events_of_size(n_events):
+    return synthetic_events(n_events, event_rate=EVENT_RATE)
+
+
+@cache
+def particles_of_size(n_events):
+    # 1 detection per 10 events, 100 detections per tracker step
+    n_particles = n_events // 10
+    return synthetic_particles(n_steps=n_particles // 100, particles_per_step=100)
+
+
+@pytest.fixture(params=EVENT_SIZES, ids=lambda n: f"{n}ev")
+def n_events(request):
+    return request.param
+
+
+def run_benchmark(benchmark, func, *args, n_events, **kwargs):
+    """
+    Time func(*args, **kwargs), recording n_events for the scaling curves.
+    Large inputs are only run once per benchmark.
+    """
+    benchmark.extra_info["n_events"] = n_events
+    rounds = 5 if n_events <= 100_000 else 1
+    return benchmark.pedantic(
+        func, args=args, kwargs=kwargs, rounds=rounds, iterations=1, warmup_rounds=0
+    )
@@ -0,0 +1,71 @@
+"""
+Turn a pytest-benchmark JSON report into scaling curves.
+
+Writes one CSV row per (function, n_events) with the mean and minimum time,
+and prints the fitted log-log slope for each function, i.e. the exponent k in
+time ~ n_events**k.
+
+To run this script:
+    uv run --group bench pytest benchmarks --benchmark-json=.benchmarks/latest.json
+    uv run python benchmarks/scaling_curves.py .benchmarks/latest.json -o scaling.csv
+"""
+
+import argparse
+import csv
+import json
+from collections import defaultdict
+
+import numpy as np
+
+
+def scaling_rows(report):
+    """extract (function, n_events, mean_s, min_s) rows from a report"""
+    rows = []
+    for bench in report["benchmarks"]:
+        name = bench["name"].split("[")[0].removeprefix("test_")
+        rows.append(
+            (
+                name,
+                bench["extra_info"]["n_events"],
+                bench["stats"]["mean"],
+                bench["stats"]["min"],
+            )
+        )
+    return sorted(rows)
+
+
+def fit_exponents(rows):
+    """fit time ~ n**k for every function with at least two sizes"""
+    curves = defaultdict(list)
+    for name, n, mean_s, _ in rows:
+        if n > 0:  # e.g. import-time benchmarks have no event count
+            curves[name].append((n, mean_s))
+    exponents = {}
+    for name, points in curves.items():
+        if len(points) < 2:
+            continue
+        n, t = np.log(np.array(points, dtype=float)).T
+        exponents[name] = float(np.polyfit(n, t, 1)[0])
+    return exponents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("report", help="pytest-benchmark JSON file")
+    parser.add_argument("-o", "--output", default="scaling.csv", help="output CSV")
+    args = parser.parse_args()
+
+    with open(args.report) as f:
+        rows = scaling_rows(json.load(f))
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["function", "n_events", "mean_s", "min_s"])
+        writer.writerows(rows)
+
+    for name, k in fit_exponents(rows).items():
+        print(f"{name}: time ~ n_events^{k:.2f}")
+
+
+if __name__ == "__main__":
+    main()
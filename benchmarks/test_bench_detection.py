@@ -0,0 +1,40 @@
+# benchmarks for particle detection and tracking
+
+from conftest import events_of_size, particles_of_size, run_benchmark
+
+from eventcamprocessing.particle_detection import (
+    ev_particlefinder,
+    ev_particlefinder3d,
+)
+from eventcamprocessing.particle_tracking import ev_particletracker
+
+
+def test_ev_particlefinder(benchmark, n_events):
+    evs = events_of_size(n_events)
+    run_benchmark(
+        benchmark, ev_particlefinder, evs, min_area=20, h=720, w=1280, n_events=n_events
+    )
+
+
+def test_ev_particlefinder3d(benchmark, n_events):
+    evs = events_of_size(n_events)
+    run_benchmark(
+        benchmark,
+        ev_particlefinder3d,
+        evs,
+        min_area=20,
+        eps_t=1000,
+        n_events=n_events,
+    )
+
+
+def test_ev_particletracker(benchmark, n_events):
+    particles, time_array = particles_of_size(n_events)
+    run_benchmark(
+        benchmark,
+        ev_particletracker,
+        particles,
+        max_disp=8,
+        time_array=time_array,
+        n_events=n_events,
+    )
@@ -0,0 +1,63 @@
+# benchmarks for every function in filter_funcs
+
+from conftest import events_of_size, run_benchmark
+
+from eventcamprocessing.filter_funcs import (
+    accumulate_events,
+    hot_pixel_filter,
+    isolated_noise_filter,
+    low_pass_filter,
+    opposite_polarity_filter,
+)
+
+
+def test_accumulate_events(benchmark, n_events):
+    evs = events_of_size(n_events)
+    split = int(0.9 * len(evs))
+    run_benchmark(
+        benchmark,
+        accumulate_events,
+        evs[:split],
+        evs[split:],
+        t_accum_us=int(evs["t"][-1] - evs["t"][0]) // 2,
+        n_events=n_events,
+    )
+
+
+def test_isolated_noise_filter(benchmark, n_events):
+    evs = events_of_size(n_events)
+    run_benchmark(
+        benchmark,
+        isolated_noise_filter,
+        evs,
+        spatial_radius=5,
+        time_window=1000,
+        min_neighbors=3,
+        n_events=n_events,
+    )
+
+
+def test_low_pass_filter(benchmark, n_events):
+    evs = events_of_size(n_events)
+    run_benchmark(
+        benchmark, low_pass_filter, evs, min_dt=300, min_count=5, n_events=n_events
+    )
+
+
+def test_hot_pixel_filter(benchmark, n_events):
+    evs = events_of_size(n_events)
+    run_benchmark(
+        benchmark, hot_pixel_filter, evs, min_duration=4000, n_events=n_events
+    )
+
+
+def test_opposite_polarity_filter(benchmark, n_events):
+    evs = events_of_size(n_events)
+    run_benchmark(
+        benchmark,
+        opposite_polarity_filter,
+        evs,
+        spatial_radius=5,
+        time_scale=1e-3,
+        n_events=n_events,
+    )
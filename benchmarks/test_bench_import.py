@@ -0,0 +1,27 @@
+# benchmark for the cost of importing the package in a fresh interpreter
+
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "eventcamprocessing",
+        "eventcamprocessing.filter_funcs",
+        "eventcamprocessing.particle_detection",
+        "eventcamprocessing.particle_tracking",
+        "eventcamprocessing.plotting",
+    ],
+)
+def test_import_time(benchmark, module):
+    benchmark.extra_info["n_events"] = 0
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", f"import {module}"],),
+        kwargs={"check": True},
+        rounds=5,
+        iterations=1,
+    )
@@ -1,6 +1,10 @@
 import numpy as np
 import pandas as pd
 
+from eventcamprocessing.filter_funcs import sort_by_time
+from eventcamprocessing.representations import event_counts, polarity_counts
+from eventcamprocessing.windows import time_windows
+
 
 def numpify_df(events_df: pd.DataFrame):
     """
@@ -23,26 +27,17 @@ def basic_event_iterator(events: np.ndarray, t_step: float, t_window: float):
     Collects events within t_window/2 before and after the center time.
     """
 
-    start_time = events["t"].min()
-    end_time = events["t"].max()
-
-    center_times = np.arange(start_time, end_time, t_step)
-    for center_time in center_times:
-        window_start = center_time - t_window / 2
-        window_end = center_time + t_window / 2
-
-        mask = (events["t"] >= window_start) & (events["t"] < window_end)
-        yield events[mask]
+    events = sort_by_time(events)
+    yield from time_windows(
+        events, t_step, t_window, mode="centered", check_sorted=False
+    )
 
 
 def collapse_2d(events: np.ndarray, shape: tuple[int, int]):
     """
     Collapse events into a 2D histogram based on x and y coordinates.
     """
-    img = np.zeros(shape, dtype=np.int32)
-    for event in events:
-        img[event["y"], event["x"]] += 1
-    return img
+    return event_counts(events, shape)
 
 
 def collapse_2d_polarity(events: np.ndarray, shape: tuple[int, int]):
@@ -50,13 +45,7 @@ def collapse_2d_polarity(events: np.ndarray, shape: tuple[int, int]):
     Collapse events into two 2D histograms based on x and y coordinates and polarity.
     Returns a tuple of (positive_polarity_image, negative_polarity_image).
     """
-    img_pos = np.zeros(shape, dtype=np.int32)
-    img_neg = np.zeros(shape, dtype=np.int32)
-    for event in events:
-        if event["p"] > 0:
-            img_pos[event["y"], event["x"]] += 1
-        else:
-            img_neg[event["y"], event["x"]] += 1
+    img_pos, img_neg = polarity_counts(events, shape)
     return img_pos, img_neg
 
 
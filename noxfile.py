@@ -13,6 +13,24 @@ def tests(session: nox.Session):
     session.run("pytest")
 
 
+@nox_uv.session(reuse_venv=True, uv_groups=["bench"])
+def bench(session: nox.Session):
+    """Run benchmarks and record scaling curves (set ECP_BENCH_MAX_EVENTS)"""
+    session.run(
+        "pytest",
+        "benchmarks",
+        "--benchmark-json=.benchmarks/latest.json",
+        *session.posargs,
+    )
+    session.run(
+        "python",
+        "benchmarks/scaling_curves.py",
+        ".benchmarks/latest.json",
+        "-o",
+        ".benchmarks/scaling.csv",
+    )
+
+
 @nox_uv.session(reuse_venv=True, uv_groups=["docs"])
 def docs(session: nox.Session):
     """Build docs"""
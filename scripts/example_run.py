@@ -6,6 +6,7 @@ from metavision_core.event_io import EventsIterator
 
 from eventcamprocessing.filter_funcs import accumulate_events
 from eventcamprocessing.particle_detection import ev_particlefinder
+from eventcamprocessing.particle_store import ParticleStore
 from eventcamprocessing.particle_tracking import ev_particletracker
 
 raw_file = "data/events_cut.raw"
@@ -16,7 +17,7 @@ dt = 10000  #
 max_disp = 8  # maximum displacement (for tracks of length 1)
 t_start = None
 window = []
-all_particles = []
+all_particles = ParticleStore()  # structured array that grows by doubling
 
 
 print(" ")
@@ -40,13 +41,7 @@ for evs in mv_iterator:
         w=w,
     )
 
-    for p in particles:
-        all_particles.append(p)
-
-dtype = np.dtype([("x", "f4"), ("y", "f4"), ("t", "f8"), ("area", "i4")])
-all_particles = np.array(
-    all_particles, dtype=dtype
-)  # reformat particle info to structured array
+    all_particles.extend(particles)
 
 print(f"Finished detecting particles! Found {len(all_particles)} particles in total.")
 print(" ")
@@ -61,3 +56,6 @@ t_ = np.arange(t_start, t_end + dt, dt)
 
 # track particles
 track_info = ev_particletracker(all_particles, max_disp, t_)
+
+# for long recordings, recording.run_recording runs the same loop with
+# periodic checkpoints and can resume after a crash
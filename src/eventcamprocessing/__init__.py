@@ -1,9 +1,66 @@
 __all__ = [
     "ev_particlefinder",
+    "ev_particlefinder3d",
     "ev_particletracker",
     "filter_funcs",
+    "main",
+    "run_pipeline",
+    "run_sweep",
 ]
 
-from . import filter_funcs
-from .particle_detection import ev_particlefinder
-from .particle_tracking import ev_particletracker
+import importlib
+
+# Submodules and functions are imported on first access, so that
+# ``import eventcamprocessing`` stays cheap for short-lived worker processes.
+_LAZY_ATTRS = {
+    "ev_particlefinder": "particle_detection",
+    "ev_particlefinder3d": "particle_detection",
+    "ev_particletracker": "particle_tracking",
+    "main": "cli",
+    "run_pipeline": "pipeline",
+    "run_sweep": "sweep",
+}
+_SUBMODULES = {
+    "analytics",
+    "batch",
+    "cache",
+    "chunking",
+    "cli",
+    "cluster_tracking",
+    "dedup",
+    "filter_funcs",
+    "instrumentation",
+    "kernels",
+    "memory",
+    "particle_detection",
+    "particle_store",
+    "particle_tracking",
+    "pipeline",
+    "plotting",
+    "recording",
+    "representations",
+    "roi",
+    "storage",
+    "stream",
+    "sweep",
+    "synthetic",
+    "tiling",
+    "timebase",
+    "windows",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        module = importlib.import_module(f".{_LAZY_ATTRS[name]}", __name__)
+        value = getattr(module, name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_LAZY_ATTRS, *_SUBMODULES})
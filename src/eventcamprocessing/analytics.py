@@ -0,0 +1,189 @@
+"""
+Vectorized analytics of tracked particles.
+
+The functions work on flat, columnar track points, one record per track
+point with fields track_id, x, y and t (`storage.TRACK_DTYPE`), as returned
+by `storage.read_tracks` or by `storage.tracks_to_records` for the output of
+`ev_particletracker`. Points must be grouped by track and sorted by t within
+each track (see `sort_tracks`). Finite differences are taken over the whole
+array at once with `np.diff`, and differences that would cross from one
+track into the next are masked, so no Python loop runs over the tracks.
+
+Velocities are in pixels per microsecond and accelerations in pixels per
+microsecond squared.
+
+Examples
+--------
+>>> points = filter_tracks(tracks_to_records(track_info), min_length=5)
+>>> vx, vy = velocities(points)
+>>> grid = eulerian_grid(points["x"], points["y"], {"vx": vx, "vy": vy}, bin_size=16)
+>>> plt.quiver(grid["vx_mean"], grid["vy_mean"])
+"""
+
+import numpy as np
+
+
+def sort_tracks(points):
+    """Track points grouped by track_id and sorted by t within each track."""
+    return points[np.lexsort((points["t"], points["track_id"]))]
+
+
+def _same_track(points):
+    """for each consecutive pair of points, True if both are in the same track"""
+    return points["track_id"][1:] == points["track_id"][:-1]
+
+
+def track_lengths(points):
+    """
+    Number of points of every track.
+
+    Returns
+    -------
+    track_ids : np.ndarray
+        Ids of the tracks, in the order they appear in points.
+    lengths : np.ndarray
+        Number of points of each track.
+    """
+    starts = np.flatnonzero(np.r_[True, ~_same_track(points)]) if len(points) else []
+    lengths = np.diff(np.r_[starts, len(points)]).astype(np.int64)
+    return points["track_id"][starts], lengths
+
+
+def filter_tracks(points, min_length=2, max_length=None):
+    """
+    Points of the tracks with min_length <= length <= max_length points.
+    """
+    _, lengths = track_lengths(points)
+    keep = lengths >= min_length
+    if max_length is not None:
+        keep &= lengths <= max_length
+    return points[np.repeat(keep, lengths)]
+
+
+def velocities(points):
+    """
+    Finite-difference velocity at every track point.
+
+    Interior points use the central difference over their two neighbors and
+    the end points of a track the one-sided difference to their only
+    neighbor.
+
+    Returns
+    -------
+    vx, vy : np.ndarray
+        Velocity components for each point; NaN for tracks of one point.
+    """
+    n = len(points)
+    same = _same_track(points)
+    dt = np.diff(points["t"])
+    out = []
+    for name in ("x", "y"):
+        v = np.full(n, np.nan)
+        if n > 1:
+            # one-sided differences first, overwritten by central ones
+            slope = np.diff(points[name]) / np.where(same, dt, np.nan)
+            v[:-1] = np.where(same, slope, v[:-1])
+            v[1:] = np.where(same, slope, v[1:])
+            central = same[1:] & same[:-1]
+            dx2 = points[name][2:] - points[name][:-2]
+            dt2 = points["t"][2:] - points["t"][:-2]
+            v[1:-1] = np.where(central, dx2 / np.where(central, dt2, np.nan), v[1:-1])
+        out.append(v)
+    return tuple(out)
+
+
+def accelerations(points):
+    """
+    Finite-difference acceleration at every interior track point, from the
+    three-point second difference (exact for constant acceleration with
+    uneven time steps).
+
+    Returns
+    -------
+    ax, ay : np.ndarray
+        Acceleration components for each point; NaN at the first and last
+        point of each track.
+    """
+    n = len(points)
+    same = _same_track(points)
+    central = same[1:] & same[:-1]
+    out = []
+    for name in ("x", "y"):
+        a = np.full(n, np.nan)
+        if n > 2:
+            dt = np.diff(points["t"])
+            slope = np.diff(points[name]) / np.where(same, dt, np.nan)
+            span = points["t"][2:] - points["t"][:-2]
+            a[1:-1] = np.where(
+                central, 2 * np.diff(slope) / np.where(central, span, np.nan), np.nan
+            )
+        out.append(a)
+    return tuple(out)
+
+
+def eulerian_grid(x, y, values, bin_size, h=720, w=1280, t=None, t_bin=None):
+    """
+    Mean and variance of Lagrangian values on a regular (y, x) or (t, y, x) grid.
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        Positions of the samples in pixels, e.g. points["x"] and points["y"].
+    values : dict
+        Maps names to arrays of per-sample values, e.g. the output of
+        `velocities`. Samples where any value is NaN are ignored.
+    bin_size : float
+        Side of the square spatial bins in pixels.
+    h, w : int
+        Height and width of the EVK sensor in pixels; samples outside are
+        ignored.
+    t : np.ndarray, optional
+        Sample times. If given with t_bin, the grid also has a time axis
+        starting at the earliest sample.
+    t_bin : float, optional
+        Length of the time bins in microseconds.
+
+    Returns
+    -------
+    grid : dict
+        "count" (number of samples per bin), "<name>_mean" and "<name>_var"
+        (population variance) for each value, NaN in empty bins, and the bin
+        edges "x_edges", "y_edges" (and "t_edges").
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+    for v in values.values():
+        valid &= ~np.isnan(v)
+
+    nx = int(np.ceil(w / bin_size))
+    ny = int(np.ceil(h / bin_size))
+    shape = (ny, nx)
+    index = (y[valid] // bin_size).astype(np.int64) * nx + (
+        x[valid] // bin_size
+    ).astype(np.int64)
+    grid = {
+        "x_edges": np.arange(nx + 1) * bin_size,
+        "y_edges": np.arange(ny + 1) * bin_size,
+    }
+    if t is not None and t_bin is not None:
+        t = np.asarray(t)[valid]
+        t0 = t.min() if len(t) else 0
+        it = ((t - t0) // t_bin).astype(np.int64)
+        nt = int(it.max()) + 1 if len(it) else 0
+        index += it * (ny * nx)
+        shape = (nt, ny, nx)
+        grid["t_edges"] = t0 + np.arange(nt + 1) * t_bin
+
+    size = int(np.prod(shape))
+    count = np.bincount(index, minlength=size)
+    grid["count"] = count.reshape(shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for name, v in values.items():
+            v = np.asarray(v, dtype=np.float64)[valid]
+            mean = np.bincount(index, v, minlength=size) / count
+            # two-pass variance, which does not cancel like E[v^2] - E[v]^2
+            var = np.bincount(index, (v - mean[index]) ** 2, minlength=size) / count
+            grid[f"{name}_mean"] = mean.reshape(shape)
+            grid[f"{name}_var"] = var.reshape(shape)
+    return grid
@@ -0,0 +1,280 @@
+"""
+Batch processing of a directory of recordings, e.g. data/raw_files filled by
+scripts/import_drivedata.py.
+
+Every recording is run through `recording.run_recording` with the settings
+of a TOML config file, on a process pool. The largest files are started
+first, so a long recording does not end up running alone at the end of the
+batch. A JSON manifest in the output directory records for each file
+whether it completed or failed, with timings, and on a rerun the files whose
+outputs are up to date (same input size, modification time and config) are
+skipped. Interrupted files resume from their checkpoint.
+
+Example config::
+
+    t_accum_us = 20000
+    dt = 10000
+    min_area = 100
+    max_disp = 8
+
+    [[filters]]
+    name = "isolated_noise_filter"
+    spatial_radius = 5
+    time_window = 1000
+"""
+
+import functools
+import hashlib
+import itertools
+import json
+import os
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from eventcamprocessing import filter_funcs
+from eventcamprocessing.recording import run_recording
+
+DEFAULT_CONFIG = {
+    "t_accum_us": 20000,
+    "dt": 10000,
+    "min_area": 100,
+    "max_disp": 8,
+    "h": 720,
+    "w": 1280,
+    "format": "npz",
+    "checkpoint_every_s": 60,
+    "filters": [],
+}
+FILTERS = (
+    "isolated_noise_filter",
+    "low_pass_filter",
+    "hot_pixel_filter",
+    "opposite_polarity_filter",
+)
+MANIFEST_NAME = "manifest.json"
+
+
+def load_config(path=None):
+    """
+    Read a batch config from a TOML file, filling in DEFAULT_CONFIG.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        TOML file with any of the keys of DEFAULT_CONFIG. Each entry of the
+        filters array names a function in FILTERS plus its keyword arguments.
+
+    Returns
+    -------
+    config : dict
+    """
+    config = dict(DEFAULT_CONFIG)
+    if path is not None:
+        with open(path, "rb") as f:
+            config.update(tomllib.load(f))
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown config keys: {sorted(unknown)}")
+    for spec in config["filters"]:
+        if spec.get("name") not in FILTERS:
+            raise ValueError(
+                f"Unknown filter {spec.get('name')!r}, use one of {FILTERS}"
+            )
+    return config
+
+
+def config_digest(config):
+    """Hash of a config, stored in the manifest to detect changed settings."""
+    content = json.dumps(config, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _filters(config):
+    filters = []
+    for spec in config["filters"]:
+        kwargs = {k: v for k, v in spec.items() if k != "name"}
+        filters.append(functools.partial(getattr(filter_funcs, spec["name"]), **kwargs))
+    return filters
+
+
+def _npy_chunks(path, delta_t, start_ts=0):
+    """events saved with np.save, in chunks of delta_t like EventsIterator"""
+    evs = np.load(path, mmap_mode="r")
+    t = evs["t"]
+    first = np.searchsorted(t, start_ts, side="left")
+    if first == len(t):
+        return
+    # chunks on the grid start_ts + k * delta_t, without the leading empty ones
+    t0 = start_ts + (t[first] - start_ts) // delta_t * delta_t
+    edges = np.arange(t0, t[-1] + delta_t, delta_t)
+    bounds = np.searchsorted(t, edges, side="left")
+    for a, b in itertools.pairwise(bounds):
+        yield np.array(evs[a:b])
+
+
+def read_chunks(path, delta_t, start_ts=0):
+    """
+    Event chunks of a recording from start_ts (in us) on: .raw and .hdf5
+    files are read with Metavision's EventsIterator, .npy files hold a saved
+    event array.
+    """
+    if Path(path).suffix == ".npy":
+        return _npy_chunks(path, delta_t, start_ts)
+    from metavision_core.event_io import EventsIterator
+
+    return EventsIterator(str(path), delta_t=delta_t, start_ts=start_ts)
+
+
+def output_paths(path, out_dir, config):
+    """
+    Particle, track and checkpoint files of a recording. The checkpoint is
+    specific to the config, so a changed config never resumes an old run.
+    """
+    stem = Path(path).stem
+    out_dir = Path(out_dir)
+    return {
+        "particles": out_dir / f"{stem}_particles.{config['format']}",
+        "tracks": out_dir / f"{stem}_tracks.{config['format']}",
+        "checkpoint": out_dir / f"{stem}.{config_digest(config)[:12]}.ckpt.npz",
+    }
+
+
+def process_file(path, config, out_dir):
+    """
+    Detect and track the particles of one recording.
+
+    Returns
+    -------
+    wall_s : float
+        Time taken.
+    """
+    t0 = time.perf_counter()
+    paths = output_paths(path, out_dir, config)
+    run_recording(
+        functools.partial(read_chunks, path, config["dt"]),
+        t_accum_us=config["t_accum_us"],
+        min_area=config["min_area"],
+        dt=config["dt"],
+        max_disp=config["max_disp"],
+        filters=_filters(config),
+        h=config["h"],
+        w=config["w"],
+        particles_path=paths["particles"],
+        tracks_path=paths["tracks"],
+        checkpoint_path=paths["checkpoint"],
+        checkpoint_every_s=config["checkpoint_every_s"],
+    )
+    return time.perf_counter() - t0
+
+
+def _run_job(path, config, out_dir):
+    """process_file, returning the manifest entry instead of raising"""
+    entry = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "input": _input_state(path),
+        "config": config_digest(config),
+    }
+    try:
+        entry["wall_s"] = process_file(path, config, out_dir)
+        entry["status"] = "done"
+    except Exception as e:
+        entry["status"] = "failed"
+        entry["error"] = f"{type(e).__name__}: {e}"
+    return entry
+
+
+def _input_state(path):
+    stat = Path(path).stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def read_manifest(out_dir):
+    """Manifest entries of an output directory, keyed by file name."""
+    path = Path(out_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)["files"]
+
+
+def _write_manifest(out_dir, entries):
+    path = Path(out_dir) / MANIFEST_NAME
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"files": entries}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_up_to_date(entry, path, config, out_dir):
+    """True if a manifest entry records a completed run of this file and config."""
+    if entry is None or entry["status"] != "done":
+        return False
+    if entry["config"] != config_digest(config) or entry["input"] != _input_state(path):
+        return False
+    paths = output_paths(path, out_dir, config)
+    return paths["particles"].exists() and paths["tracks"].exists()
+
+
+def run_batch(
+    directory, config=None, out_dir=None, pattern="*.raw", max_workers=1, force=False
+):
+    """
+    Process every recording in a directory.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory holding the recordings.
+    config : dict, optional
+        Settings from `load_config` (default: DEFAULT_CONFIG).
+    out_dir : str or Path, optional
+        Output directory (default: ``<directory>/processed``).
+    pattern : str
+        Glob pattern of the recordings.
+    max_workers : int
+        Number of worker processes; 1 runs the files in this process.
+    force : bool
+        Reprocess files even if their outputs are up to date.
+
+    Returns
+    -------
+    manifest : dict
+        Maps the file names to their manifest entries, with "status" ("done"
+        or "failed"), "wall_s", "started", "input" (size and mtime_ns),
+        "config" (see `config_digest`) and "error" for failed files.
+    """
+    config = load_config() if config is None else config
+    directory = Path(directory)
+    out_dir = directory / "processed" if out_dir is None else Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = read_manifest(out_dir)
+    files = sorted(directory.glob(pattern), key=lambda p: (-p.stat().st_size, p.name))
+    todo = [
+        path
+        for path in files
+        if force or not is_up_to_date(manifest.get(path.name), path, config, out_dir)
+    ]
+    print(f"{len(files)} files, {len(files) - len(todo)} up to date")
+
+    def record(path, entry):
+        manifest[path.name] = entry
+        _write_manifest(out_dir, manifest)
+        print(f"{path.name}: {entry['status']}")
+
+    if max_workers == 1:
+        for path in todo:
+            record(path, _run_job(path, config, out_dir))
+        return manifest
+
+    with ProcessPoolExecutor(max_workers) as pool:
+        # submitted largest first, so the pool starts with the largest files
+        futures = {pool.submit(_run_job, path, config, out_dir): path for path in todo}
+        for future in as_completed(futures):
+            record(futures[future], future.result())
+    return manifest
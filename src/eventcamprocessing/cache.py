@@ -0,0 +1,376 @@
+"""
+Content-addressed on-disk cache for the filter and detection stages.
+
+Every cache entry is a .npz file named after a hash of the stage name, the
+input (e.g. the hash of the RAW file and the reader settings), the stage
+parameters and the package version, so changing any of them gives a new
+entry and stale results are never read back. The recording is cached in
+segments of a fixed number of chunks:
+
+- "filter" entries hold the filtered windows of a segment, so changing only
+  detection parameters skips the filters. Their timestamps are stored as
+  int32 offsets from the segment's earliest event (`timebase.encode_times`),
+  which makes the entries about a quarter smaller.
+- "particles" entries hold the particles of a segment. When only tracking
+  parameters change, `cached_detection` returns the cached particles without
+  reading a single chunk.
+
+The cache is bounded by size: when a new entry pushes it over max_bytes, the
+least recently used entries are deleted.
+
+Examples
+--------
+>>> cache = StageCache("~/.cache/eventcamprocessing", max_bytes=20 * 2**30)
+>>> source = {"file": file_digest(raw_file), "delta_t": dt}
+>>> all_particles = cached_detection(
+>>>     EventsIterator(raw_file, delta_t=dt), cache, source, t_accum_us,
+>>>     min_area=100, filters=[partial(isolated_noise_filter, spatial_radius=5)],
+>>> )
+>>> track_info = ev_particletracker(all_particles, max_disp, time_array)
+"""
+
+import dataclasses
+import functools
+import hashlib
+import importlib.metadata
+import itertools
+import json
+import os
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE, ev_particlefinder
+from eventcamprocessing.timebase import decode_times, encode_times
+
+try:
+    _VERSION = importlib.metadata.version("eventcamprocessing")
+except importlib.metadata.PackageNotFoundError:
+    _VERSION = "unknown"
+
+_DIGESTS = {}
+
+
+def file_digest(path, block_size=1 << 20):
+    """
+    SHA-256 of a file's contents, e.g. a RAW recording.
+
+    The digest is remembered for the lifetime of the process as long as the
+    file's size and modification time do not change.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    memo = (str(path), stat.st_size, stat.st_mtime_ns)
+    if memo not in _DIGESTS:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            while block := f.read(block_size):
+                sha.update(block)
+        _DIGESTS[memo] = sha.hexdigest()
+    return _DIGESTS[memo]
+
+
+def describe(value):
+    """
+    JSON-serializable description of a parameter value used in cache keys.
+
+    Functions are described by their qualified name, ``functools.partial``
+    objects by their function and arguments, dataclasses (e.g. `roi.ROI`) by
+    their fields and arrays by a hash of their contents. Lambdas and locally
+    defined functions raise TypeError, as their names do not identify them.
+    """
+    if value is None or isinstance(value, bool | int | float | str):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        digest = hashlib.sha256(np.ascontiguousarray(value).view(np.uint8)).hexdigest()
+        return {"array": digest, "shape": value.shape, "dtype": str(value.dtype)}
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, list | tuple):
+        return [describe(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): describe(v) for k, v in value.items()}
+    if isinstance(value, functools.partial):
+        return {
+            "func": describe(value.func),
+            "args": describe(value.args),
+            "keywords": describe(value.keywords),
+        }
+    if dataclasses.is_dataclass(value):
+        fields = {f.name: getattr(value, f.name) for f in dataclasses.fields(value)}
+        return {"type": describe(type(value)), "fields": describe(fields)}
+    if hasattr(value, "__qualname__"):
+        if "<lambda>" in value.__qualname__ or "<locals>" in value.__qualname__:
+            # different lambdas and closures share a name, so their results
+            # would share cache entries
+            raise TypeError(
+                f"Cannot describe {value.__qualname__} for a cache key, use a "
+                "module-level function or a functools.partial of one"
+            )
+        return f"{value.__module__}.{value.__qualname__}"
+    raise TypeError(f"Cannot describe {type(value).__name__} for a cache key")
+
+
+class StageCache:
+    """
+    Directory of stage results with least-recently-used eviction.
+
+    Parameters
+    ----------
+    root : str or Path
+        Cache directory, created if needed. Several processes may share it.
+    max_bytes : int, optional
+        Size bound of the cache. Storing an entry deletes the least recently
+        used other entries until the cache fits (the new entry is always
+        kept). Unbounded if not given.
+
+    Attributes
+    ----------
+    stats : dict
+        Maps stage names to {"hits": int, "misses": int} for this object.
+    """
+
+    def __init__(self, root, max_bytes=None):
+        self.root = Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def key(self, stage, source, **params):
+        """
+        Key of a stage result.
+
+        Parameters
+        ----------
+        stage : str
+            Name of the stage, e.g. "filter" or "particles".
+        source : object
+            Description of the input, e.g. ``{"file": file_digest(raw_file),
+            "delta_t": dt}`` or a time range.
+        **params
+            Parameters the result depends on (see `describe`).
+        """
+        content = json.dumps(
+            {
+                "stage": stage,
+                "version": _VERSION,
+                "source": describe(source),
+                "params": describe(params),
+            },
+            sort_keys=True,
+        )
+        return f"{stage}-{hashlib.sha256(content.encode()).hexdigest()}"
+
+    def _path(self, key):
+        return self.root / f"{key}.npz"
+
+    def __contains__(self, key):
+        return self._path(key).exists()
+
+    def load(self, key):
+        """
+        Arrays stored under key, or None if there is no such entry.
+        """
+        path = self._path(key)
+        stage = key.rsplit("-", 1)[0]
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                arrays = {name: f[name] for name in f.files}
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            self.stats[stage]["misses"] += 1
+            return None
+        self.stats[stage]["hits"] += 1
+        return arrays
+
+    def store(self, key, **arrays):
+        """Store arrays under key and evict entries if over max_bytes."""
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self._path(key))
+        if self.max_bytes is not None:
+            self._evict(keep=self._path(key))
+
+    def _entries(self):
+        entries = []
+        for path in self.root.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return sorted(entries)
+
+    @property
+    def size(self):
+        """Total size of the entries in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self, keep):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        """Delete every entry."""
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
+
+
+def cached_detection(
+    chunks,
+    cache,
+    source,
+    t_accum_us,
+    min_area,
+    filters=(),
+    h=720,
+    w=1280,
+    roi=None,
+    segment_chunks=100,
+):
+    """
+    Particles of the accumulate -> filter -> detect loop of
+    scripts/example_run.py, reusing cached segments.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray
+        Source of event chunks, e.g. an EventsIterator. It is not read at all
+        if the particles of every segment are cached.
+    cache : StageCache
+        Cache to read and fill.
+    source : object
+        Description of the chunks for the cache keys. It must change whenever
+        the chunks do, e.g. ``{"file": file_digest(raw_file), "delta_t": dt}``.
+    t_accum_us : int
+        Timespan (in us) of the rolling accumulation window.
+    min_area : int
+        Minimum area (event count) passed to `ev_particlefinder`.
+    filters : sequence of callables
+        Filters applied in order to each window. Their qualified names and
+        arguments are part of the cache keys, so use functions or
+        ``functools.partial`` objects rather than lambdas.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    roi : ROI, optional
+        Region of interest and decimation (`roi.ROI`) applied to each chunk.
+    segment_chunks : int
+        Number of chunks per cached segment.
+
+    Returns
+    -------
+    all_particles : np.ndarray
+        Structured array of every detected particle, in window order.
+    """
+    filter_params = {
+        "t_accum_us": t_accum_us,
+        "filters": list(filters),
+        "roi": roi,
+        "segment_chunks": segment_chunks,
+    }
+    detect_params = {**filter_params, "min_area": min_area, "h": h, "w": w}
+    layout_key = cache.key("layout", source, segment_chunks=segment_chunks)
+
+    def particles_key(k):
+        return cache.key("particles", source, segment=k, **detect_params)
+
+    layout = cache.load(layout_key)
+    if layout is not None:
+        found = []
+        for k in range(int(layout["n_segments"])):
+            cached = cache.load(particles_key(k))
+            if cached is None:
+                break
+            found.append(cached["particles"])
+        else:
+            return _concat(found)
+
+    # decode and accumulate every chunk, but only filter and detect the
+    # segments that are not cached
+    it = iter(chunks)
+    window = []
+    found = []
+    for k in itertools.count():
+        first = next(it, None)
+        if first is None:
+            break
+        segment = itertools.chain([first], itertools.islice(it, segment_chunks - 1))
+
+        cached = cache.load(particles_key(k))
+        if cached is not None:
+            for evs in segment:
+                if roi is not None:
+                    evs = roi.apply(evs)
+                window = accumulate_events(window, evs, t_accum_us)
+            found.append(cached["particles"])
+            continue
+
+        filter_key = cache.key("filter", source, segment=k, **filter_params)
+        cached = cache.load(filter_key)
+        if cached is not None:
+            cached_events = _decode_events(cached)
+        filtered = []
+        particles = []
+        for j, evs in enumerate(segment):
+            if roi is not None:
+                evs = roi.apply(evs)
+            window = accumulate_events(window, evs, t_accum_us)
+            if cached is not None:
+                offsets = cached["offsets"]
+                evs = cached_events[offsets[j] : offsets[j + 1]]
+            else:
+                evs = window
+                for f in filters:
+                    evs = f(evs)
+                filtered.append(evs)
+            particles.append(
+                ev_particlefinder(evs=evs, min_area=min_area, h=h, w=w, roi=roi)
+            )
+        if cached is None:
+            cache.store(
+                filter_key,
+                **_encode_events(_concat(filtered, window.dtype)),
+                offsets=np.r_[0, np.cumsum([len(evs) for evs in filtered])],
+            )
+        particles = _concat(particles)
+        cache.store(particles_key(k), particles=particles)
+        found.append(particles)
+
+    cache.store(layout_key, n_segments=np.array(len(found)))
+    return _concat(found)
+
+
+def _encode_events(evs):
+    """entry arrays of events, with int32 time offsets if they fit"""
+    try:
+        rel_evs, origin = encode_times(evs)
+    except ValueError:
+        return {"events": evs}
+    return {"events": rel_evs, "t_origin": np.array(origin)}
+
+
+def _decode_events(cached):
+    """inverse of _encode_events"""
+    if "t_origin" not in cached:
+        return cached["events"]
+    return decode_times(cached["events"], int(cached["t_origin"]))
+
+
+def _concat(arrays, dtype=PARTICLE_DTYPE):
+    arrays = [a.astype(dtype, copy=False) for a in arrays if len(a) > 0]
+    if not arrays:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(arrays)
@@ -0,0 +1,230 @@
+"""
+Event-count adaptive chunking.
+
+`EventsIterator(delta_t=dt)` yields chunks of a fixed time span, so their
+size follows the event rate: a few hundred events in quiet periods and
+millions during a burst, which stalls the KD-tree filters and the labeler.
+`adaptive_chunks` wraps any chunk iterator and bounds both the time span and
+the number of events handed to each processing step. Overloaded chunks are
+either split into consecutive sub-chunks (all events are processed, with more
+steps) or subsampled (one step per chunk, with fewer events), and every
+decision is reported.
+
+Bounding the chunks alone does not bound the accumulation window the steps
+work on: the window gathers t_accum_us of chunks, so during a burst it still
+holds every event of the burst, and split chunks make each of those events
+part of more windows. `adaptive_windows` also bounds the window, keeping its
+newest max_events events.
+
+Examples
+--------
+>>> report = []
+>>> windows = adaptive_windows(EventsIterator(raw_file, delta_t=1000), t_accum_us,
+...                            max_events=200_000, report=report)
+>>> for window in windows:
+>>>     # ***Perform filtering, etc. on window***
+>>> print(sum(r["action"] != "pass" for r in report), "chunks adapted")
+"""
+
+import logging
+
+import numpy as np
+
+from eventcamprocessing import instrumentation
+from eventcamprocessing.filter_funcs import accumulate_events
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_POLICIES = ("split", "subsample")
+REPORT_FIELDS = ("chunk", "events_in", "events_out", "span_us", "action", "parts")
+
+
+def split_bounds(t, max_events=None, max_span_us=None):
+    """
+    Start and stop indices of consecutive sub-chunks of a time-sorted chunk
+    with at most max_events events and a time span below max_span_us.
+
+    Parameters
+    ----------
+    t : np.ndarray
+        Sorted timestamps of the chunk.
+    max_events : int, optional
+        Maximum number of events per sub-chunk.
+    max_span_us : int, optional
+        Sub-chunks cover [t[0] + k * max_span_us, t[0] + (k + 1) * max_span_us).
+
+    Returns
+    -------
+    starts, stops : np.ndarray
+        Index arrays such that sub-chunk i is chunk[starts[i]:stops[i]].
+        Empty time intervals are skipped.
+    """
+    n = len(t)
+    if n == 0:
+        return np.empty(0, np.intp), np.empty(0, np.intp)
+    if max_span_us is None:
+        edges = np.array([0, n])
+    else:
+        n_spans = int((t[-1] - t[0]) // max_span_us) + 1
+        inner = t[0] + max_span_us * np.arange(1, n_spans)
+        edges = np.unique(np.r_[0, np.searchsorted(t, inner, side="left"), n])
+
+    starts, stops = [], []
+    for start, stop in zip(edges[:-1].tolist(), edges[1:].tolist(), strict=True):
+        step = stop - start if max_events is None else max_events
+        bounds = np.arange(start, stop, step)
+        starts.append(bounds)
+        stops.append(np.minimum(bounds + step, stop))
+    return np.concatenate(starts), np.concatenate(stops)
+
+
+def subsample(chunk, max_events):
+    """
+    Keep max_events events spread evenly over a chunk, preserving their order.
+
+    Parameters
+    ----------
+    chunk : np.ndarray
+        Event array.
+    max_events : int
+        Number of events to keep.
+
+    Returns
+    -------
+    subsampled : np.ndarray
+        chunk itself if it has at most max_events events, otherwise a copy
+        with every (len(chunk) / max_events)-th event.
+    """
+    if len(chunk) <= max_events:
+        return chunk
+    idx = (np.arange(max_events) * len(chunk)) // max_events
+    return chunk[idx]
+
+
+def adaptive_chunks(
+    chunks, max_events, max_span_us=None, overload="split", report=None
+):
+    """
+    Re-chunk an event stream so each processing step has a bounded number of
+    events and time span.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray
+        Time-ordered event chunks, e.g. an EventsIterator.
+    max_events : int
+        Maximum number of events per yielded chunk.
+    max_span_us : int, optional
+        Maximum time span of a yielded chunk in microseconds. Longer chunks
+        are always split at multiples of max_span_us from their first event.
+    overload : {"split", "subsample"}
+        What to do with (span-bounded) chunks of more than max_events events:
+        "split" yields them as consecutive sub-chunks of max_events, keeping
+        every event; "subsample" keeps max_events evenly spread events, so
+        the number of steps stays the same and events are dropped.
+    report : list, optional
+        If given, one dict with the keys in REPORT_FIELDS is appended per
+        input chunk: events in and out, time span, the action taken ("pass",
+        "split", "subsample" or "split+subsample") and the number of chunks
+        yielded for it.
+
+    Yields
+    ------
+    chunk : np.ndarray
+        Input chunks, or slices or subsamples of them. Empty input chunks
+        are passed through as they are.
+
+    See Also
+    --------
+    adaptive_windows : also bounds the accumulation window built from them.
+
+    Notes
+    -----
+    Each input chunk is also recorded as an "adaptive_chunks" stage when
+    instrumentation is active, and adapted chunks are logged at DEBUG level.
+    """
+    if overload not in OVERLOAD_POLICIES:
+        raise ValueError(
+            f"Unknown overload policy {overload!r}, expected one of {OVERLOAD_POLICIES}"
+        )
+
+    for i, chunk in enumerate(chunks):
+        with instrumentation.stage("adaptive_chunks") as st:
+            t = chunk["t"]
+            span_us = int(t[-1] - t[0]) if len(chunk) > 0 else 0
+            split_events = max_events if overload == "split" else None
+            starts, stops = split_bounds(t, split_events, max_span_us)
+            parts = [chunk[a:b] for a, b in zip(starts, stops, strict=True)]
+            if not parts:
+                # quiet periods still count as a step for the callers
+                parts = [chunk]
+
+            actions = []
+            if len(parts) > 1:
+                actions.append("split")
+            if overload == "subsample" and any(len(p) > max_events for p in parts):
+                actions.append("subsample")
+                parts = [subsample(p, max_events) for p in parts]
+
+            n_out = sum(len(p) for p in parts)
+            st["events_in"] = len(chunk)
+            st["events_out"] = n_out
+
+        action = "+".join(actions) or "pass"
+        if actions:
+            logger.debug(
+                "chunk %d: %s, %d events over %d us -> %d chunks, %d events",
+                i,
+                action,
+                len(chunk),
+                span_us,
+                len(parts),
+                n_out,
+            )
+        if report is not None:
+            report.append(
+                {
+                    "chunk": i,
+                    "events_in": len(chunk),
+                    "events_out": n_out,
+                    "span_us": span_us,
+                    "action": action,
+                    "parts": len(parts),
+                }
+            )
+        yield from parts
+
+
+def adaptive_windows(
+    chunks, t_accum_us, max_events, max_span_us=None, overload="split", report=None
+):
+    """
+    Rolling accumulation windows of an event stream with a bounded number of
+    events.
+
+    The chunks are adapted by `adaptive_chunks` and accumulated with
+    `accumulate_events`, which keeps the newest max_events events of each
+    window. In a burst the window therefore holds the newest split (or
+    subsampled) chunk and no more, so the events processed per step stay
+    below max_events and, with "split", each event of the burst is processed
+    in a single window.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray
+        Time-ordered event chunks, e.g. an EventsIterator.
+    t_accum_us : int
+        Timespan (in us) of the rolling accumulation window.
+    max_events, max_span_us, overload, report
+        See `adaptive_chunks`.
+
+    Yields
+    ------
+    window : np.ndarray
+        Accumulation window after each adapted chunk, with at most
+        max_events events.
+    """
+    window = None
+    for chunk in adaptive_chunks(chunks, max_events, max_span_us, overload, report):
+        window = accumulate_events(window, chunk, t_accum_us, max_events=max_events)
+        yield window
@@ -0,0 +1,54 @@
+"""
+Command line interface, installed as the ``eventcamprocessing`` script.
+
+Examples
+--------
+Process every .raw file in data/raw_files on 4 processes::
+
+    eventcamprocessing run data/raw_files --config cfg.toml -j 4
+"""
+
+import argparse
+
+from eventcamprocessing.batch import load_config, run_batch
+
+
+def main(argv=None):
+    """
+    Entry point of the ``eventcamprocessing`` script.
+
+    Returns
+    -------
+    status : int
+        0 if every file was processed, 1 if any failed.
+    """
+    parser = argparse.ArgumentParser(prog="eventcamprocessing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser(
+        "run", help="detect and track particles in every recording of a directory"
+    )
+    run.add_argument("directory", help="directory holding the recordings")
+    run.add_argument("--config", help="TOML file with the processing settings")
+    run.add_argument(
+        "-j", "--jobs", type=int, default=1, help="number of worker processes"
+    )
+    run.add_argument("-o", "--out", help="output directory (default: DIR/processed)")
+    run.add_argument(
+        "--pattern", default="*.raw", help="glob pattern of the recordings"
+    )
+    run.add_argument("--force", action="store_true", help="reprocess up-to-date files")
+
+    args = parser.parse_args(argv)
+    manifest = run_batch(
+        args.directory,
+        config=load_config(args.config),
+        out_dir=args.out,
+        pattern=args.pattern,
+        max_workers=args.jobs,
+        force=args.force,
+    )
+    failed = [name for name, entry in manifest.items() if entry["status"] == "failed"]
+    for name in failed:
+        print(f"failed: {name} ({manifest[name]['error']})")
+    return 1 if failed else 0
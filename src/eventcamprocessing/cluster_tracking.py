@@ -0,0 +1,235 @@
+"""
+Event-driven cluster tracking.
+
+`ev_particlefinder` and `ev_particletracker` detect particles in accumulated
+windows and link them after the recording is finished, so a position is only
+known one accumulation window (and one tracking pass) after the particle was
+seen. `ClusterTracker` instead updates a small set of active clusters with
+every EventsIterator chunk, so the latency is bounded by the chunk length.
+
+The active clusters are kept as one structured array (position, velocity,
+time of the last update and event count). For each chunk, a per-pixel
+lookup grid is painted with the nearest cluster around each cluster's
+predicted position, every event is assigned with a single lookup, and
+clusters are moved to the centroid of their events. Unassigned events that
+form dense connected groups spawn new clusters, and clusters that receive no
+events for max_idle_us are dropped.
+
+Examples
+--------
+>>> tracker = ClusterTracker(h=720, w=1280, radius=10, min_events=20)
+>>> for ev_chunk in EventsIterator(raw_file, delta_t=500):
+>>>     clusters = tracker.update(ev_chunk)
+>>>     send_positions(clusters["id"], clusters["x"], clusters["y"])
+"""
+
+import numpy as np
+
+from eventcamprocessing.filter_funcs import sort_by_time
+from eventcamprocessing.instrumentation import instrumented
+from eventcamprocessing.particle_detection import label_events_3d
+
+CLUSTER_DTYPE = np.dtype(
+    [
+        ("id", "i8"),
+        ("x", "f8"),
+        ("y", "f8"),
+        ("vx", "f8"),
+        ("vy", "f8"),
+        ("t", "f8"),
+        ("n_events", "i8"),
+    ]
+)
+
+
+class ClusterTracker:
+    """
+    Incremental tracker of event clusters.
+
+    Parameters
+    ----------
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    radius : float
+        Events within radius pixels of a cluster's predicted position are
+        assigned to the nearest such cluster.
+    min_events : int
+        Minimum number of connected unassigned events in a chunk to spawn a
+        new cluster.
+    max_idle_us : float
+        Clusters without events for longer than this are dropped.
+    smoothing : float
+        Weight of the newest velocity measurement in the exponentially
+        smoothed cluster velocity, between 0 and 1.
+    polarity : int or None
+        Polarity of the events used for tracking (default ON events, as in
+        `ev_particlefinder`). None uses all events.
+    backend : {"numpy", "numba"}
+        Union-find implementation used to find new clusters, see
+        `kernels.get_kernel`.
+
+    Attributes
+    ----------
+    clusters : np.ndarray
+        Active clusters with dtype CLUSTER_DTYPE. Velocities are in pixels per
+        microsecond and t is the time of the last update.
+    """
+
+    def __init__(
+        self,
+        h=720,
+        w=1280,
+        radius=10,
+        min_events=20,
+        max_idle_us=5000,
+        smoothing=0.5,
+        polarity=1,
+        backend="numpy",
+    ):
+        self.h = h
+        self.w = w
+        self.radius = radius
+        self.min_events = min_events
+        self.max_idle_us = max_idle_us
+        self.smoothing = smoothing
+        self.polarity = polarity
+        self.backend = backend
+        self.clusters = np.empty(0, dtype=CLUSTER_DTYPE)
+        self._next_id = 0
+
+        # flat per-pixel lookup grid of cluster indices, -1 where unassigned
+        self._grid = np.full(h * w, -1, dtype=np.int32)
+        r = int(np.ceil(radius))
+        dy, dx = np.mgrid[-r : r + 1, -r : r + 1]
+        disk = dx**2 + dy**2 <= radius**2
+        self._disk_dx = dx[disk]
+        self._disk_dy = dy[disk]
+        # voxel lookup grids for label_events_3d, reset after every use, so
+        # spawning costs as much as the unassigned events, not the sensor
+        n_cells = (h + 2) * (w + 2)
+        self._label_grids = (
+            np.full(n_cells, -1, dtype=np.int64),
+            np.full(n_cells, -1, dtype=np.int64),
+        )
+
+    @instrumented("cluster_tracker", output="tracks")
+    def update(self, chunk, t_now=None):
+        """
+        Update the active clusters with a chunk of events.
+
+        Parameters
+        ----------
+        chunk : np.ndarray
+            Numpy array of newly loaded chunk of events by EventsIterator,
+            containing fields ['x', 'y', 't', 'p'].
+        t_now : int, optional
+            Current time (in us) for dropping idle clusters, e.g. the end of
+            the chunk. Defaults to the latest timestamp in chunk (of either
+            polarity); if the chunk is empty too, no cluster is dropped.
+
+        Returns
+        -------
+        clusters : np.ndarray
+            Copy of the active clusters after the update.
+        """
+        if t_now is None and len(chunk) > 0:
+            t_now = chunk["t"].max()
+        evs = chunk if self.polarity is None else chunk[chunk["p"] == self.polarity]
+        if len(evs) == 0:
+            self._expire(t_now)
+            return self.clusters.copy()
+
+        assigned = self._assign(evs)
+        self._move(evs[assigned >= 0], assigned[assigned >= 0])
+        self._expire(t_now)
+        self._spawn(evs[assigned < 0])
+        return self.clusters.copy()
+
+    def _expire(self, t_now):
+        """drop the clusters without events for longer than max_idle_us"""
+        if t_now is not None:
+            idle = t_now - self.clusters["t"]
+            self.clusters = self.clusters[idle <= self.max_idle_us]
+
+    def _assign(self, evs):
+        """index of the nearest cluster within radius of each event, or -1"""
+        n_clusters = len(self.clusters)
+        if n_clusters == 0:
+            return np.full(len(evs), -1, dtype=np.int32)
+
+        # predicted cluster positions at the mean time of the chunk
+        dt = evs["t"].mean() - self.clusters["t"]
+        px = self.clusters["x"] + self.clusters["vx"] * dt
+        py = self.clusters["y"] + self.clusters["vy"] * dt
+
+        # stamp a disk around each prediction, nearest cluster first per pixel
+        sx = np.rint(px).astype(np.int64)[:, None] + self._disk_dx
+        sy = np.rint(py).astype(np.int64)[:, None] + self._disk_dy
+        owner = np.broadcast_to(np.arange(n_clusters)[:, None], sx.shape)
+        dist = (sx - px[:, None]) ** 2 + (sy - py[:, None]) ** 2
+        inside = (sx >= 0) & (sx < self.w) & (sy >= 0) & (sy < self.h)
+        pix = sy[inside] * self.w + sx[inside]
+        order = np.lexsort((dist[inside], pix))
+        pix = pix[order]
+        first = np.r_[True, pix[1:] != pix[:-1]]
+        pix = pix[first]
+        self._grid[pix] = owner[inside][order][first]
+
+        assigned = self._grid[evs["y"].astype(np.int64) * self.w + evs["x"]]
+        self._grid[pix] = -1
+        return assigned
+
+    def _move(self, evs, idx):
+        """move clusters to the centroid of their events and update velocity"""
+        n_clusters = len(self.clusters)
+        counts = np.bincount(idx, minlength=n_clusters)
+        hit = counts > 0
+        if not np.any(hit):
+            return
+        c = self.clusters
+        n = counts[hit]
+        mx = np.bincount(idx, evs["x"], minlength=n_clusters)[hit] / n
+        my = np.bincount(idx, evs["y"], minlength=n_clusters)[hit] / n
+        t0 = evs["t"].min()
+        mt = np.bincount(idx, evs["t"] - t0, minlength=n_clusters)[hit] / n + t0
+
+        elapsed = mt - c["t"][hit]
+        moved = elapsed > 0
+        vx = c["vx"][hit]
+        vy = c["vy"][hit]
+        s = self.smoothing
+        vx[moved] += s * ((mx - c["x"][hit])[moved] / elapsed[moved] - vx[moved])
+        vy[moved] += s * ((my - c["y"][hit])[moved] / elapsed[moved] - vy[moved])
+
+        c["x"][hit] = mx
+        c["y"][hit] = my
+        c["vx"][hit] = vx
+        c["vy"][hit] = vy
+        c["t"][hit] = np.maximum(mt, c["t"][hit])
+        c["n_events"][hit] += n
+
+    def _spawn(self, evs):
+        """start clusters from dense connected groups of unassigned events"""
+        if len(evs) < self.min_events:
+            return
+        evs = sort_by_time(evs)
+        # one time bin for the whole chunk, so only pixel adjacency matters
+        span = int(evs["t"].max() - evs["t"].min()) + 1
+        labels = label_events_3d(
+            evs, 1, span, self.h, self.w, self.backend, grids=self._label_grids
+        )
+        counts = np.bincount(labels)
+        dense = counts >= self.min_events
+        if not np.any(dense):
+            return
+
+        n = counts[dense]
+        t0 = evs["t"].min()
+        new = np.zeros(len(n), dtype=CLUSTER_DTYPE)
+        new["id"] = self._next_id + np.arange(len(n))
+        new["x"] = np.bincount(labels, evs["x"])[dense] / n
+        new["y"] = np.bincount(labels, evs["y"])[dense] / n
+        new["t"] = np.bincount(labels, evs["t"] - t0)[dense] / n + t0
+        new["n_events"] = n
+        self._next_id += len(n)
+        self.clusters = np.concatenate([self.clusters, new])
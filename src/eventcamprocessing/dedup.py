@@ -0,0 +1,190 @@
+"""
+Particle detection that reports each cluster once across overlapping windows.
+
+With t_accum_us larger than the chunk length, consecutive accumulation
+windows share events (with t_accum_us = 2 * dt every event is in two
+windows), so `ev_particlefinder` reports the same cluster of events in
+several windows and the tracker receives each particle about
+t_accum_us / dt times. `DedupParticleFinder` detects particles like
+`ev_particlefinder` and drops a detection when a large share of its events
+already belongs to a particle reported for an earlier window and the two
+centroids are close. The reported particles therefore have (almost)
+disjoint events and the tracker's input shrinks accordingly.
+
+A particle is then reported only every t_accum_us / dt windows, so the
+tracker must step at t_accum_us rather than dt: with dt bins every other bin
+would be empty and every track would end after one point. `tracking_bins`
+builds the tracker's time_array for this, and max_disp must cover the
+displacement over t_accum_us.
+
+Examples
+--------
+>>> finder = DedupParticleFinder(min_area=100)
+>>> for evs in mv_iterator:
+>>>     window = accumulate_events(window, evs, t_accum_us=20000)
+>>>     all_particles.extend(finder.update(window))
+>>> time_array = tracking_bins(t_start, t_end, dt=10000, t_accum_us=20000)
+>>> track_info = ev_particletracker(all_particles, max_disp, time_array)
+"""
+
+import numpy as np
+
+from eventcamprocessing.instrumentation import instrumented
+from eventcamprocessing.particle_detection import label_clusters
+
+_EVENT_KEY = np.dtype([("t", "i8"), ("x", "i4"), ("y", "i4")])
+
+
+def _event_keys(events):
+    keys = np.empty(len(events), dtype=_EVENT_KEY)
+    for name in _EVENT_KEY.names:
+        keys[name] = events[name]
+    return keys
+
+
+def tracking_bins(t_start, t_end, dt, t_accum_us):
+    """
+    time_array for `ev_particletracker` of particles from `DedupParticleFinder`.
+
+    The particles of a window have centroids near the window's center, and a
+    particle is reported once per t_accum_us. The bins are t_accum_us long
+    with edges halfway between consecutive window centers, so each bin holds
+    one report of every particle.
+
+    Parameters
+    ----------
+    t_start : int
+        Start (in us) of the first chunk.
+    t_end : int
+        Timestamp (in us) of the last event.
+    dt : int
+        Timestep (in us) of the chunk source.
+    t_accum_us : int
+        Timespan (in us) of the rolling accumulation window.
+
+    Returns
+    -------
+    time_array : np.ndarray
+        Bin edges; with t_accum_us = dt the usual time_array of dt bins.
+    """
+    first = t_start + (dt + t_accum_us) / 2 - t_accum_us
+    return np.arange(first, t_end + t_accum_us, t_accum_us)
+
+
+class DedupParticleFinder:
+    """
+    `ev_particlefinder` for overlapping windows, reporting each particle once.
+
+    Parameters
+    ----------
+    min_area : int
+        Minimum area (event count) for an event cluster to be considered a particle.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    min_shared : float
+        A detection is a duplicate if at least this fraction of its ON events
+        belongs to one particle reported for an earlier window...
+    max_dist : float or None
+        ...and its centroid is within max_dist pixels of that particle's
+        centroid. None disables the distance check.
+    roi : ROI, optional
+        As for `ev_particlefinder`: frames are sized to roi.shape and the
+        particles are returned in sensor coordinates.
+
+    Attributes
+    ----------
+    n_detected : int
+        Number of particles found by the plain finder so far.
+    n_reported : int
+        Number of particles reported by `update` so far.
+    """
+
+    def __init__(
+        self, min_area, h=720, w=1280, min_shared=0.25, max_dist=8.0, roi=None
+    ):
+        self.min_area = min_area
+        self.h, self.w = (h, w) if roi is None else roi.shape
+        self.min_shared = min_shared
+        self.max_dist = max_dist
+        self.roi = roi
+        self.n_detected = 0
+        self.n_reported = 0
+        # ON events of the reported particles that may reappear in later
+        # windows, with the centroid of their particle
+        self._events = np.empty(0, dtype=_EVENT_KEY)
+        self._owner = np.empty(0, dtype=np.int64)
+        self._owner_xy = np.empty((0, 2))
+        self._next_id = 0
+
+    @instrumented("dedup_particlefinder", output="particles")
+    def update(self, evs):
+        """
+        Detect the particles of the next window.
+
+        Parameters
+        ----------
+        evs : np.ndarray
+            Numpy array of current event window (updated by accumulate_events
+            and optionally filtered). Windows must be given in time order.
+
+        Returns
+        -------
+        particle_info : np.ndarray
+            The particles `ev_particlefinder` finds in evs that were not
+            reported for an earlier window, in the same order.
+        """
+        clusters, ON_events, event_clusters = label_clusters(
+            evs, h=self.h, w=self.w, return_labels=True
+        )
+        is_particle = clusters["area"] >= self.min_area
+        in_particle = is_particle[event_clusters]
+        keys = _event_keys(ON_events[in_particle])
+        owner_cluster = event_clusters[in_particle]
+
+        duplicate = np.zeros(len(clusters), dtype=bool)
+        if len(self._events) > 0 and len(keys) > 0:
+            _, i_new, i_old = np.intersect1d(keys, self._events, return_indices=True)
+            pairs, first, shared = np.unique(
+                np.stack([owner_cluster[i_new], self._owner[i_old]], axis=1),
+                axis=0,
+                return_index=True,
+                return_counts=True,
+            )
+            cluster = pairs[:, 0]
+            n_events = np.bincount(owner_cluster, minlength=len(clusters))
+            is_dup = shared >= self.min_shared * n_events[cluster]
+            if self.max_dist is not None:
+                old_xy = self._owner_xy[i_old[first]]
+                dist = np.hypot(
+                    clusters["x"][cluster] - old_xy[:, 0],
+                    clusters["y"][cluster] - old_xy[:, 1],
+                )
+                is_dup &= dist <= self.max_dist
+            duplicate[cluster[is_dup]] = True
+
+        report = is_particle & ~duplicate
+        particle_info = clusters[report]
+
+        # remember the events of the reported particles; events older than
+        # this window cannot be in later windows
+        ids = np.full(len(clusters), -1, dtype=np.int64)
+        ids[report] = self._next_id + np.arange(len(particle_info))
+        self._next_id += len(particle_info)
+        new = report[owner_cluster]
+        if len(evs) > 0:
+            keep = self._events["t"] >= evs["t"].min()
+        else:
+            keep = np.ones(len(self._events), dtype=bool)
+        self._events = np.concatenate([self._events[keep], keys[new]])
+        self._owner = np.concatenate([self._owner[keep], ids[owner_cluster[new]]])
+        new_xy = np.stack(
+            [clusters["x"][owner_cluster[new]], clusters["y"][owner_cluster[new]]],
+            axis=1,
+        )
+        self._owner_xy = np.concatenate([self._owner_xy[keep], new_xy])
+
+        self.n_detected += int(np.count_nonzero(is_particle))
+        self.n_reported += len(particle_info)
+        if self.roi is not None:
+            particle_info = self.roi.to_sensor(particle_info)
+        return particle_info
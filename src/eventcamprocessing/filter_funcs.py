@@ -4,11 +4,14 @@ Completed for the APC524 Group Assignment: Documentation of a File
 """
 
 import numpy as np
-from scipy.spatial import KDTree
+
+from eventcamprocessing.instrumentation import instrumented
+from eventcamprocessing.kernels import get_kernel
 
 
 ### Function 1: Shift Window
-def accumulate_events(window, new_chunk, t_accum_us):
+@instrumented("accumulate_events")
+def accumulate_events(window, new_chunk, t_accum_us, max_events=None):
     """
     Call inside an EventsIterator loop to shift the accumulation window forward,
     appending the new event chunk and discarding the old one.
@@ -23,6 +26,10 @@ def accumulate_events(window, new_chunk, t_accum_us):
         Numpy array of newly loaded chunk of events by EventsIterator.
     t_accum_us : int
         Timespan (in us) of the rolling accumulation window.
+    max_events : int, optional
+        Maximum number of events kept in the window. If the window would be
+        larger (e.g. during an event burst), only the newest max_events events
+        are kept. See `memory.plan_memory` for deriving it from a memory budget.
 
     Returns
     -------
@@ -60,18 +67,69 @@ def accumulate_events(window, new_chunk, t_accum_us):
 
     # If the window hasn't been initialized yet, create the window
     if window is None or len(window) == 0:
+        if max_events is not None and len(new_chunk) > max_events:
+            return new_chunk[len(new_chunk) - max_events :].copy()
         return new_chunk
 
     combined = np.concatenate([window, new_chunk])  # add new chunk to window
     cutoff_time = combined["t"][-1] - t_accum_us  # determine a cutoff for old events
-    new_window = combined[
-        combined["t"] >= cutoff_time
-    ]  # throw out old events no longer in the window
+    keep = combined["t"] >= cutoff_time
+    if max_events is not None:
+        keep_newest(keep, max_events)
+    new_window = combined[keep]  # throw out old events no longer in the window
 
     return new_window
 
 
+def keep_newest(keep, max_events):
+    """
+    Clear the oldest entries of a boolean mask in place, so at most
+    max_events remain set. Entries are assumed to be in time order.
+
+    Returns
+    -------
+    keep : np.ndarray
+        The mask.
+    """
+    kept = np.flatnonzero(keep)
+    if len(kept) > max_events:
+        keep[kept[: len(kept) - max_events]] = False
+    return keep
+
+
+def is_time_sorted(evs):
+    """Return True if the events are in non-decreasing order of 't'."""
+    t = evs["t"]
+    return len(t) < 2 or not np.any(t[1:] < t[:-1])
+
+
+def sort_by_time(evs, assume_sorted=False):
+    """
+    Events in time order.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing the field 't'.
+    assume_sorted : bool
+        If True, evs is returned as is without checking the order, e.g. for
+        windows from `accumulate_events` or `windows.time_windows`, which are
+        time-ordered whenever the chunks they are built from are.
+
+    Returns
+    -------
+    sorted_evs : np.ndarray
+        evs itself if it is already sorted, otherwise a copy sorted by a
+        stable argsort of the 't' column, so events with equal timestamps keep
+        their input order.
+    """
+    if assume_sorted or is_time_sorted(evs):
+        return evs
+    return evs[np.argsort(evs["t"], kind="stable")]
+
+
 # function 2: Isolated Noise Filter
+@instrumented("isolated_noise_filter")
 def isolated_noise_filter(
     evs, spatial_radius=20, time_window=1000, min_neighbors=3
 ) -> np.ndarray:
@@ -100,6 +158,38 @@ def isolated_noise_filter(
     We rescale each spatial dimension for efficiency
     """
 
+    n_neighbors = isolated_neighbor_counts(evs, spatial_radius, time_window)
+    mask = n_neighbors > min_neighbors
+
+    filtered_evs = evs[mask]
+    return filtered_evs
+
+
+def isolated_neighbor_counts(evs, spatial_radius=20, time_window=1000):
+    """
+    Count the events within spatial_radius and time_window of each event
+    (including the event itself), as used by `isolated_noise_filter`.
+
+    The counts only depend on the neighborhood size, so they can be computed
+    once and thresholded for several values of min_neighbors.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y', 't', 'p'].
+    spatial_radius : float
+        Pixel neighborhood radius to search for neighboring events.
+    time_window : float
+        Time window (in microseconds) to search for neighboring events.
+
+    Returns
+    -------
+    n_neighbors : np.ndarray
+        Integer array of length N with the neighbor count of each event.
+    """
+
+    from scipy.spatial import KDTree
+
     points = np.stack(
         [
             evs["x"] / spatial_radius,
@@ -111,14 +201,11 @@ def isolated_noise_filter(
 
     tree = KDTree(np.stack(points))
 
-    n_neighbors = tree.query_ball_point(points, r=1.0, p=np.inf, return_length=True)
-    mask = n_neighbors > min_neighbors
-
-    filtered_evs = evs[mask]
-    return filtered_evs
+    return tree.query_ball_point(points, r=1.0, p=np.inf, return_length=True)
 
 
-def low_pass_filter(window, min_dt, min_count):
+@instrumented("low_pass_filter")
+def low_pass_filter(window, min_dt, min_count, assume_sorted=False):
     """
     Low-pass temporal noise filter
 
@@ -146,6 +233,10 @@ def low_pass_filter(window, min_dt, min_count):
         For example, if min_count = 5, then the pixel must fire at least 5x before
         flicker classification.
 
+    assume_sorted: bool
+        If True, the window is known to be sorted by 't' (as windows from
+        'accumulate_events' are) and is not checked or sorted.
+
     Returns
     -------
     filtered_evs: np.ndarray
@@ -163,7 +254,7 @@ def low_pass_filter(window, min_dt, min_count):
     if len(window) == 0:
         return window
 
-    window = np.sort(window, order="t")
+    window = sort_by_time(window, assume_sorted)
     pixel_id = window["x"].astype(np.int32) << 16 | window["y"].astype(np.int32)
     unique_pixel_id, inverse = np.unique(pixel_id, return_inverse=True)
     remove_pixels = np.zeros(len(unique_pixel_id), dtype=bool)
@@ -184,7 +275,8 @@ def low_pass_filter(window, min_dt, min_count):
     return window[keep]
 
 
-def hot_pixel_filter(window, min_duration):
+@instrumented("hot_pixel_filter")
+def hot_pixel_filter(window, min_duration, backend="numpy", assume_sorted=False):
     """
     Hot pixel filter
 
@@ -206,6 +298,14 @@ def hot_pixel_filter(window, min_duration):
         Minimum duration in microseconds of same-polarity events required to
         classify it as a hot pixel.
 
+    backend: {"numpy", "numba"}
+        Implementation of the polarity run-length search. Both give identical
+        results; "numba" falls back to "numpy" if Numba is not installed.
+
+    assume_sorted: bool
+        If True, the window is known to be sorted by 't' (as windows from
+        'accumulate_events' are) and is not checked or sorted.
+
     Returns
     -------
     filtered_evs : np.ndarray
@@ -222,35 +322,30 @@ def hot_pixel_filter(window, min_duration):
     if window is None or len(window) == 0:
         return window
 
-    window = np.sort(window, order="t")
+    window = sort_by_time(window, assume_sorted)
 
     pixel_ids = window["x"].astype(np.int32) << 16 | window["y"].astype(np.int32)
 
     unique_pixel_id, inverse = np.unique(pixel_ids, return_inverse=True)
-    remove_mask = np.zeros(len(unique_pixel_id), dtype=bool)
 
-    for i in range(len(unique_pixel_id)):
-        idx = np.where(inverse == i)[0]
-
-        ts1 = window["t"][idx]
-        ps1 = window["p"][idx]
-
-        change_points = np.where(np.diff(ps1) != 0)[0] + 1
-        runs = np.split(ts1, change_points)
-
-        for run in runs:
-            if len(run) >= 2:
-                duration = run[-1] - run[0]
-                if duration >= min_duration:
-                    remove_mask[i] = True
-                    break
+    # group each pixel's events in time order, then find same-polarity runs
+    order = np.lexsort((window["p"], window["t"], inverse))
+    hot_pixels = get_kernel("hot_pixels", backend)
+    remove_mask = hot_pixels(
+        inverse[order],
+        window["t"][order],
+        window["p"][order],
+        len(unique_pixel_id),
+        min_duration,
+    )
 
     mask = ~remove_mask[inverse]
     return window[mask]
 
 
 ### Function 5: Opposite Polarity Filter
-def opposite_polarity_filter(evs, spatial_radius=20, time_scale=1):
+@instrumented("opposite_polarity_filter")
+def opposite_polarity_filter(evs, spatial_radius=20, time_scale=1, assume_sorted=False):
     """
     Pass events that have at least one opposite polarity neighbor nearby in space and time,
     using a KD-tree for efficient search.
@@ -264,11 +359,15 @@ def opposite_polarity_filter(evs, spatial_radius=20, time_scale=1):
         Pixel neighborhood radius to search for opposite polarity events.
     time_scale : float
         Scaling factor for time coordinates in the distance calculations.
+    assume_sorted : bool
+        If True, evs is known to be sorted by 't' and the output is not
+        checked or sorted.
 
     Returns
     -------
     filtered_evs : np.ndarray
-        Filtered events containing only those with opposite polarity neighbors.
+        Filtered events containing only those with opposite polarity neighbors,
+        sorted by 't'.
 
     Notes
     -----
@@ -280,14 +379,18 @@ def opposite_polarity_filter(evs, spatial_radius=20, time_scale=1):
     """
 
     # sort events by polarity
-    on_events = evs[evs["p"] == 1]
-    off_events = evs[evs["p"] == -1]
+    is_on = evs["p"] == 1
+    is_off = evs["p"] == -1
+    on_events = evs[is_on]
+    off_events = evs[is_off]
 
     # break if no opposite polarity events are found
     if len(on_events) == 0 or len(off_events) == 0:
         print("Found no opposite-polarity events.")
         return np.empty(0, dtype=evs.dtype)
 
+    from scipy.spatial import KDTree
+
     # build KD-tree in (x, y, t) space with scaled time coordinate
     on_coords = np.stack(
         [on_events["x"], on_events["y"], on_events["t"] * time_scale], axis=1
@@ -306,12 +409,11 @@ def opposite_polarity_filter(evs, spatial_radius=20, time_scale=1):
     off_indices = tree_on.query_ball_point(off_coords, r=spatial_radius, p=2)
     keep_off = np.array([len(neigh) > 0 for neigh in off_indices])
 
-    # combine filtered ON and OFF events
-    filtered_on = on_events[keep_on]
-    filtered_off = off_events[keep_off]
-    filtered_events = np.concatenate([filtered_on, filtered_off])
-
-    # re-sort by timestamp
-    filtered_events = np.sort(filtered_events, order="t")
+    # combine filtered ON and OFF events in their input order
+    keep = np.zeros(len(evs), dtype=bool)
+    keep[is_on] = keep_on
+    keep[is_off] = keep_off
+    filtered_events = evs[keep]
 
-    return filtered_events
+    # only unsorted input needs re-sorting by timestamp
+    return sort_by_time(filtered_events, assume_sorted)
@@ -0,0 +1,268 @@
+"""
+Per-stage timing and counters for the processing pipeline.
+
+The filter, detection and tracking functions are wrapped with `instrumented`.
+While no recorder is active the wrapper only checks a module-level variable
+and calls straight through, so instrumentation costs almost nothing when
+disabled. Inside ``with recording() as rec:`` every call of an instrumented
+function appends one record with its wall time, events in/out, output bytes
+and particle or track counts, which can then be summarized per stage and
+exported to CSV, JSON or `logging`.
+
+Examples
+--------
+>>> from eventcamprocessing import instrumentation
+>>> with instrumentation.recording() as rec:
+>>>     for evs in mv_iterator:
+>>>         with instrumentation.stage("decode") as st:
+>>>             st["events_out"] = len(evs)
+>>>         window = accumulate_events(window, evs, t_accum_us)
+>>>         particles = ev_particlefinder(window, min_area=100)
+>>> rec.log()
+>>> rec.to_csv("timings.csv")
+"""
+
+import contextlib
+import csv
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RECORD_FIELDS = (
+    "stage",
+    "chunk",
+    "wall_s",
+    "events_in",
+    "events_out",
+    "bytes_out",
+    "peak_alloc",
+    "particles",
+    "tracks",
+)
+SUMMARY_FIELDS = (
+    "stage",
+    "calls",
+    "total_s",
+    "mean_s",
+    "max_s",
+    "events_in",
+    "events_out",
+    "bytes_out",
+    "peak_alloc",
+    "particles",
+    "tracks",
+)
+
+_recorder = None
+
+
+class Recorder:
+    """
+    Collects one record per instrumented call.
+
+    Parameters
+    ----------
+    trace_memory : bool
+        If True, also record the peak memory allocated during each call using
+        `tracemalloc`. This slows down the run and the peak is process-wide,
+        so it is only meaningful when stages are not running concurrently.
+
+    Attributes
+    ----------
+    records : list of dict
+        One dict per call with the keys in RECORD_FIELDS. "chunk" counts the
+        calls of each stage, so it is the chunk index for per-window stages.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage, wall_s, **counters):
+        """Append a record for one call of stage."""
+        with self._lock:
+            rec = dict.fromkeys(RECORD_FIELDS)
+            rec.update(counters)
+            rec["stage"] = stage
+            rec["chunk"] = self._calls[stage]
+            rec["wall_s"] = wall_s
+            self._calls[stage] += 1
+            self.records.append(rec)
+
+    def summary(self):
+        """
+        Aggregate the records per stage.
+
+        Returns
+        -------
+        summary : dict
+            Maps each stage name to a dict with the keys in SUMMARY_FIELDS.
+            Counters are summed over calls, except peak_alloc which is the
+            maximum. Counters that were never recorded are None.
+        """
+        out = {}
+        for rec in self.records:
+            s = out.setdefault(
+                rec["stage"],
+                {
+                    **dict.fromkeys(SUMMARY_FIELDS),
+                    "calls": 0,
+                    "total_s": 0.0,
+                    "max_s": 0.0,
+                },
+            )
+            s["stage"] = rec["stage"]
+            s["calls"] += 1
+            s["total_s"] += rec["wall_s"]
+            s["max_s"] = max(s["max_s"], rec["wall_s"])
+            for key in ("events_in", "events_out", "bytes_out", "particles", "tracks"):
+                if rec[key] is not None:
+                    s[key] = (s[key] or 0) + rec[key]
+            if rec["peak_alloc"] is not None:
+                s["peak_alloc"] = max(s["peak_alloc"] or 0, rec["peak_alloc"])
+        for s in out.values():
+            s["mean_s"] = s["total_s"] / s["calls"]
+        return out
+
+    def to_csv(self, path, per_chunk=False):
+        """Write the per-stage summary (or every record) to a CSV file."""
+        fields = RECORD_FIELDS if per_chunk else SUMMARY_FIELDS
+        rows = self.records if per_chunk else self.summary().values()
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def to_json(self, path):
+        """Write the per-stage summary and every record to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "records": self.records}, f, indent=2)
+
+    def log(self, log=None, level=logging.INFO):
+        """Log one line per stage with the summary counters."""
+        log = log or logger
+        for s in self.summary().values():
+            counters = ", ".join(
+                f"{key}={s[key]}" for key in SUMMARY_FIELDS[5:] if s[key] is not None
+            )
+            log.log(
+                level,
+                "%s: %d calls, %.4f s total, %.4f s mean, %s",
+                s["stage"],
+                s["calls"],
+                s["total_s"],
+                s["mean_s"],
+                counters,
+            )
+
+
+@contextlib.contextmanager
+def recording(trace_memory=False):
+    """
+    Activate a new `Recorder` for the duration of the with-block.
+
+    Recording applies to instrumented calls on every thread, so stages run by
+    `run_pipeline` are recorded too. The previously active recorder (if any)
+    is restored on exit.
+    """
+    global _recorder
+    previous = _recorder
+    rec = Recorder(trace_memory=trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _recorder = rec
+    try:
+        yield rec
+    finally:
+        _recorder = previous
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def active_recorder():
+    """Return the active `Recorder`, or None if instrumentation is disabled."""
+    return _recorder
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Time a block of user code as a stage, e.g. decoding a chunk.
+
+    Yields a dict in which the block may set any of the counters in
+    RECORD_FIELDS (e.g. ``st["events_out"] = len(evs)``). When instrumentation
+    is disabled the dict is discarded.
+    """
+    rec = _recorder
+    counters = {}
+    if rec is None:
+        yield counters
+        return
+    t0 = time.perf_counter()
+    try:
+        yield counters
+    finally:
+        rec.record(name, time.perf_counter() - t0, **counters)
+
+
+def _n_events(args, kwargs):
+    n = 0
+    for a in (*args, *kwargs.values()):
+        if isinstance(a, np.ndarray) and a.dtype.names and "t" in a.dtype.names:
+            n += len(a)
+    return n
+
+
+def instrumented(name, output="events"):
+    """
+    Decorator recording each call of a pipeline function.
+
+    Parameters
+    ----------
+    name : str
+        Stage name used in the records.
+    output : {"events", "particles", "tracks"}
+        What the function returns. Its length is recorded as events_out,
+        particles or tracks respectively.
+    """
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rec = _recorder
+            if rec is None:
+                return func(*args, **kwargs)
+
+            if rec.trace_memory:
+                tracemalloc.reset_peak()
+                base, _ = tracemalloc.get_traced_memory()
+            t0 = time.perf_counter()
+            result = func(*args, **kwargs)
+            wall_s = time.perf_counter() - t0
+
+            counters = {"events_in": _n_events(args, kwargs)}
+            if rec.trace_memory:
+                counters["peak_alloc"] = tracemalloc.get_traced_memory()[1] - base
+            if isinstance(result, np.ndarray):
+                counters["bytes_out"] = result.nbytes
+            if output == "events":
+                counters["events_out"] = len(result) if result is not None else 0
+            else:
+                counters[output] = len(result)
+            rec.record(name, wall_s, **counters)
+            return result
+
+        return wrapper
+
+    return decorate
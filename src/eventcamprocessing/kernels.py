@@ -0,0 +1,238 @@
+"""
+Hot loops with interchangeable NumPy and Numba implementations.
+
+Functions that accept ``backend="numba"`` look up their kernel here with
+`get_kernel`. The Numba kernels are compiled on first use with cache=True, so
+later processes load them from the on-disk cache instead of recompiling. If
+Numba is not installed, ``backend="numba"`` falls back to the NumPy kernels,
+which produce identical outputs.
+"""
+
+import importlib.util
+
+import numpy as np
+
+# numba itself is only imported when a numba kernel is first requested
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+BACKENDS = ("numpy", "numba")
+
+# ev_particletracker's error bound for tracks with a known displacement
+TRACK_MAX_ERROR = np.sqrt(3)
+
+
+### hot pixel runs
+def _hot_pixels_numpy(pixel, t, p, n_pixels, min_duration):
+    # events are sorted by (pixel, t, p); a run ends where pixel or p changes
+    n = len(pixel)
+    if n == 0:
+        return np.zeros(n_pixels, dtype=bool)
+    new_run = np.ones(n, dtype=bool)
+    new_run[1:] = (pixel[1:] != pixel[:-1]) | (p[1:] != p[:-1])
+    run_start = np.flatnonzero(new_run)
+    run_end = np.append(run_start[1:], n) - 1
+    hot_run = (run_end > run_start) & (t[run_end] - t[run_start] >= min_duration)
+    hot = np.zeros(n_pixels, dtype=bool)
+    hot[pixel[run_start[hot_run]]] = True
+    return hot
+
+
+def _hot_pixels_loop(pixel, t, p, n_pixels, min_duration):
+    hot = np.zeros(n_pixels, dtype=np.bool_)
+    n = len(pixel)
+    start = 0
+    for i in range(1, n + 1):
+        if i == n or pixel[i] != pixel[i - 1] or p[i] != p[i - 1]:
+            if i - 1 > start and t[i - 1] - t[start] >= min_duration:
+                hot[pixel[start]] = True
+            start = i
+    return hot
+
+
+### track linking
+def _builtin_min(values):
+    # same result as Python's min() on a float array: NaN only if it comes first
+    if len(values) == 0 or np.isnan(values[0]):
+        return values[0] if len(values) else np.inf
+    return np.nanmin(values)
+
+
+def _link_tracks_numpy(pos_est, delta, extended, new_x, new_y, new_t, max_disp):
+    num_active = len(pos_est)
+    costs = np.zeros(num_active)
+    pairs = np.zeros(num_active, dtype=np.int64)
+    for tr in range(num_active):
+        if extended[tr]:  # enhance prediction if previous displacement is known
+            all_dists = (
+                ((pos_est[tr, 0] - new_x) / delta[tr, 0]) ** 2
+                + ((pos_est[tr, 1] - new_y) / delta[tr, 1]) ** 2
+                + ((pos_est[tr, 2] - new_t) / delta[tr, 2]) ** 2
+            )
+            max_disp_error = TRACK_MAX_ERROR
+        else:  # otherwise, use a simple displacement error
+            all_dists = (pos_est[tr, 0] - new_x) ** 2 + (pos_est[tr, 1] - new_y) ** 2
+            max_disp_error = max_disp
+
+        # if all distances are greater than max_disp, don't link
+        costs[tr] = _builtin_min(all_dists)
+        if costs[tr] > max_disp_error**2:
+            continue
+
+        # if there are two particles that minimize cost (or none, for a NaN
+        # cost), end the track
+        matches = np.flatnonzero(all_dists == costs[tr])
+        if len(matches) != 1:
+            continue
+        best_match = matches[0]
+
+        # check if this particle was claimed by another track
+        other_claims = np.flatnonzero(pairs == best_match)
+        if len(other_claims) > 0:
+            if costs[other_claims[0]] > costs[tr]:
+                pairs[other_claims[0]] = 0  # give particle to better-fitting track
+            else:
+                continue
+        pairs[tr] = best_match
+    return pairs
+
+
+def _link_tracks_loop(pos_est, delta, extended, new_x, new_y, new_t, max_disp):
+    num_active = pos_est.shape[0]
+    n_new = new_x.shape[0]
+    costs = np.zeros(num_active)
+    pairs = np.zeros(num_active, dtype=np.int64)
+    all_dists = np.empty(n_new)
+    for tr in range(num_active):
+        for j in range(n_new):
+            if extended[tr]:
+                dx = (pos_est[tr, 0] - new_x[j]) / delta[tr, 0]
+                dy = (pos_est[tr, 1] - new_y[j]) / delta[tr, 1]
+                dt = (pos_est[tr, 2] - new_t[j]) / delta[tr, 2]
+                all_dists[j] = dx * dx + dy * dy + dt * dt
+            else:
+                dx = pos_est[tr, 0] - new_x[j]
+                dy = pos_est[tr, 1] - new_y[j]
+                all_dists[j] = dx * dx + dy * dy
+        max_disp_error = TRACK_MAX_ERROR if extended[tr] else max_disp
+
+        cost = all_dists[0] if n_new > 0 else np.inf
+        for j in range(1, n_new):
+            if all_dists[j] < cost:
+                cost = all_dists[j]
+        costs[tr] = cost
+        if cost > max_disp_error * max_disp_error:
+            continue
+
+        n_matches = 0
+        best_match = -1
+        for j in range(n_new):
+            if all_dists[j] == cost:
+                n_matches += 1
+                best_match = j
+        if n_matches != 1:
+            continue
+
+        for other in range(num_active):
+            if pairs[other] == best_match:
+                if costs[other] > cost:
+                    pairs[other] = 0
+                    break
+                else:
+                    best_match = -1
+                    break
+        if best_match >= 0:
+            pairs[tr] = best_match
+    return pairs
+
+
+### time surface updates
+def _max_update_numpy(flat, ids, values):
+    np.maximum.at(flat, ids, values)
+    return flat
+
+
+def _max_update_loop(flat, ids, values):
+    for i in range(len(ids)):
+        if values[i] > flat[ids[i]]:
+            flat[ids[i]] = values[i]
+    return flat
+
+
+### connected components
+def _union_find_numpy(n_nodes, a, b):
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    graph = coo_matrix(
+        (np.ones(len(a), dtype=np.int8), (a, b)), shape=(n_nodes, n_nodes)
+    )
+    _, labels = connected_components(graph, directed=False)
+    return labels.astype(np.int64)
+
+
+def _union_find_loop(n_nodes, a, b):
+    # union by smaller root, so each root is the smallest node of its set
+    parent = np.arange(n_nodes)
+    for k in range(len(a)):
+        ra = a[k]
+        while parent[ra] != ra:
+            parent[ra] = parent[parent[ra]]
+            ra = parent[ra]
+        rb = b[k]
+        while parent[rb] != rb:
+            parent[rb] = parent[parent[rb]]
+            rb = parent[rb]
+        if ra < rb:
+            parent[rb] = ra
+        elif rb < ra:
+            parent[ra] = rb
+
+    # number the sets in order of their smallest node
+    labels = np.empty(n_nodes, dtype=np.int64)
+    root_label = np.full(n_nodes, -1, dtype=np.int64)
+    n_labels = 0
+    for i in range(n_nodes):
+        r = i
+        while parent[r] != r:
+            r = parent[r]
+        if root_label[r] < 0:
+            root_label[r] = n_labels
+            n_labels += 1
+        labels[i] = root_label[r]
+    return labels
+
+
+_KERNELS = {
+    "hot_pixels": (_hot_pixels_numpy, _hot_pixels_loop),
+    "link_tracks": (_link_tracks_numpy, _link_tracks_loop),
+    "max_update": (_max_update_numpy, _max_update_loop),
+    "union_find": (_union_find_numpy, _union_find_loop),
+}
+_compiled = {}
+
+
+def get_kernel(name, backend="numpy"):
+    """
+    Return the implementation of a kernel for a backend.
+
+    Parameters
+    ----------
+    name : {"hot_pixels", "link_tracks", "max_update", "union_find"}
+        Kernel name.
+    backend : {"numpy", "numba"}
+        Requested backend. "numba" falls back to "numpy" if Numba is not
+        installed.
+
+    Returns
+    -------
+    kernel : callable
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    numpy_kernel, loop_kernel = _KERNELS[name]
+    if backend == "numpy" or not HAVE_NUMBA:
+        return numpy_kernel
+    if name not in _compiled:
+        import numba
+
+        _compiled[name] = numba.njit(cache=True, error_model="numpy")(loop_kernel)
+    return _compiled[name]
@@ -0,0 +1,232 @@
+"""
+Memory-budgeted execution planning.
+
+`plan_memory` turns a memory budget into limits for the processing loop: the
+maximum number of events in an accumulation window, the tile size used for
+frame-based detection, the number of concurrent workers and the number of
+windows that may be in flight in a pipeline. The limits are enforced by
+passing the plan to `run_pipeline` or `run_sweep`, which detect particles
+tile by tile when the plan splits the frame (or max_window_events to
+`accumulate_events` and tile_shape to `tiling.tiled_particlefinder`
+directly), and `MemoryPlan.report` compares the estimates with the peak
+usage measured by `instrumentation.recording`.
+"""
+
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# bytes per pixel of the frames allocated by ev_particlefinder: binary frame
+# (u1), sum of int32 time offsets (i4; i8 only for windows spanning more
+# than 2**31 us), count (u4) and skimage's int64 label image
+FRAME_BYTES_PER_PIXEL = 1 + 4 + 4 + 8
+
+# extra bytes per event for the scaled (x, y, t) points, KD-tree and neighbor
+# counts built by isolated_noise_filter / opposite_polarity_filter
+FILTER_BYTES_PER_EVENT = 24 + 24 + 16 + 8
+
+# smallest tile side considered when the full sensor frame does not fit
+MIN_TILE = 64
+
+
+@dataclass(frozen=True)
+class MemoryPlan:
+    """
+    Limits derived by `plan_memory`.
+
+    Attributes
+    ----------
+    budget_bytes : int
+        Total memory budget the plan was derived for.
+    max_window_events : int
+        Maximum number of events kept in an accumulation window.
+    tile_shape : tuple of int
+        (height, width) of the tiles that keep the detection frames within
+        budget. Equal to the sensor shape when full frames fit.
+    n_workers : int
+        Number of windows that can be processed concurrently.
+    max_in_flight : int
+        Number of windows that may be buffered between pipeline stages.
+    stage_bytes : dict
+        Estimated peak bytes per stage for a full window.
+    """
+
+    budget_bytes: int
+    max_window_events: int
+    tile_shape: tuple
+    n_workers: int
+    max_in_flight: int
+    stage_bytes: dict = field(default_factory=dict)
+
+    def detection_tiles(self, h, w):
+        """
+        Tile shape for detecting particles in frames of h x w pixels.
+
+        Returns
+        -------
+        tile_shape : tuple of int or None
+            The planned tile shape, or None if a full h x w frame fits it.
+        """
+        th, tw = self.tile_shape
+        return None if th >= h and tw >= w else (th, tw)
+
+    def report(self, recorder):
+        """
+        Compare the estimated peak bytes per stage with the peaks measured by
+        a recorder created with ``instrumentation.recording(trace_memory=True)``.
+
+        Returns
+        -------
+        report : dict
+            Maps each recorded stage to a dict with the "estimated" bytes (None
+            for stages the plan does not model) and the measured "peak" bytes.
+        """
+        return {
+            name: {"estimated": self.stage_bytes.get(name), "peak": s["peak_alloc"]}
+            for name, s in recorder.summary().items()
+        }
+
+
+def event_bytes_per_stage(event_dtype):
+    """
+    Estimated bytes per window event for each stage.
+
+    Parameters
+    ----------
+    event_dtype : np.dtype
+        Dtype of the events, e.g. the dtype of an EventsIterator chunk.
+
+    Returns
+    -------
+    per_event : dict
+        Maps stage names to bytes per event.
+    """
+
+    itemsize = np.dtype(event_dtype).itemsize
+    return {
+        # old window + concatenated window + boolean mask + new window
+        "accumulate_events": 3 * itemsize + 1,
+        # filter temporaries + output copy
+        "isolated_noise_filter": FILTER_BYTES_PER_EVENT + itemsize,
+        "opposite_polarity_filter": FILTER_BYTES_PER_EVENT + itemsize,
+        # sort copy, pixel ids, unique inverse and output copy
+        "low_pass_filter": 2 * itemsize + 4 + 8 + 1,
+        "hot_pixel_filter": 2 * itemsize + 4 + 8 + 1,
+        # ON-event copy
+        "ev_particlefinder": itemsize,
+    }
+
+
+def plan_memory(
+    budget_bytes,
+    event_dtype,
+    h=720,
+    w=1280,
+    n_workers=None,
+    max_in_flight=4,
+    min_window_events=10_000,
+):
+    """
+    Derive processing limits that keep peak memory within a budget.
+
+    Parameters
+    ----------
+    budget_bytes : int
+        Memory available to the processing loop in bytes.
+    event_dtype : np.dtype
+        Dtype of the events.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    n_workers : int, optional
+        Maximum number of concurrent workers (default: number of CPUs). Fewer
+        are planned if each would get less than min_window_events.
+    max_in_flight : int
+        Maximum number of windows buffered between pipeline stages. Reduced
+        if the budget is too small to buffer that many full windows.
+    min_window_events : int
+        Smallest useful window. A budget that cannot hold this many events
+        for a single worker raises ValueError.
+
+    Returns
+    -------
+    plan : MemoryPlan
+
+    Notes
+    -----
+    A worker holds one window in the accumulator, runs the filters on it and
+    allocates the detection frames. Each worker's share of the budget, after
+    the frames and the windows buffered in flight, is divided by the largest
+    per-event cost of any stage to get max_window_events. If a full sensor
+    frame would take more than half of a worker's share, fewer workers are
+    planned; only when a single worker cannot fit a full frame is the frame
+    split into tiles so detection frames stay within half of the budget.
+    """
+
+    per_event = event_bytes_per_stage(event_dtype)
+    itemsize = np.dtype(event_dtype).itemsize
+    worst_event_bytes = max(per_event.values())
+    n_workers = n_workers or os.cpu_count() or 1
+
+    # prefer full sensor frames with fewer workers; tile only for one worker
+    attempts = [(workers, False) for workers in range(n_workers, 0, -1)]
+    attempts.append((1, True))
+    for workers, allow_tiles in attempts:
+        share = budget_bytes // workers
+        tile_shape = _fit_tile(share // 2, h, w, allow_tiles)
+        if tile_shape is None:
+            continue
+        frame_bytes = tile_shape[0] * tile_shape[1] * FRAME_BYTES_PER_PIXEL
+        fit = _fit_window(
+            share - frame_bytes,
+            worst_event_bytes,
+            itemsize,
+            workers,
+            max_in_flight,
+            min_window_events,
+        )
+        if fit is not None:
+            max_events, in_flight = fit
+            break
+    else:
+        raise ValueError(
+            f"A budget of {budget_bytes} bytes cannot hold a window of "
+            f"{min_window_events} events and a {MIN_TILE}x{MIN_TILE} tile."
+        )
+
+    stage_bytes = {name: b * max_events for name, b in per_event.items()}
+    stage_bytes["ev_particlefinder"] += frame_bytes
+    if tile_shape != (h, w):
+        stage_bytes["tiled_particlefinder"] = stage_bytes["ev_particlefinder"]
+    return MemoryPlan(
+        budget_bytes=int(budget_bytes),
+        max_window_events=max_events,
+        tile_shape=tile_shape,
+        n_workers=workers,
+        max_in_flight=in_flight,
+        stage_bytes=stage_bytes,
+    )
+
+
+def _fit_window(budget, event_bytes, itemsize, workers, max_in_flight, min_events):
+    """largest (max_events, in_flight) with at least min_events, or None"""
+    for in_flight in range(max_in_flight, -1, -1):
+        # every worker's window, plus the buffered windows split among workers
+        per_event = event_bytes + itemsize * in_flight / workers
+        max_events = int(budget // per_event)
+        if max_events >= min_events:
+            return max_events, in_flight
+    return None
+
+
+def _fit_tile(frame_budget, h, w, allow_tiles=True):
+    """largest tile (halving the longer side) whose frames fit frame_budget"""
+    th, tw = h, w
+    while th * tw * FRAME_BYTES_PER_PIXEL > frame_budget:
+        if not allow_tiles or max(th, tw) <= MIN_TILE:
+            return None
+        if th >= tw:
+            th = max((th + 1) // 2, MIN_TILE)
+        else:
+            tw = max((tw + 1) // 2, MIN_TILE)
+    return th, tw
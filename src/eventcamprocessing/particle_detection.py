@@ -1,8 +1,15 @@
 import numpy as np
-from skimage.measure import label, regionprops
 
+from eventcamprocessing.filter_funcs import sort_by_time
+from eventcamprocessing.instrumentation import instrumented
+from eventcamprocessing.kernels import get_kernel
+from eventcamprocessing.timebase import time_offsets
 
-def ev_particlefinder(evs, min_area, h=720, w=1280):
+PARTICLE_DTYPE = np.dtype([("x", "f4"), ("y", "f4"), ("t", "f8"), ("area", "i4")])
+
+
+@instrumented("ev_particlefinder", output="particles")
+def ev_particlefinder(evs, min_area, h=720, w=1280, roi=None):
     """
     Call inside an EventsIterator loop to detect particles in an event chunk.
     Particles are determined using an 8-connected components method, where
@@ -17,6 +24,10 @@ def ev_particlefinder(evs, min_area, h=720, w=1280):
         Minimum area (event count) for an event cluster to be considered a particle.
     h, w : int
         Height and width of the EVK sensor in pixels.
+    roi : ROI, optional
+        If evs were reduced with `roi.ROI.apply`, the frames are sized to
+        roi.shape instead of (h, w) and the centroids are returned in sensor
+        coordinates.
 
     Returns
     -------
@@ -26,15 +37,63 @@ def ev_particlefinder(evs, min_area, h=720, w=1280):
         area (# of events)
     """
 
+    if roi is not None:
+        h, w = roi.shape
+    clusters = label_clusters(evs, h=h, w=w)
+    particle_info = clusters[clusters["area"] >= min_area]
+    if roi is not None:
+        particle_info = roi.to_sensor(particle_info)
+
+    if len(particle_info) != 0:
+        print(
+            f"Found {len(particle_info)} particles at t = {round(particle_info['t'][-1] / 10e6, 5)} s."
+        )
+
+    return particle_info
+
+
+def label_clusters(evs, h=720, w=1280, return_labels=False):
+    """
+    Label every 8-connected cluster of ON events in a window, without any
+    area threshold. `ev_particlefinder` keeps the clusters with
+    area >= min_area, so the labeling can be shared between several min_area
+    values.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array of current event window (updated by accumulate_events).
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    return_labels : bool
+        If True, also return the ON events and the cluster of each of them.
+
+    Returns
+    -------
+    cluster_info : np.ndarray
+        Structured array with the same fields as the output of
+        `ev_particlefinder`, with one entry per cluster in label order.
+    ON_events : np.ndarray
+        The ON events of evs (only if return_labels is True).
+    event_clusters : np.ndarray
+        Index into cluster_info of each ON event (only if return_labels is
+        True).
+    """
+
+    from skimage.measure import label, regionprops
+
     ON_events = evs[evs["p"] == 1]  # use ON events for detecting particles
     # binary frame for clustering
     binary_frame = np.zeros((h, w), dtype=np.uint8)
     binary_frame[ON_events["y"], ON_events["x"]] = 1
 
-    # timestamp and count accumulator frames (for t-centroid)
-    ts_frame = np.zeros((h, w), dtype=np.float64)
+    # timestamp and count accumulator frames (for t-centroid); timestamps
+    # are int32 offsets from the earliest event, which are exact and half
+    # the size of absolute times
+    t_offsets, t_origin = time_offsets(ON_events["t"])
+    ts_frame = np.zeros((h, w), dtype=t_offsets.dtype)
     count_frame = np.zeros((h, w), dtype=np.uint32)
-    ts_frame[ON_events["y"], ON_events["x"]] += ON_events["t"]
+    ts_frame[ON_events["y"], ON_events["x"]] += t_offsets
     count_frame[ON_events["y"], ON_events["x"]] += 1
 
     # cluster events based on 8-connected components
@@ -43,9 +102,6 @@ def ev_particlefinder(evs, min_area, h=720, w=1280):
 
     particles = []
     for region in regions:
-        if region.area < min_area:  # filter out particles that are too small
-            continue
-
         # particle centroid
         y, x = region.centroid
 
@@ -54,21 +110,196 @@ def ev_particlefinder(evs, min_area, h=720, w=1280):
         x_coords = region.coords[:, 1]
 
         # calculate time centroid
-        t_sum = ts_frame[y_coords, x_coords].sum()
+        t_sum = ts_frame[y_coords, x_coords].sum(dtype=np.int64)
         t_count = count_frame[y_coords, x_coords].sum()
-        t_centroid = t_sum / t_count
+        t_centroid = t_sum / t_count + t_origin
 
         # append new particle info
         particles.append((x, y, t_centroid, region.area))
 
-    dtype = np.dtype([("x", "f4"), ("y", "f4"), ("t", "f8"), ("area", "i4")])
-    particle_info = np.array(
-        particles, dtype=dtype
-    )  # reformat particle info to structured array
+    # reformat cluster info to structured array
+    cluster_info = np.array(particles, dtype=PARTICLE_DTYPE)
+    if not return_labels:
+        return cluster_info
+    # labels are numbered from 1 in the same order as the regions
+    return cluster_info, ON_events, label_[ON_events["y"], ON_events["x"]] - 1
 
-    if len(particle_info) != 0:
-        print(
-            f"Found {len(particles)} particles at t = {round(particle_info['t'][-1] / 10e6, 5)} s."
-        )
 
-    return particle_info
+@instrumented("ev_particlefinder3d", output="particles")
+def ev_particlefinder3d(
+    evs,
+    min_area,
+    eps_xy=1,
+    eps_t=1000,
+    h=720,
+    w=1280,
+    backend="numpy",
+    assume_sorted=False,
+    roi=None,
+):
+    """
+    Detect particles by clustering ON events in (x, y, t) instead of in a 2D
+    frame of the whole window.
+
+    Two particles that cross the same pixels at different times within the
+    window are merged by `ev_particlefinder`, but stay separate here as long
+    as they pass more than 2 * eps_t apart. Windows can therefore be shorter,
+    and the cost depends on the number of events and the area they cover
+    rather than on the sensor size. See `label_events_3d` for how events are
+    grouped.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array of current event window (updated by accumulate_events).
+    min_area : int
+        Minimum number of events for a cluster to be considered a particle.
+    eps_xy : int
+        Voxel side in pixels. With eps_xy=1 neighboring pixels are connected
+        by edge or corner, as in `ev_particlefinder`.
+    eps_t : int
+        Voxel length in microseconds.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    backend : {"numpy", "numba"}
+        Implementation of the union-find, see `kernels.get_kernel`.
+    assume_sorted : bool
+        If True, evs is known to be sorted by 't' and is not checked.
+    roi : ROI, optional
+        If evs were reduced with `roi.ROI.apply`, the voxel grid covers
+        roi.shape instead of (h, w) and the centroids are returned in sensor
+        coordinates.
+
+    Returns
+    -------
+    particle_info : np.ndarray
+        Structured array with the same fields as the output of
+        `ev_particlefinder`: x, y and t are the mean event coordinates and
+        area is the number of events. Particles are ordered by their first
+        event.
+    """
+    if roi is not None:
+        h, w = roi.shape
+    ON_events = sort_by_time(evs[evs["p"] == 1], assume_sorted)
+    labels = label_events_3d(ON_events, eps_xy, eps_t, h, w, backend)
+    if len(labels) == 0:
+        return np.empty(0, dtype=PARTICLE_DTYPE)
+
+    area = np.bincount(labels)
+    t0 = ON_events["t"][0]
+    clusters = np.empty(len(area), dtype=PARTICLE_DTYPE)
+    clusters["x"] = np.bincount(labels, ON_events["x"]) / area
+    clusters["y"] = np.bincount(labels, ON_events["y"]) / area
+    clusters["t"] = np.bincount(labels, ON_events["t"] - t0) / area + t0
+    clusters["area"] = area
+    particle_info = clusters[clusters["area"] >= min_area]
+    return particle_info if roi is None else roi.to_sensor(particle_info)
+
+
+def label_events_3d(
+    evs, eps_xy=1, eps_t=1000, h=720, w=1280, backend="numpy", grids=None
+):
+    """
+    Label the spatio-temporal clusters of a time-sorted event array.
+
+    Events are binned into voxels of eps_xy x eps_xy pixels and eps_t
+    microseconds. Events in the same voxel, or in voxels that touch by face,
+    edge or corner, belong to the same cluster, similar to DBSCAN with a
+    fixed eps and no core-point threshold: events closer than eps in every
+    coordinate are always connected, events more than 2 * eps apart never
+    directly.
+
+    Time bins are visited in order with two lookup grids of voxel
+    representatives (the current and the previous bin), so each voxel is
+    linked to its neighbors with a constant number of lookups. The resulting
+    edges are merged with a union-find. The grids only cover the bounding
+    box of the events, so the cost is linear in the number of events plus
+    the area of their bounding box, which is at most the sensor size. With
+    grids reused from earlier calls it is linear in the number of events.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events sorted by 't', containing fields
+        ['x', 'y', 't'].
+    eps_xy : int
+        Voxel side in pixels.
+    eps_t : int
+        Voxel length in microseconds.
+    h, w : int
+        Height and width of the EVK sensor in pixels, which set the layout of
+        grids. Without grids they are unused.
+    backend : {"numpy", "numba"}
+        Implementation of the union-find, see `kernels.get_kernel`.
+    grids : tuple of two np.ndarray, optional
+        Flat int64 lookup grids of ``(-(-h // eps_xy) + 2) * (-(-w // eps_xy)
+        + 2)`` entries, all -1, used instead of allocating grids for the
+        bounding box of the events. Only the cells of the events are reset,
+        so they are all -1 again on return and can be reused by the caller.
+
+    Returns
+    -------
+    labels : np.ndarray
+        int64 cluster label of each event, numbered 0, 1, ... in order of
+        each cluster's first event.
+    """
+    n = len(evs)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # grids of the voxel cells in the events' bounding box (or the sensor)
+    # with a one-cell border, so neighbors never wrap
+    vy = evs["y"] // eps_xy
+    vx = evs["x"] // eps_xy
+    if grids is None:
+        y0, x0 = vy.min(), vx.min()
+        gh = int(vy.max() - y0) + 3
+        gw = int(vx.max() - x0) + 3
+        cur = np.full(gh * gw, -1, dtype=np.int64)
+        prev = np.full(gh * gw, -1, dtype=np.int64)
+    else:
+        y0 = x0 = 0
+        gw = -(-w // eps_xy) + 2
+        cur, prev = grids
+    cell = (vy - y0 + 1).astype(np.int64) * gw + (vx - x0 + 1)
+    tbin = (evs["t"] - evs["t"][0]) // eps_t
+    offsets = (np.arange(-1, 2)[:, None] * gw + np.arange(-1, 2)).ravel()
+
+    starts = np.flatnonzero(np.r_[True, tbin[1:] != tbin[:-1]])
+    stops = np.r_[starts[1:], n]
+    prev_cells, prev_bin = None, None
+    src, dst = [], []
+    for start, stop in zip(starts.tolist(), stops.tolist(), strict=True):
+        idx = np.arange(start, stop)
+        cells = cell[start:stop]
+
+        # one representative event per voxel; every event joins its voxel
+        cur[cells] = idx
+        reps = cur[cells]
+        src.append(idx)
+        dst.append(reps)
+
+        # link representatives to the neighboring voxels in this and the
+        # previous bin (links to the next bin are made from that bin)
+        is_rep = reps == idx
+        rep_idx = idx[is_rep]
+        neighbors = cells[is_rep][:, None] + offsets
+        grids = [cur]
+        if prev_bin is not None and tbin[start] == prev_bin + 1:
+            grids.append(prev)
+        for grid in grids:
+            found = grid[neighbors]
+            hit = found >= 0
+            src.append(np.broadcast_to(rep_idx[:, None], found.shape)[hit])
+            dst.append(found[hit])
+
+        # clear the older grid and reuse it for the next bin
+        if prev_cells is not None:
+            prev[prev_cells] = -1
+        prev, cur = cur, prev
+        prev_cells, prev_bin = cells, tbin[start]
+    # the other grid was cleared in the last step
+    prev[prev_cells] = -1
+
+    union_find = get_kernel("union_find", backend)
+    return union_find(n, np.concatenate(src), np.concatenate(dst))
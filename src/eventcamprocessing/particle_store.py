@@ -0,0 +1,161 @@
+"""
+Growable structured array for the particles of a recording.
+
+Collecting particles by appending each record to a Python list costs about
+100 bytes of Python objects per particle and a slow conversion back to a
+structured array at the end. `ParticleStore` instead copies each detection
+result in bulk into a preallocated structured array whose capacity doubles
+when full, so appending is amortized O(1) per particle with no per-record
+objects. Past an optional size threshold the array is moved to a memmapped
+file, so very long recordings do not have to fit in memory.
+
+Examples
+--------
+>>> store = ParticleStore()
+>>> for evs in mv_iterator:
+>>>     window = accumulate_events(window, evs, t_accum_us)
+>>>     store.extend(ev_particlefinder(window, min_area=100))
+>>> track_info = ev_particletracker(store, max_disp, time_array)
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE
+
+
+class ParticleStore:
+    """
+    Append-only structured array with amortized doubling.
+
+    Parameters
+    ----------
+    dtype : np.dtype
+        Dtype of the stored records (default: the particle dtype of
+        `ev_particlefinder`).
+    capacity : int
+        Initial number of records allocated.
+    spill_bytes : int, optional
+        Once the allocation would exceed this many bytes, the records are
+        moved to a memmapped file that keeps growing by doubling.
+    spill_path : str or Path, optional
+        File used for spilling. Defaults to a temporary file that is deleted
+        by `close`.
+
+    Notes
+    -----
+    The store can be passed anywhere an array is expected; ``np.asarray(store)``
+    returns a view of the records without copying.
+    """
+
+    def __init__(
+        self, dtype=PARTICLE_DTYPE, capacity=1024, spill_bytes=None, spill_path=None
+    ):
+        self.dtype = np.dtype(dtype)
+        self.spill_bytes = spill_bytes
+        self.spill_path = spill_path
+        self._data = np.empty(max(int(capacity), 1), dtype=self.dtype)
+        self._n = 0
+        self._spilled = False
+        self._temp_file = False
+
+    def __len__(self):
+        return self._n
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.array
+        if dtype is not None and np.dtype(dtype) != data.dtype:
+            return data.astype(dtype)
+        return data.copy() if copy else data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def array(self):
+        """View of the stored records (a memmap view once spilled)."""
+        return self._data[: self._n]
+
+    @property
+    def capacity(self):
+        """Number of records that fit without growing."""
+        return len(self._data)
+
+    @property
+    def spilled(self):
+        """True if the records live in a memmapped file."""
+        return self._spilled
+
+    def extend(self, particles):
+        """
+        Append an array of records, e.g. the output of `ev_particlefinder`.
+
+        Parameters
+        ----------
+        particles : np.ndarray
+            Structured array with the fields of the store's dtype, in the
+            same order.
+        """
+        n_new = len(particles)
+        if n_new == 0:
+            return
+        if self._n + n_new > len(self._data):
+            self._grow(self._n + n_new)
+        self._data[self._n : self._n + n_new] = particles
+        self._n += n_new
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self._data))
+        nbytes = capacity * self.dtype.itemsize
+        if self._spilled or (
+            self.spill_bytes is not None and nbytes > self.spill_bytes
+        ):
+            self._spill(capacity)
+        else:
+            data = np.empty(capacity, dtype=self.dtype)
+            data[: self._n] = self._data[: self._n]
+            self._data = data
+
+    def _spill(self, capacity):
+        """(re)map the records to a file holding capacity records"""
+        if not self._spilled:
+            if self.spill_path is None:
+                fd, self.spill_path = tempfile.mkstemp(suffix=".particles")
+                os.close(fd)
+                self._temp_file = True
+            old, n = self._data, self._n
+        else:
+            self._data.flush()
+            old, n = None, self._n
+            self._data = None
+
+        with open(self.spill_path, "r+b" if self._spilled else "w+b") as f:
+            f.truncate(capacity * self.dtype.itemsize)
+        data = np.memmap(
+            self.spill_path, dtype=self.dtype, mode="r+", shape=(capacity,)
+        )
+        if old is not None:
+            data[:n] = old[:n]
+        self._data = data
+        self._spilled = True
+
+    def close(self):
+        """
+        Empty the store and release the spill file, deleting it if it was a
+        temporary file. Copy the records first (``np.array(store)``) if they
+        are needed after closing.
+        """
+        if self._spilled:
+            self._data.flush()
+            if self._temp_file:
+                os.remove(self.spill_path)
+                self.spill_path = None
+                self._temp_file = False
+        self._data = np.empty(1, dtype=self.dtype)
+        self._n = 0
+        self._spilled = False
@@ -1,11 +1,13 @@
 import numpy as np
-from matplotlib import pyplot as plt
-from skimage.measure import label, regionprops
 
-from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.instrumentation import instrumented
+from eventcamprocessing.kernels import TRACK_MAX_ERROR, get_kernel
 
 
-def ev_particletracker(all_particles, max_disp, time_array):
+@instrumented("ev_particletracker", output="tracks")
+def ev_particletracker(
+    all_particles, max_disp, time_array, backend="numpy", n_strips=1, max_workers=None
+):
     """
     Call after ev_particlefinder has detected all particles in an event
     recording and stored information in a global array. Places particles
@@ -15,7 +17,7 @@ def ev_particletracker(all_particles, max_disp, time_array):
 
     Parameters
     ----------
-    all_particles : np.ndarray
+    all_particles : np.ndarray or ParticleStore
         Array of tuples. Each tuple has the following fields, pertaining
         to an identified particle: x (centroid), y (centroid), t (centroid),
         area (# of events)
@@ -27,6 +29,17 @@ def ev_particletracker(all_particles, max_disp, time_array):
         Most usefully constructed as time_array = np.arange(t_start, t_end + dt,
         dt), where t_start and t_end are the timestamps of the first and last
         events in the recording, and dt is the timestep used in EventsIterator.
+    backend : {"numpy", "numba"}
+        Implementation of the per-track cost and claim resolution loop. The
+        Numba kernel gives identical tracks and falls back to NumPy if Numba
+        is not installed.
+    n_strips : int
+        If larger than 1, split the tracks of each step into this many
+        vertical strips that are matched to the particles of the strip (plus
+        an overlap margin) on a thread pool. The tracks are identical to the
+        serial tracker, see `ParticleTracker`.
+    max_workers : int, optional
+        Number of threads used with n_strips > 1 (default: number of CPUs).
 
     Returns
     -------
@@ -38,41 +51,143 @@ def ev_particletracker(all_particles, max_disp, time_array):
         "T" : (np.ndarray) T-position at each coordinate
     """
 
+    tracker = ParticleTracker(
+        max_disp, backend=backend, n_strips=n_strips, max_workers=max_workers
+    )
+
     # sort particles by increasing time
-    p_sorted = np.asarray(sorted(all_particles, key=lambda p: p["t"]))
-
-    # using particles from first window, initialize tracks
-    ps_1 = p_sorted[(p_sorted["t"] > time_array[0]) & (p_sorted["t"] <= time_array[1])]
-    track_info = []
-    if len(ps_1) > 0:
-        for particle in ps_1:
-            track = {
+    all_particles = np.asarray(all_particles)
+    p_sorted = all_particles[np.argsort(all_particles["t"], kind="stable")]
+
+    # using particles from first window, initialize tracks, then loop over
+    # each window to track particles
+    for tt in range(len(time_array) - 1):
+        new_ps = p_sorted[
+            (p_sorted["t"] > time_array[tt]) & (p_sorted["t"] <= time_array[tt + 1])
+        ]
+        tracker.step(new_ps)
+
+        times = [
+            float(round(time_array[tt] / 10e6, 5)),
+            float(round(time_array[tt + 1] / 10e6, 5)),
+        ]
+        if tt == 0:
+            # log tracks that are active
+            print(
+                f"(1/{len(time_array)}): During times t = {times} s, "
+                f"there were {len(tracker.active)} active tracks and "
+                f"{tracker.n_tracks} total tracks."
+            )
+        else:
+            print(
+                f"({tt + 1}/{len(time_array)}): During times t = {times} s, "
+                f"there were {len(tracker.active)} active tracks, "
+                f"{tracker.n_new} new tracks, "
+                f"and {tracker.n_tracks} total tracks."
+            )
+
+    return [tracker.tracks[i] for i in range(tracker.n_tracks)]
+
+
+class ParticleTracker:
+    """
+    Incremental form of `ev_particletracker` that links the particles of one
+    time step at a time, so tracking can run while a recording is processed.
+
+    Calling `step` with the particles of each interval
+    (time_array[tt], time_array[tt + 1]] in turn gives the same tracks as
+    `ev_particletracker`. Tracks that are no longer active can be removed
+    from memory with `pop_finished`.
+
+    Parameters
+    ----------
+    max_disp : float
+        Maximum displacement in (x, y)-space for particles to be linked
+        in the same track (Only applied to tracks of length 1).
+    backend : {"numpy", "numba"}
+        Implementation of the linking loop, see `kernels.get_kernel`.
+    n_strips : int
+        Number of vertical strips the active tracks are split into for
+        linking (1 links all tracks at once with the linking kernel).
+    max_workers : int, optional
+        Number of threads linking strips concurrently (default: number of
+        CPUs).
+
+    Notes
+    -----
+    Tracks interact only through particles within their reach: max_disp for
+    tracks of length 1 and sqrt(3) times the previous displacement (per
+    axis) for longer ones. With n_strips > 1, the tracks of a step are
+    sorted by predicted x and split into strips of equal size, and each
+    strip's tracks are compared only with the particles in the strip widened
+    by the largest reach of its tracks, in vectorized blocks. Contested
+    particles are then given to the first track with the lowest cost, which
+    is the outcome of the kernel's sequential claim resolution, so the tracks
+    are identical to n_strips=1.
+
+    Attributes
+    ----------
+    tracks : dict
+        Maps track ids (numbered in order of creation, i.e. the index in the
+        output of `ev_particletracker`) to tracks with fields "L", "X", "Y"
+        and "T". Holds every track that has not been popped.
+    active : np.ndarray
+        Ids of the tracks that may be extended by the next step.
+    n_steps : int
+        Number of steps taken.
+    n_tracks : int
+        Number of tracks created.
+    n_new : int
+        Number of tracks created by the last step.
+    """
+
+    def __init__(self, max_disp, backend="numpy", n_strips=1, max_workers=None):
+        self.max_disp = max_disp
+        self.backend = backend
+        self.n_strips = n_strips
+        self.max_workers = max_workers
+        self.tracks = {}
+        self.active = np.empty(0, dtype=int)
+        self.n_steps = 0
+        self.n_tracks = 0
+        self.n_new = 0
+
+    def _new_tracks(self, particles):
+        for particle in particles:
+            self.tracks[self.n_tracks] = {
                 "L": 1,
                 "X": [float(particle["x"])],
                 "Y": [float(particle["y"])],
                 "T": [float(particle["t"])],
             }
-            track_info.append(track)
-    else:
-        pass
-
-    # log tracks that are active
-    num_active = len(ps_1)
-    active = np.arange(0, num_active, 1, dtype=int)
-    print(
-        f"(1/{len(time_array)}): During times "
-        f"t = {[float(round(time_array[0] / 10e6, 5)), float(round(time_array[1] / 10e6, 5))]} s, "
-        f"there were {num_active} active tracks and {len(track_info)} total tracks."
-    )
+            self.n_tracks += 1
+        self.n_new = len(particles)
+
+    def step(self, new_ps):
+        """
+        Link the particles of the next time step to the active tracks.
+
+        Parameters
+        ----------
+        new_ps : np.ndarray
+            Particles with time_array[tt] < t <= time_array[tt + 1], sorted by t.
+        """
+        if self.n_steps == 0:
+            first = self.n_tracks
+            self._new_tracks(new_ps)
+            self.active = np.arange(first, self.n_tracks, dtype=int)
+            self.n_steps += 1
+            return
+
+        link_tracks = get_kernel("link_tracks", self.backend)
+        active = self.active
+        num_active = len(active)
 
-    # loop over each window to track particles
-    for tt in range(1, len(time_array) - 1):
         # get current and previous locations for each active track
         current = np.zeros((num_active, 3))
         prev = np.zeros((num_active, 3))
         for tr in range(num_active):
-            # print(active[tr])
-            track = track_info[active[tr]]
+            track = self.tracks[active[tr]]
             current[tr, 0] = track["X"][track["L"] - 1]
             current[tr, 1] = track["Y"][track["L"] - 1]
             current[tr, 2] = track["T"][track["L"] - 1]
@@ -88,160 +203,194 @@ def ev_particletracker(all_particles, max_disp, time_array):
         delta = current - prev
         pos_est = current + delta
 
-        # initialize arrays for cost and linking
-        costs = np.zeros(num_active)
-        pairs = np.zeros(num_active)
-
-        new_ps = p_sorted[
-            (p_sorted["t"] > time_array[tt]) & (p_sorted["t"] <= time_array[tt + 1])
-        ]
+        first_new = self.n_tracks
         if len(new_ps) > 0:
-            # loop over active tracks to determine costs and pairs
-            for tr in range(num_active):
-                if (
-                    track_info[active[tr]]["L"] > 1
-                ):  # enhance prediction if previous displacement is known
-                    all_dists = (
-                        ((pos_est[tr, 0] - new_ps["x"]) / delta[tr, 0]) ** 2
-                        + ((pos_est[tr, 1] - new_ps["y"]) / delta[tr, 1]) ** 2
-                        + ((pos_est[tr, 2] - new_ps["t"]) / delta[tr, 2]) ** 2
-                    )
-                    max_disp_error = np.sqrt(
-                        3
-                    )  # assuming each component above is < ~O(1) for reliable tracks
-
-                else:  # otherwise, use a simple displacement error
-                    all_dists = (pos_est[tr, 0] - new_ps["x"]) ** 2 + (
-                        pos_est[tr, 1] - new_ps["y"]
-                    ) ** 2
-                    max_disp_error = (
-                        max_disp  # use global prescribed maximum displacement
-                    )
-
-                # if all distances are greater than max_disp, don't link
-                costs[tr] = min(all_dists)
-                if costs[tr] > max_disp_error**2:
-                    continue
-
-                # if there are two particles that minimize cost, end the track
-                if len(np.where(all_dists == costs[tr])[0]) > 1:
-                    continue
-
-                best_match = np.where(all_dists == costs[tr])[0][
-                    0
-                ]  # choose the best match
-
-                # check if this particle was claimed by another track
-                other_claims = np.where(pairs == best_match)[0]
-                if len(other_claims) > 0:
-                    if (
-                        costs[other_claims[0]] > costs[tr]
-                    ):  # give particle to better-fitting track
-                        pairs[other_claims[0]] = 0
-                    else:
-                        continue
-                pairs[tr] = best_match
+            # determine costs and pairs for every active track (pairs of 0
+            # are unlinked tracks)
+            extended = np.array([self.tracks[a]["L"] > 1 for a in active], dtype=bool)
+            args = (
+                pos_est,
+                delta,
+                extended,
+                new_ps["x"],
+                new_ps["y"],
+                new_ps["t"],
+                self.max_disp,
+            )
+            if self.n_strips > 1:
+                pairs = _link_tracks_strips(*args, self.n_strips, self.max_workers)
+            else:
+                pairs = link_tracks(*args)
 
             # add particles to tracks
             paired = np.zeros(len(new_ps))
             for tr in range(num_active):
                 if pairs[tr] != 0:
                     ind = int(pairs[tr])
-                    track = track_info[active[tr]]
+                    track = self.tracks[active[tr]]
                     track["L"] += 1
                     track["X"].append(float(new_ps[ind]["x"]))
                     track["Y"].append(float(new_ps[ind]["y"]))
                     track["T"].append(float(new_ps[ind]["t"]))
 
                     paired[ind] = 1
-            active = active[
-                pairs != 0
-            ]  # remove unpaired tracks from the list of active tracks
+            # remove unpaired tracks from the list of active tracks
+            active = active[pairs != 0]
 
             # create new tracks with unpaired particles
-            unpaired = np.where(paired == 0)[0]
-            new_tracks = []
-            for ii in range(len(unpaired)):
-                particle = new_ps[unpaired[ii]]
-                track = {
-                    "L": 1,
-                    "X": [float(particle["x"])],
-                    "Y": [float(particle["y"])],
-                    "T": [float(particle["t"])],
-                }
-                new_tracks.append(track)
-
+            self._new_tracks(new_ps[paired == 0])
         else:  # if no new particles
-            active = []
-            new_tracks = []
-            unpaired = []
-
-        if isinstance(active, np.ndarray):
-            active = active.tolist()
-        if len(new_tracks) > 0:
-            for ii in range(len(new_tracks)):
-                active.append(len(track_info) + ii)
-        active = np.asarray(active)
-        num_active = len(active)
-        if len(new_tracks) > 0:
-            for ii in range(len(new_tracks)):
-                track_info.append(new_tracks[ii])
-
-        print(
-            f"({tt + 1}/{len(time_array)}): During times "
-            f"t = {[float(round(time_array[tt] / 10e6, 5)), float(round(time_array[tt + 1] / 10e6, 5))]} s, "
-            f"there were {num_active} active tracks, {len(new_tracks)} new tracks, "
-            f"and {len(track_info)} total tracks."
+            active = np.empty(0, dtype=int)
+            self.n_new = 0
+
+        self.active = np.concatenate(
+            [active, np.arange(first_new, self.n_tracks)]
+        ).astype(int)
+        self.n_steps += 1
+
+    def step_bins(self, pending, t_start, dt, n_bins):
+        """
+        Step through the time bins of ``time_array = t_start + k * dt``.
+
+        Parameters
+        ----------
+        pending : np.ndarray
+            Particles not yet tracked, in any order.
+        t_start : int
+            First edge of the time_array.
+        dt : int
+            Length of the time bins.
+        n_bins : int
+            Step until this many bins (steps) are done.
+
+        Returns
+        -------
+        pending : np.ndarray
+            The particles after the last stepped bin. Particles before a
+            stepped bin are never tracked, as in `ev_particletracker`.
+        """
+        while self.n_steps < n_bins:
+            # numpy scalars compare like the time_array of ev_particletracker
+            lo, hi = t_start + np.arange(self.n_steps, self.n_steps + 2) * dt
+            in_bin = (pending["t"] > lo) & (pending["t"] <= hi)
+            new_ps = pending[in_bin]
+            self.step(new_ps[np.argsort(new_ps["t"], kind="stable")])
+            pending = pending[pending["t"] > hi]
+        return pending
+
+    def pop_finished(self):
+        """
+        Remove the tracks that are no longer active.
+
+        Returns
+        -------
+        finished : dict
+            Maps the ids of the removed tracks to the tracks, in id order.
+        """
+        active = set(self.active.tolist())
+        done = sorted(i for i in self.tracks if i not in active)
+        return {i: self.tracks.pop(i) for i in done}
+
+
+def _link_dists(pos_est, delta, extended, new_x, new_y, new_t):
+    """(track, particle) costs, with the expressions of the link_tracks kernel"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(
+            extended[:, None],
+            ((pos_est[:, 0:1] - new_x) / delta[:, 0:1]) ** 2
+            + ((pos_est[:, 1:2] - new_y) / delta[:, 1:2]) ** 2
+            + ((pos_est[:, 2:3] - new_t) / delta[:, 2:3]) ** 2,
+            (pos_est[:, 0:1] - new_x) ** 2 + (pos_est[:, 1:2] - new_y) ** 2,
         )
 
-    return track_info
-
 
-def plot_last_frame(raw_path, accum_time, min_area, height=720, width=1280):
+def _best_matches(pos_est, delta, extended, new_x, new_y, new_t, max_disp):
     """
-    Plot the last pseudoframe of a .raw recording, with
-    bounding boxes around identified particles
+    cost and index of the cheapest particle for each track; index -1 if the
+    track cannot be linked to these particles
     """
-
-    # load events from file
-    mv_it = EventsIterator(raw_path, delta_t=2000)
-    window = []
-
-    for evs in mv_it:
-        # update accumulation window
-        window = accumulate_events(window=window, new_chunk=evs, t_accum_us=accum_time)
-
-        # create binary frame
-        ON_events = window[window["p"] == 1]
-        frame = np.zeros((height, width), dtype=np.uint8)
-        frame[ON_events["y"], ON_events["x"]] = 1
-
-        # cluster events in frame
-        label_img = label(frame, connectivity=2)
-        regions = regionprops(label_img)
-
-    # Plot results
-    _fig, ax = plt.subplots(figsize=(10, 6))
-    plt.imshow(frame, cmap="gray", interpolation="none", vmin=0, vmax=1)
-    ax.set_title(
-        f"still frame with bounding boxes, acc={accum_time / 1000} ms, min area={min_area}"
+    dists = _link_dists(pos_est, delta, extended, new_x, new_y, new_t)
+    best = np.full(len(pos_est), -1, dtype=np.int64)
+    if dists.shape[1] == 0:
+        return best, np.full(len(pos_est), np.inf)
+    # NaN costs are skipped like in the kernel's minimum
+    costs = np.where(np.isnan(dists), np.inf, dists).min(axis=1)
+    matches = dists == costs[:, None]
+    max_error = np.where(extended, TRACK_MAX_ERROR**2, max_disp**2)
+    ok = (matches.sum(axis=1) == 1) & (costs <= max_error)
+    best[ok] = matches[ok].argmax(axis=1)
+    return best, costs
+
+
+def _link_tracks_strips(
+    pos_est, delta, extended, new_x, new_y, new_t, max_disp, n_strips, max_workers
+):
+    """pairs of the link_tracks kernel, computed strip by strip"""
+    from eventcamprocessing.tiling import _map_tiles
+
+    num_active = len(pos_est)
+    # the kernel's minimum is NaN (and the track unlinked) if the cost of the
+    # first particle is NaN, wherever that particle is
+    nan_first = np.isnan(
+        _link_dists(pos_est, delta, extended, new_x[:1], new_y[:1], new_t[:1])[:, 0]
     )
-    ax.axis("off")
-
-    for reg in regions:
-        if reg.area < min_area:
-            continue
-
-        miny, minx, maxy, maxx = reg.bbox
-        bb_buffer = 5  # edge buffer for bounding box
-        rect = plt.Rectangle(
-            (minx - bb_buffer, miny - bb_buffer),
-            maxx - minx + bb_buffer,
-            maxy - miny + bb_buffer,
-            fill=False,
-            edgecolor="red",
-            linewidth=1,
-        )
-        ax.add_patch(rect)
 
-    plt.show()
+    # particles further than a track's reach in x cost more than its
+    # threshold; one pixel of slack covers rounding
+    reach = np.where(extended, TRACK_MAX_ERROR * np.abs(delta[:, 0]), max_disp) + 1
+    by_x = np.argsort(new_x, kind="stable")
+    x_sorted = new_x[by_x]
+    strips = np.array_split(np.argsort(pos_est[:, 0], kind="stable"), n_strips)
+
+    def link_strip(tracks, block=256):
+        best = np.empty(len(tracks), dtype=np.int64)
+        costs = np.empty(len(tracks))
+        # tracks are sorted by x, so each block of them only needs the
+        # particles in a narrow range of x
+        for start in range(0, len(tracks), block):
+            rows = tracks[start : start + block]
+            est_x = pos_est[rows, 0]
+            margin = reach[rows].max()
+            lo = np.searchsorted(x_sorted, est_x.min() - margin, side="left")
+            hi = np.searchsorted(x_sorted, est_x.max() + margin, side="right")
+            # candidates in their original order, as ties are for the kernel
+            cand = np.sort(by_x[lo:hi])
+            b, c = _best_matches(
+                pos_est[rows],
+                delta[rows],
+                extended[rows],
+                new_x[cand],
+                new_y[cand],
+                new_t[cand],
+                max_disp,
+            )
+            best[start : start + block] = np.where(b >= 0, cand[np.maximum(b, 0)], -1)
+            costs[start : start + block] = c
+        return tracks, best, costs
+
+    best = np.full(num_active, -1, dtype=np.int64)
+    costs = np.full(num_active, np.inf)
+    for tracks, b, c in _map_tiles(link_strip, strips, max_workers):
+        best[tracks] = b
+        costs[tracks] = c
+    best[nan_first] = -1
+
+    # sequential claims give each particle to the first track with the
+    # lowest cost; the first particle is never linked (0 means unlinked)
+    claims = np.flatnonzero(best > 0)
+    order = np.lexsort((claims, costs[claims], best[claims]))
+    claims = claims[order]
+    winner = np.r_[True, best[claims][1:] != best[claims][:-1]]
+    pairs = np.zeros(num_active, dtype=np.int64)
+    pairs[claims[winner]] = best[claims[winner]]
+    return pairs
+
+
+def __getattr__(name):
+    # plot_last_frame moved to the optional plotting module, which imports
+    # matplotlib; keep the old import path working without loading it eagerly
+    if name == "plot_last_frame":
+        from eventcamprocessing.plotting import plot_last_frame
+
+        return plot_last_frame
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
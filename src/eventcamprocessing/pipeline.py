@@ -0,0 +1,388 @@
+"""
+Threaded producer/consumer pipeline for the accumulate -> filter -> detect ->
+track loop shown in scripts/example_run.py.
+
+Each stage runs on its own thread and hands work to the next stage through a
+bounded queue, so decoding (I/O), filtering (KD-tree queries release the GIL)
+and labeling overlap instead of idling while the others work.
+"""
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+from eventcamprocessing.filter_funcs import keep_newest
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE, ev_particlefinder
+from eventcamprocessing.particle_tracking import ParticleTracker
+from eventcamprocessing.tiling import tiled_particlefinder
+
+_STOP = object()
+_POLL_S = 0.05
+
+
+class _BufferPool:
+    """
+    Fixed set of preallocated event buffers shared between pipeline stages.
+
+    A buffer is handed out by `acquire` and returned to the pool once every
+    holder has called `release`. Buffers that are too small for a request are
+    replaced by a larger one, so the pool settles at the size of the largest
+    window seen (never more than max_capacity events, if given).
+    """
+
+    def __init__(self, n_buffers, dtype, capacity, stop, max_capacity=None):
+        self._dtype = dtype
+        self._max_capacity = max_capacity
+        self._stop = stop
+        self._free = queue.Queue()
+        self._refs = {}
+        self._lock = threading.Lock()
+        self.n_buffers = n_buffers
+        self.peak_in_use = 0
+        for _ in range(n_buffers):
+            self._free.put(np.empty(capacity, dtype=dtype))
+
+    def acquire(self, n, holders=1):
+        buf = None
+        while buf is None:
+            if self._stop.is_set():
+                raise _PipelineStopped
+            try:
+                buf = self._free.get(timeout=_POLL_S)
+            except queue.Empty:
+                continue
+        if len(buf) < n:
+            grown = 2 * len(buf)
+            if self._max_capacity is not None:
+                grown = min(grown, self._max_capacity)
+            buf = np.empty(max(n, grown), dtype=self._dtype)
+        with self._lock:
+            self._refs[id(buf)] = holders
+            self.peak_in_use = max(self.peak_in_use, len(self._refs))
+        return buf
+
+    def release(self, buf):
+        with self._lock:
+            self._refs[id(buf)] -= 1
+            if self._refs[id(buf)] > 0:
+                return
+            del self._refs[id(buf)]
+        self._free.put(buf)
+
+
+class _PipelineStopped(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+def _put(q, item, stop):
+    while True:
+        if stop.is_set():
+            raise _PipelineStopped
+        try:
+            q.put(item, timeout=_POLL_S)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q, stop):
+    while True:
+        if stop.is_set():
+            raise _PipelineStopped
+        try:
+            return q.get(timeout=_POLL_S)
+        except queue.Empty:
+            continue
+
+
+def _accumulate_into(pool, prev, prev_n, chunk, t_accum_us, max_events=None):
+    """
+    Same semantics as `accumulate_events`, but writes the new window into a
+    pooled buffer. The new window is held by the reader (to build the next
+    window) and by the downstream stages.
+    """
+    if prev is None or prev_n == 0:
+        if max_events is not None and len(chunk) > max_events:
+            chunk = chunk[len(chunk) - max_events :]
+        buf = pool.acquire(len(chunk), holders=2)
+        buf[: len(chunk)] = chunk
+        return buf, len(chunk)
+
+    window = prev[:prev_n]
+    last_t = chunk["t"][-1] if len(chunk) > 0 else window["t"][-1]
+    cutoff_time = last_t - t_accum_us
+    keep_window = window["t"] >= cutoff_time
+    keep_chunk = chunk["t"] >= cutoff_time
+    if max_events is not None:
+        # window events are older than chunk events in the combined order
+        n_excess = np.count_nonzero(keep_chunk) - max_events
+        if n_excess > 0:
+            keep_window[:] = False
+            keep_newest(keep_chunk, max_events)
+        else:
+            keep_newest(keep_window, -n_excess)
+    n_window = int(np.count_nonzero(keep_window))
+    n_chunk = int(np.count_nonzero(keep_chunk))
+
+    buf = pool.acquire(n_window + n_chunk, holders=2)
+    np.compress(keep_window, window, out=buf[:n_window])
+    buf[n_window : n_window + n_chunk] = chunk[keep_chunk]
+    return buf, n_window + n_chunk
+
+
+def run_pipeline(
+    chunks,
+    t_accum_us,
+    min_area,
+    filters=(),
+    max_disp=None,
+    dt=None,
+    h=720,
+    w=1280,
+    queue_size=4,
+    memory_plan=None,
+    roi=None,
+):
+    """
+    Run the accumulate -> filter -> detect -> track loop with one thread per
+    stage and bounded queues in between.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray
+        Source of event chunks, e.g. an EventsIterator. It is consumed on the
+        reader thread, so decoding overlaps with the downstream stages.
+    t_accum_us : int
+        Timespan (in us) of the rolling accumulation window.
+    min_area : int
+        Minimum area (event count) passed to `ev_particlefinder`.
+    filters : sequence of callables
+        Filters applied in order to each window, each taking and returning an
+        event array, e.g. ``functools.partial(isolated_noise_filter,
+        spatial_radius=5)``.
+    max_disp : float, optional
+        Maximum displacement of the tracker. Tracking is only run if both
+        max_disp and dt are given.
+    dt : int, optional
+        Timestep (in us) of the chunk source, used to build the tracker's
+        time_array as in scripts/example_run.py.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    queue_size : int
+        Maximum number of items waiting between two stages.
+    memory_plan : MemoryPlan, optional
+        Limits from `memory.plan_memory`. Windows are capped at
+        max_window_events (keeping the newest events), and at most
+        n_workers + max_in_flight windows (but at least 2, the reader's
+        previous and next window) exist at any time; queue_size is ignored.
+        If the plan splits the frame into tiles, particles are detected with
+        `tiling.tiled_particlefinder` one tile at a time.
+    roi : ROI, optional
+        Region of interest and decimation (`roi.ROI`) applied to each chunk
+        on the reader thread before it is copied into the window buffers.
+        Detection frames are sized to the ROI and particles are returned in
+        sensor coordinates.
+
+    Returns
+    -------
+    all_particles : np.ndarray
+        Structured array of every detected particle, in window order.
+    track_info : list or None
+        The tracks of `ev_particletracker` for
+        ``time_array = np.arange(t_start, t_end + dt, dt)``, or None if
+        tracking was not requested. The tracker stage steps a
+        `ParticleTracker` through each time bin as soon as no later window
+        can add particles to it, so tracking overlaps the other stages.
+    stats : dict
+        Per-stage utilization. Maps each stage name ("reader", "filter",
+        "finder", "tracker") to a dict with "items", "busy_s" and
+        "utilization" (busy time divided by the pipeline wall time), plus a
+        top level "wall_s" entry and "buffers", a dict with the "count" of
+        window buffers and the "peak_in_use".
+
+    Notes
+    -----
+    Windows are passed between stages in a fixed pool of preallocated buffers
+    (2 * queue_size + 4 of them, or the number given by memory_plan), so the
+    pool also bounds how many windows are in flight. Each stage processes its inputs in order, so the results are
+    identical to running the same loop serially.
+    """
+
+    max_events = None
+    tile_shape = None
+    frame_shape = roi.shape if roi is not None else (h, w)
+    n_buffers = 2 * queue_size + 4
+    if memory_plan is not None:
+        max_events = memory_plan.max_window_events
+        tile_shape = memory_plan.detection_tiles(*frame_shape)
+        n_buffers = max(2, memory_plan.n_workers + memory_plan.max_in_flight)
+        # the pool bounds the windows in flight, the queues need not
+        queue_size = n_buffers
+
+    stop = threading.Event()
+    errors = []
+    to_filter = queue.Queue(maxsize=queue_size)
+    to_finder = queue.Queue(maxsize=queue_size)
+    to_tracker = queue.Queue(maxsize=queue_size)
+    busy = {"reader": 0.0, "filter": 0.0, "finder": 0.0, "tracker": 0.0}
+    items = dict.fromkeys(busy, 0)
+    state = {"pool": None, "t_start": None, "t_end": None}
+    results = {"particles": [], "track_info": None}
+
+    def reader():
+        prev, prev_n = None, 0
+        it = iter(chunks)
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(it, _STOP)
+            if chunk is _STOP:
+                break
+            if roi is not None:
+                chunk = roi.apply(chunk)
+            if state["pool"] is None:
+                capacity = max(4 * len(chunk), 1024)
+                if max_events is not None:
+                    capacity = min(capacity, max_events)
+                state["pool"] = _BufferPool(
+                    n_buffers, chunk.dtype, capacity, stop, max_events
+                )
+            if len(chunk) > 0:
+                if state["t_start"] is None:
+                    state["t_start"] = chunk["t"][0]
+                state["t_end"] = chunk["t"][-1]
+            buf, n = _accumulate_into(
+                state["pool"], prev, prev_n, chunk, t_accum_us, max_events
+            )
+            if prev is not None:
+                state["pool"].release(prev)
+            prev, prev_n = buf, n
+            busy["reader"] += time.perf_counter() - t0
+            items["reader"] += 1
+            _put(to_filter, (buf, n), stop)
+        if prev is not None:
+            state["pool"].release(prev)
+
+    def filter_stage():
+        while (item := _get(to_filter, stop)) is not _STOP:
+            t0 = time.perf_counter()
+            buf, n = item
+            window = buf[:n]
+            # later windows start no earlier than this one
+            window_start = window["t"][0] if n > 0 else None
+            for f in filters:
+                window = f(window)
+            busy["filter"] += time.perf_counter() - t0
+            items["filter"] += 1
+            _put(to_finder, (buf, window, window_start), stop)
+
+    def finder_stage():
+        while (item := _get(to_finder, stop)) is not _STOP:
+            t0 = time.perf_counter()
+            buf, window, window_start = item
+            if tile_shape is None:
+                particles = ev_particlefinder(
+                    evs=window, min_area=min_area, h=h, w=w, roi=roi
+                )
+            else:
+                # one tile's frames at a time keep detection within the plan
+                particles = tiled_particlefinder(
+                    window, min_area, tile_shape, *frame_shape, max_workers=1
+                )
+                if roi is not None:
+                    particles = roi.to_sensor(particles)
+            state["pool"].release(buf)
+            busy["finder"] += time.perf_counter() - t0
+            items["finder"] += 1
+            _put(to_tracker, (particles, window_start), stop)
+
+    tracking = max_disp is not None and dt is not None
+
+    def tracker_stage():
+        tracker = ParticleTracker(max_disp) if tracking else None
+        pending = np.empty(0, dtype=PARTICLE_DTYPE)
+        while (item := _get(to_tracker, stop)) is not _STOP:
+            t0 = time.perf_counter()
+            particles, window_start = item
+            particles = particles.astype(PARTICLE_DTYPE, copy=False)
+            if len(particles) > 0:
+                results["particles"].append(particles)
+            if tracking and window_start is not None:
+                # bins ending before the window start receive no more
+                # particles, so they are tracked while the stream is read
+                t_start = state["t_start"]
+                pending = tracker.step_bins(
+                    np.concatenate([pending, particles]),
+                    t_start,
+                    dt,
+                    int(np.ceil((window_start - t_start) / dt)) - 1,
+                )
+            busy["tracker"] += time.perf_counter() - t0
+            items["tracker"] += 1
+
+        t0 = time.perf_counter()
+        results["particles"] = _concat_particles(results["particles"])
+        if tracking and state["t_start"] is not None:
+            n_bins = len(np.arange(state["t_start"], state["t_end"] + dt, dt)) - 1
+            tracker.step_bins(pending, state["t_start"], dt, n_bins)
+            results["track_info"] = [tracker.tracks[i] for i in range(tracker.n_tracks)]
+        busy["tracker"] += time.perf_counter() - t0
+
+    stages = [
+        ("reader", reader, to_filter),
+        ("filter", filter_stage, to_finder),
+        ("finder", finder_stage, to_tracker),
+        ("tracker", tracker_stage, None),
+    ]
+
+    def run_stage(fn, downstream):
+        try:
+            fn()
+        except _PipelineStopped:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if downstream is not None:
+                try:
+                    _put(downstream, _STOP, stop)
+                except _PipelineStopped:
+                    pass
+
+    wall_t0 = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_stage, args=(fn, downstream), name=name)
+        for name, fn, downstream in stages
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_s = time.perf_counter() - wall_t0
+
+    if errors:
+        raise errors[0]
+
+    stats = {
+        name: {
+            "items": items[name],
+            "busy_s": busy[name],
+            "utilization": busy[name] / wall_s if wall_s > 0 else 0.0,
+        }
+        for name in busy
+    }
+    stats["wall_s"] = wall_s
+    pool = state["pool"]
+    stats["buffers"] = {
+        "count": n_buffers,
+        "peak_in_use": 0 if pool is None else pool.peak_in_use,
+    }
+    return results["particles"], results["track_info"], stats
+
+
+def _concat_particles(particle_arrays):
+    if len(particle_arrays) == 0:
+        return np.empty(0, dtype=PARTICLE_DTYPE)
+    return np.concatenate(particle_arrays)
@@ -0,0 +1,280 @@
+"""
+Checkpointed driver for the accumulate -> filter -> detect -> track loop of
+scripts/example_run.py.
+
+`run_recording` tracks particles while the recording is read, using the
+incremental `ParticleTracker`, instead of after all particles are detected.
+Every checkpoint_every_s seconds it atomically saves the reader position
+(the end timestamp of the last chunk read), the accumulation window, the
+particles waiting for their time step, the tracker state and the positions
+of the output writers. If the run is interrupted, calling `run_recording`
+again with the same arguments continues from the checkpoint, giving the same
+particles and tracks as an uninterrupted run. Given a chunk source factory,
+the reader restarts at the saved position, so the chunks processed before
+the checkpoint are not decoded again.
+
+Examples
+--------
+>>> particles, tracks = run_recording(
+>>>     partial(read_chunks, raw_file, dt), t_accum_us, min_area=100, dt=dt,
+>>>     max_disp=8, particles_path="particles.npz", tracks_path="tracks.npz",
+>>>     checkpoint_path="run.ckpt.npz",
+>>> )
+"""
+
+import itertools
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE, ev_particlefinder
+from eventcamprocessing.particle_store import ParticleStore
+from eventcamprocessing.particle_tracking import ParticleTracker
+from eventcamprocessing.storage import ParticleWriter, TrackWriter, tracks_to_records
+
+
+def _records_to_tracks(records):
+    """inverse of tracks_to_records: maps track ids to tracks"""
+    ids, starts = np.unique(records["track_id"], return_index=True)
+    bounds = np.r_[starts, len(records)]
+    tracks = {}
+    for k, track_id in enumerate(ids.tolist()):
+        part = records[bounds[k] : bounds[k + 1]]
+        tracks[track_id] = {
+            "L": len(part),
+            "X": part["x"].tolist(),
+            "Y": part["y"].tolist(),
+            "T": part["t"].tolist(),
+        }
+    return tracks
+
+
+def _save_checkpoint(path, meta, **arrays):
+    """write to a temporary file and rename, so a crash leaves the old checkpoint"""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _load_checkpoint(path):
+    with np.load(path, allow_pickle=False) as f:
+        arrays = {name: f[name] for name in f.files}
+    return json.loads(str(arrays.pop("meta"))), arrays
+
+
+def run_recording(
+    chunks,
+    t_accum_us,
+    min_area,
+    dt,
+    max_disp,
+    filters=(),
+    h=720,
+    w=1280,
+    particles_path=None,
+    tracks_path=None,
+    checkpoint_path=None,
+    checkpoint_every_s=60,
+    resume=True,
+    backend="numpy",
+):
+    """
+    Detect and track the particles of a recording with periodic checkpoints.
+
+    Parameters
+    ----------
+    chunks : callable or iterable of np.ndarray
+        Source of time-ordered event chunks. Either a factory taking a start
+        timestamp and returning the chunks of dt from there on, i.e.
+        [start_ts + k * dt, start_ts + (k + 1) * dt) (leading empty chunks
+        may be skipped), e.g. ``partial(batch.read_chunks, path, dt)`` or
+        ``lambda start_ts: EventsIterator(path, delta_t=dt, start_ts=start_ts)``,
+        or the chunks themselves. A factory is called with 0 and, when
+        resuming, with the position saved in the checkpoint. Plain chunks
+        must be given again when resuming, and the chunks processed before
+        the checkpoint are read and skipped.
+    t_accum_us : int
+        Timespan (in us) of the rolling accumulation window.
+    min_area : int
+        Minimum area (event count) passed to `ev_particlefinder`.
+    dt : int
+        Timestep (in us) of the chunk source, used for the tracker's time
+        steps as in scripts/example_run.py.
+    max_disp : float
+        Maximum displacement passed to the tracker.
+    filters : sequence of callables
+        Filters applied in order to each window, each taking and returning an
+        event array. They must be deterministic for resumed runs to match.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    particles_path, tracks_path : str or Path, optional
+        Write particles (`ParticleWriter`) and finished tracks
+        (`TrackWriter`) to these files instead of keeping them in memory.
+    checkpoint_path : str or Path, optional
+        File holding the checkpoint. No checkpoints are written if not given.
+        The file is deleted when the run completes.
+    checkpoint_every_s : float
+        Minimum wall time (in s) between checkpoints; 0 checkpoints after
+        every chunk.
+    resume : bool
+        Continue from checkpoint_path if it exists. Otherwise the checkpoint
+        and any partial outputs are overwritten.
+    backend : {"numpy", "numba"}
+        Implementation of the tracker's linking loop.
+
+    Returns
+    -------
+    all_particles : np.ndarray or None
+        Every detected particle in window order, or None if they were
+        written to particles_path.
+    track_info : list or None
+        The tracks of `ev_particletracker` for
+        ``time_array = np.arange(t_start, t_end + dt, dt)``, or None if they
+        were written to tracks_path (with their index in that list as
+        track_id).
+    """
+    checkpointing = checkpoint_path is not None
+    meta, arrays = None, {}
+    if checkpointing:
+        checkpoint_path = Path(checkpoint_path)
+        if resume and checkpoint_path.exists():
+            meta, arrays = _load_checkpoint(checkpoint_path)
+
+    def writer_state(name):
+        return None if meta is None else meta["writers"].get(name)
+
+    particles_out = (
+        ParticleWriter(
+            particles_path,
+            checkpointing=checkpointing,
+            resume=writer_state("particles"),
+        )
+        if particles_path is not None
+        else ParticleStore()
+    )
+    tracks_out = None
+    if tracks_path is not None:
+        tracks_out = TrackWriter(
+            tracks_path, checkpointing=checkpointing, resume=writer_state("tracks")
+        )
+
+    tracker = ParticleTracker(max_disp, backend=backend)
+    window = []
+    pending = np.empty(0, dtype=PARTICLE_DTYPE)
+    n_chunks, t_start, t_last, t_read = 0, None, None, 0
+    if meta is not None:
+        n_chunks, t_start, t_last = meta["n_chunks"], meta["t_start"], meta["t_last"]
+        t_read = meta["t_read"]
+        window = arrays["window"] if meta["has_window"] else []
+        pending = arrays["pending"]
+        if particles_path is None:
+            particles_out.extend(arrays["particles"])
+        tracker.tracks = _records_to_tracks(arrays["tracks"])
+        tracker.active = arrays["active"].astype(int)
+        tracker.n_steps = meta["n_steps"]
+        tracker.n_tracks = meta["n_tracks"]
+
+    def advance(n_bins):
+        """step the tracker up to bin n_bins and write the finished tracks"""
+        nonlocal pending
+        pending = tracker.step_bins(pending, t_start, dt, n_bins)
+        if tracks_out is not None:
+            finished = tracker.pop_finished()
+            tracks_out.write_tracks(list(finished.values()), track_ids=list(finished))
+
+    def checkpoint():
+        writers = {}
+        if particles_path is not None:
+            writers["particles"] = particles_out.checkpoint()
+        if tracks_out is not None:
+            writers["tracks"] = tracks_out.checkpoint()
+        has_window = len(window) > 0
+        state = {
+            "n_chunks": n_chunks,
+            "t_start": t_start,
+            "t_last": t_last,
+            "t_read": t_read,
+            "has_window": has_window,
+            "n_steps": tracker.n_steps,
+            "n_tracks": tracker.n_tracks,
+            "writers": writers,
+        }
+        tracks = tracker.tracks
+        _save_checkpoint(
+            checkpoint_path,
+            state,
+            window=window if has_window else np.empty(0),
+            pending=pending,
+            particles=(
+                np.asarray(particles_out)
+                if particles_path is None
+                else np.empty(0, dtype=PARTICLE_DTYPE)
+            ),
+            tracks=tracks_to_records(list(tracks.values()), track_ids=list(tracks)),
+            active=tracker.active,
+        )
+
+    if callable(chunks):
+        source = chunks(t_read)
+    else:
+        source = itertools.islice(chunks, n_chunks, None)
+
+    last_checkpoint = time.monotonic()
+    for evs in source:
+        if len(evs) > 0:
+            if t_start is None:
+                t_start = int(evs["t"][0])
+            t_last = int(evs["t"][-1])
+            # end of the chunk of dt holding the first event
+            t_read += ((int(evs["t"][0]) - t_read) // dt + 1) * dt
+        else:
+            t_read += dt
+
+        window = accumulate_events(window=window, new_chunk=evs, t_accum_us=t_accum_us)
+        filtered = window
+        for f in filters:
+            filtered = f(filtered)
+        particles = ev_particlefinder(evs=filtered, min_area=min_area, h=h, w=w)
+        particles = particles.astype(PARTICLE_DTYPE, copy=False)
+        if particles_path is not None:
+            particles_out.write(particles)
+        else:
+            particles_out.extend(particles)
+        pending = np.concatenate([pending, particles])
+        n_chunks += 1
+
+        # later windows only hold events from the start of this window on, so
+        # bins ending before it receive no more particles
+        if len(window) > 0:
+            advance(int(np.ceil((window["t"][0] - t_start) / dt)) - 1)
+
+        if checkpointing and time.monotonic() - last_checkpoint >= checkpoint_every_s:
+            checkpoint()
+            last_checkpoint = time.monotonic()
+
+    if t_start is not None:
+        advance(len(np.arange(t_start, t_last + dt, dt)) - 1)
+
+    all_particles = None
+    if particles_path is None:
+        all_particles = np.array(particles_out)
+    particles_out.close()
+
+    track_info = None
+    if tracks_out is not None:
+        remaining = tracker.tracks
+        tracks_out.write_tracks(list(remaining.values()), track_ids=list(remaining))
+        tracks_out.close()
+    else:
+        track_info = [tracker.tracks[i] for i in range(tracker.n_tracks)]
+
+    if checkpointing and checkpoint_path.exists():
+        checkpoint_path.unlink()
+    return all_particles, track_info
@@ -0,0 +1,209 @@
+"""
+Frame representations of event windows.
+
+All renderers work on flat pixel ids (y * w + x) with unbuffered
+`ufunc.at` updates, so their cost is linear in the number of events with no
+Python loop. Each accepts an optional `out` array; the frame is accumulated
+directly in it, so when rendering video frames in a loop, passing the same
+`out` on every call allocates no frame-sized array at all.
+"""
+
+import numpy as np
+
+from eventcamprocessing.kernels import get_kernel
+
+
+def pixel_ids(evs, shape):
+    """
+    Flat pixel index y * w + x of each event.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y'].
+    shape : tuple of int
+        (h, w) of the frame.
+
+    Returns
+    -------
+    ids : np.ndarray
+        int64 array of length N.
+    """
+    return evs["y"].astype(np.int64) * shape[1] + evs["x"]
+
+
+def _output(out, shape, dtype):
+    if out is None:
+        return np.zeros(shape, dtype=dtype)
+    if out.shape != tuple(shape):
+        raise ValueError(f"out has shape {out.shape}, expected {tuple(shape)}")
+    if not out.flags.c_contiguous:
+        raise ValueError("out must be C-contiguous")
+    return out
+
+
+def event_counts(evs, shape, out=None):
+    """
+    Number of events at each pixel.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y'].
+    shape : tuple of int
+        (h, w) of the frame.
+    out : np.ndarray, optional
+        Array of shape (h, w) to write the frame into.
+
+    Returns
+    -------
+    img : np.ndarray
+        (h, w) int32 count image (or out).
+    """
+    img = _output(out, shape, np.int32)
+    flat = img.reshape(-1)
+    flat.fill(0)
+    np.add.at(flat, pixel_ids(evs, shape), 1)
+    return img
+
+
+def polarity_counts(evs, shape, out=None):
+    """
+    Number of ON (p > 0) and OFF events at each pixel.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y', 'p'].
+    shape : tuple of int
+        (h, w) of the frame.
+    out : np.ndarray, optional
+        Array of shape (2, h, w) to write the frames into.
+
+    Returns
+    -------
+    img : np.ndarray
+        (2, h, w) int32 array with ON counts in img[0] and OFF counts in
+        img[1] (or out).
+    """
+    h, w = shape
+    img = _output(out, (2, h, w), np.int32)
+    flat = img.reshape(-1)
+    flat.fill(0)
+    np.add.at(flat, pixel_ids(evs, shape) + (evs["p"] <= 0) * (h * w), 1)
+    return img
+
+
+def time_surface(evs, shape, out=None, fill=0, backend="numpy"):
+    """
+    Latest event timestamp at each pixel (surface of active events).
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y', 't'].
+        Need not be sorted.
+    shape : tuple of int
+        (h, w) of the frame.
+    out : np.ndarray, optional
+        Array of shape (h, w) to write the surface into.
+    fill : int
+        Value at pixels without events.
+    backend : {"numpy", "numba"}
+        Implementation of the per-event update, see `kernels.get_kernel`.
+
+    Returns
+    -------
+    surface : np.ndarray
+        (h, w) int64 array (or out).
+    """
+    surface = _output(out, shape, np.int64)
+    flat = surface.reshape(-1)
+    empty = np.iinfo(surface.dtype).min
+    flat.fill(empty)
+    max_update = get_kernel("max_update", backend)
+    max_update(flat, pixel_ids(evs, shape), evs["t"])
+    flat[flat == empty] = fill
+    return surface
+
+
+def decayed_time_surface(evs, shape, t_ref, tau, out=None, backend="numpy"):
+    """
+    Exponentially decayed time surface exp(-(t_ref - t_last) / tau), where
+    t_last is the latest event timestamp at each pixel. Pixels without events
+    are 0.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y', 't'].
+    shape : tuple of int
+        (h, w) of the frame.
+    t_ref : float
+        Reference time in microseconds, usually the end of the window.
+    tau : float
+        Decay constant in microseconds.
+    out : np.ndarray, optional
+        Float array of shape (h, w) to write the surface into.
+    backend : {"numpy", "numba"}
+        Implementation of the per-event update, see `kernels.get_kernel`.
+
+    Returns
+    -------
+    surface : np.ndarray
+        (h, w) float32 array with values in [0, 1] for events before t_ref
+        (or out).
+    """
+    surface = _output(out, shape, np.float32)
+    flat = surface.reshape(-1)
+    flat.fill(-np.inf)
+    max_update = get_kernel("max_update", backend)
+    max_update(flat, pixel_ids(evs, shape), evs["t"] - t_ref)
+    np.divide(flat, tau, out=flat)
+    np.exp(flat, out=flat)
+    return surface
+
+
+def voxel_grid(evs, shape, n_bins, t_range=None, signed=True, out=None):
+    """
+    Events binned in time as well as space.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y', 't', 'p'].
+    shape : tuple of int
+        (h, w) of each time bin.
+    n_bins : int
+        Number of time bins.
+    t_range : tuple of float, optional
+        (t_start, t_end) covered by the bins. Defaults to the first and last
+        timestamp in evs. Events outside the range are dropped.
+    signed : bool
+        If True, each event adds +1 (p > 0) or -1; otherwise it adds 1.
+    out : np.ndarray, optional
+        Array of shape (n_bins, h, w) to write the grid into.
+
+    Returns
+    -------
+    grid : np.ndarray
+        (n_bins, h, w) int32 array (or out).
+    """
+    h, w = shape
+    grid = _output(out, (n_bins, h, w), np.int32)
+    flat = grid.reshape(-1)
+    flat.fill(0)
+    if len(evs) == 0:
+        return grid
+
+    t = evs["t"]
+    t_start, t_end = (t.min(), t.max()) if t_range is None else t_range
+    span = max(t_end - t_start, 1)
+    bins = ((t - t_start) * n_bins // span).astype(np.int64)
+    bins[t == t_end] = n_bins - 1  # include the end of the range in the last bin
+    inside = (t >= t_start) & (t <= t_end)
+
+    ids = bins[inside] * (h * w) + pixel_ids(evs[inside], shape)
+    values = np.where(evs["p"][inside] > 0, 1, -1) if signed else 1
+    np.add.at(flat, ids, values)
+    return grid
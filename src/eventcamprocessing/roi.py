@@ -0,0 +1,134 @@
+"""
+Region-of-interest and decimation applied when events are decoded.
+
+An `ROI` keeps the events inside a rectangle (optionally restricted further
+by a boolean mask of the sensor, e.g. the flow channel), bins them spatially
+(2x2, 4x4, ...) and optionally keeps only every n-th event. Applying it to
+each chunk straight after decoding, before `accumulate_events` or the
+pipeline's window buffers copy the events, means every later stage processes
+only the reduced stream. Event coordinates are shifted to the ROI origin and
+divided by the bin size, so detection frames need only be `ROI.shape`;
+`ROI.to_sensor` maps particle centroids back to sensor pixels.
+
+Examples
+--------
+>>> roi = ROI(x0=200, y0=100, x1=1000, y1=400, binning=2)
+>>> for ev_chunk in mv_iterator:
+>>>     window = accumulate_events(window, roi.apply(ev_chunk), t_accum_us)
+>>>     particles = ev_particlefinder(window, min_area=25, roi=roi)
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass(frozen=True, eq=False)
+class ROI:
+    """
+    Rectangular or mask-based region of interest with decimation.
+
+    Attributes
+    ----------
+    x0, y0, x1, y1 : int
+        Rectangle [x0, x1) x [y0, y1) in sensor pixels.
+    mask : np.ndarray, optional
+        Boolean (h, w) sensor mask. Only events inside the rectangle where
+        the mask is True are kept. See `ROI.from_mask`.
+    binning : int
+        Spatial binning factor; binning x binning sensor pixels become one pixel.
+    event_stride : int
+        Temporal subsampling; every event_stride-th event of each chunk that
+        passes the spatial selection is kept.
+    """
+
+    x0: int = 0
+    y0: int = 0
+    x1: int = 1280
+    y1: int = 720
+    mask: np.ndarray = field(default=None, repr=False)
+    binning: int = 1
+    event_stride: int = 1
+
+    def __post_init__(self):
+        if self.x1 <= self.x0 or self.y1 <= self.y0:
+            raise ValueError(
+                f"Empty ROI rectangle x=[{self.x0}, {self.x1}), y=[{self.y0}, {self.y1})"
+            )
+        if self.binning < 1 or self.event_stride < 1:
+            raise ValueError("binning and event_stride must be at least 1")
+
+    @classmethod
+    def from_mask(cls, mask, binning=1, event_stride=1):
+        """ROI of the True pixels of a boolean (h, w) sensor mask."""
+        mask = np.asarray(mask, dtype=bool)
+        ys, xs = np.nonzero(mask)
+        if len(xs) == 0:
+            raise ValueError("ROI mask is empty")
+        return cls(
+            x0=int(xs.min()),
+            y0=int(ys.min()),
+            x1=int(xs.max()) + 1,
+            y1=int(ys.max()) + 1,
+            mask=mask,
+            binning=binning,
+            event_stride=event_stride,
+        )
+
+    @property
+    def shape(self):
+        """(h, w) of frames of the reduced events."""
+        return (
+            -(-(self.y1 - self.y0) // self.binning),
+            -(-(self.x1 - self.x0) // self.binning),
+        )
+
+    def apply(self, chunk):
+        """
+        Select, shift and bin the events of a chunk.
+
+        Parameters
+        ----------
+        chunk : np.ndarray
+            Numpy array of events in sensor coordinates, containing fields
+            ['x', 'y'].
+
+        Returns
+        -------
+        reduced : np.ndarray
+            New array with the kept events in their original order and with
+            x, y in ROI pixels.
+        """
+        x = chunk["x"]
+        y = chunk["y"]
+        keep = (x >= self.x0) & (x < self.x1) & (y >= self.y0) & (y < self.y1)
+        if self.mask is not None:
+            idx = np.flatnonzero(keep)
+            keep[idx] = self.mask[y[idx], x[idx]]
+        if self.event_stride > 1:
+            reduced = chunk[np.flatnonzero(keep)[:: self.event_stride]]
+        else:
+            reduced = chunk[keep]
+
+        reduced["x"] -= self.x0
+        reduced["y"] -= self.y0
+        if self.binning > 1:
+            reduced["x"] //= self.binning
+            reduced["y"] //= self.binning
+        return reduced
+
+    def to_sensor(self, particles):
+        """
+        Map x, y of particles detected on reduced events to sensor pixels.
+
+        Returns
+        -------
+        particles : np.ndarray
+            Copy of particles with x, y at the center of the binned pixels in
+            sensor coordinates.
+        """
+        out = particles.copy()
+        offset = (self.binning - 1) / 2
+        out["x"] = out["x"] * self.binning + self.x0 + offset
+        out["y"] = out["y"] * self.binning + self.y0 + offset
+        return out
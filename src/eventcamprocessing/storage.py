@@ -0,0 +1,507 @@
+"""
+Streaming writers and range readers for particles and tracks.
+
+Particles (x, y, t, area) and track points (track_id, x, y, t) are written
+in row groups while a recording is processed, so finished results leave
+memory as soon as a row group is full. Three formats are supported, chosen
+from the file suffix:
+
+- ".npz": one array per row group in a zip file, plus an index of each
+  group's value ranges written on close (NumPy only).
+- ".parquet": one Parquet row group per row group (requires pyarrow).
+- ".h5" / ".hdf5": a chunked, resizable HDF5 table (requires h5py).
+
+The readers only load the row groups whose t (or track_id) range overlaps
+the requested range. Parquet uses its row group statistics for this, the
+other formats the index stored by the writer.
+
+Examples
+--------
+>>> with ParticleWriter("particles.npz") as particles_out:
+>>>     for evs in mv_iterator:
+>>>         window = accumulate_events(window, evs, t_accum_us)
+>>>         particles_out.write(ev_particlefinder(window, min_area=100))
+>>> early = read_particles("particles.npz", t_range=(0, 1e6))
+"""
+
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE
+
+TRACK_DTYPE = np.dtype([("track_id", "i8"), ("x", "f8"), ("y", "f8"), ("t", "f8")])
+FORMATS = {".npz": "npz", ".parquet": "parquet", ".h5": "hdf5", ".hdf5": "hdf5"}
+
+
+def _format_of(path, format=None):
+    if format is not None:
+        if format not in FORMATS.values():
+            raise ValueError(f"Unknown format {format!r}")
+        return format
+    suffix = Path(path).suffix.lower()
+    if suffix not in FORMATS:
+        raise ValueError(
+            f"Cannot infer the format of {path!s}, use one of {sorted(FORMATS)}"
+        )
+    return FORMATS[suffix]
+
+
+### format backends: write whole row groups, read selected row groups
+class _NpzBackend:
+    def __init__(self, path, dtype):
+        self.zf = zipfile.ZipFile(path, "w", allowZip64=True)
+
+    def write_group(self, i, records):
+        with self.zf.open(f"group_{i:06d}.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, records, allow_pickle=False)
+
+    def close(self, index):
+        with self.zf.open("index.npy", "w") as f:
+            np.lib.format.write_array(f, index, allow_pickle=False)
+        self.zf.close()
+
+
+class _ParquetBackend:
+    def __init__(self, path, dtype):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        fields = [(name, pa.from_numpy_dtype(dtype[name])) for name in dtype.names]
+        self.writer = pq.ParquetWriter(path, pa.schema(fields))
+
+    def write_group(self, i, records):
+        table = self.pa.table({name: records[name] for name in records.dtype.names})
+        self.writer.write_table(table, row_group_size=len(records))
+
+    def close(self, index):
+        self.writer.close()
+
+
+class _Hdf5Backend:
+    def __init__(self, path, dtype):
+        import h5py
+
+        self.f = h5py.File(path, "w")
+        self.table = self.f.create_dataset(
+            "records", shape=(0,), maxshape=(None,), dtype=dtype, chunks=True
+        )
+
+    def write_group(self, i, records):
+        n = len(self.table)
+        self.table.resize((n + len(records),))
+        self.table[n:] = records
+
+    def close(self, index):
+        self.f.create_dataset("index", data=index)
+        self.f.close()
+
+
+_BACKENDS = {"npz": _NpzBackend, "parquet": _ParquetBackend, "hdf5": _Hdf5Backend}
+
+
+class RecordWriter:
+    """
+    Write a structured array in row groups as records arrive.
+
+    Parameters
+    ----------
+    path : str or Path
+        Output file; the format is inferred from its suffix.
+    dtype : np.dtype
+        Dtype of the records.
+    row_group_size : int
+        Number of records per row group. Rows are buffered until a group is
+        full (or `flush` / `close` is called).
+    index_fields : tuple of str
+        Fields whose per-group minimum and maximum are stored so readers can
+        skip row groups.
+    format : {"npz", "parquet", "hdf5"}, optional
+        Overrides the format inferred from the suffix.
+    checkpointing : bool
+        Write to part files next to path that are completed by each
+        `checkpoint` and merged into path on `close`. A part completed by a
+        checkpoint stays readable if the process crashes later, which the
+        single output file (finalized only on close) would not.
+    resume : dict, optional
+        State returned by `checkpoint` to continue from, e.g. after a crash.
+        Parts written after that checkpoint are discarded. Implies
+        checkpointing.
+    """
+
+    def __init__(
+        self,
+        path,
+        dtype,
+        row_group_size=100_000,
+        index_fields=("t",),
+        format=None,
+        checkpointing=False,
+        resume=None,
+    ):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype)
+        self.format = _format_of(path, format)
+        self.row_group_size = row_group_size
+        self.index_fields = index_fields
+        self.checkpointing = checkpointing or resume is not None
+        self.n_rows = 0
+        self._buffer = np.empty(row_group_size, dtype=self.dtype)
+        self._n_buffered = 0
+        self._index = []
+        self._backend = None
+        self._closed = False
+        self._part = 0
+        self._part_first_group = 0
+
+        if resume is not None:
+            self.n_rows = resume["n_rows"]
+            self._index = [tuple(entry) for entry in resume["index"]]
+            self._part = resume["parts"]
+            self._part_first_group = len(self._index)
+        if self.checkpointing:
+            # parts written after the checkpoint (or by any run when starting over)
+            for stale in self._part_paths(start=self._part):
+                stale.unlink()
+        else:
+            self._backend = _BACKENDS[self.format](self.path, self.dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def n_groups(self):
+        """Number of row groups written so far."""
+        return len(self._index)
+
+    def _part_path(self, k):
+        return self.path.with_name(f"{self.path.stem}.part{k:05d}{self.path.suffix}")
+
+    def _part_paths(self, start=0):
+        pattern = f"{self.path.stem}.part[0-9][0-9][0-9][0-9][0-9]{self.path.suffix}"
+        parts = sorted(self.path.parent.glob(pattern))
+        return [p for p in parts if int(p.stem[-5:]) >= start]
+
+    def write(self, records):
+        """Append records (with the writer's fields, in the same order)."""
+        records = np.asarray(records)
+        start = 0
+        while start < len(records):
+            n = min(len(records) - start, self.row_group_size - self._n_buffered)
+            end = self._n_buffered + n
+            self._buffer[self._n_buffered : end] = records[start : start + n]
+            self._n_buffered = end
+            start += n
+            if self._n_buffered == self.row_group_size:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered records as a (possibly short) row group."""
+        if self._n_buffered == 0:
+            return
+        if self._backend is None:
+            path = self._part_path(self._part)
+            self._backend = _BACKENDS[self.format](path, self.dtype)
+        group = self._buffer[: self._n_buffered]
+        self._backend.write_group(len(self._index) - self._part_first_group, group)
+        entry = [self.n_rows, self.n_rows + len(group)]
+        for name in self.index_fields:
+            entry += [group[name].min().item(), group[name].max().item()]
+        self._index.append(tuple(entry))
+        self.n_rows += len(group)
+        self._n_buffered = 0
+
+    def _close_backend(self):
+        if self._backend is None:
+            return
+        index = np.array(
+            self._index[self._part_first_group :], dtype=_index_dtype(self)
+        )
+        if self.checkpointing and len(index) > 0:
+            # row numbers within the part
+            first = index["start"][0]
+            index["start"] -= first
+            index["stop"] -= first
+        self._backend.close(index)
+        self._backend = None
+        if self.checkpointing:
+            self._part += 1
+            self._part_first_group = len(self._index)
+
+    def checkpoint(self):
+        """
+        Flush the buffered records and complete the current part file.
+
+        Returns
+        -------
+        state : dict
+            JSON-serializable position of the writer, to pass as resume.
+        """
+        if not self.checkpointing:
+            raise ValueError("checkpoint() requires a writer with checkpointing=True")
+        self.flush()
+        self._close_backend()
+        return {"parts": self._part, "n_rows": self.n_rows, "index": list(self._index)}
+
+    def close(self):
+        """Flush the remaining records and write the row group index."""
+        if self._closed:
+            return
+        self.flush()
+        self._close_backend()
+        if self.checkpointing:
+            self._merge_parts()
+        self._closed = True
+
+    def _merge_parts(self):
+        """copy the row groups of every part into path"""
+        backend = _BACKENDS[self.format](self.path, self.dtype)
+        i = 0
+        for part in self._part_paths():
+            for group in _read_groups(part, self.format, self.dtype):
+                backend.write_group(i, group)
+                i += 1
+        backend.close(np.array(self._index, dtype=_index_dtype(self)))
+        for part in self._part_paths():
+            part.unlink()
+
+
+def _index_dtype(writer):
+    fields = [("start", "i8"), ("stop", "i8")]
+    for name in writer.index_fields:
+        kind = writer.dtype[name]
+        fields += [(f"{name}_min", kind), (f"{name}_max", kind)]
+    return np.dtype(fields)
+
+
+class ParticleWriter(RecordWriter):
+    """`RecordWriter` for the particles of `ev_particlefinder`, indexed by t."""
+
+    def __init__(
+        self,
+        path,
+        row_group_size=100_000,
+        format=None,
+        checkpointing=False,
+        resume=None,
+    ):
+        super().__init__(
+            path, PARTICLE_DTYPE, row_group_size, ("t",), format, checkpointing, resume
+        )
+
+
+class TrackWriter(RecordWriter):
+    """
+    `RecordWriter` for track points (track_id, x, y, t), indexed by t and
+    track_id. Tracks are numbered in the order they are written unless ids
+    are given.
+    """
+
+    def __init__(
+        self,
+        path,
+        row_group_size=100_000,
+        format=None,
+        checkpointing=False,
+        resume=None,
+    ):
+        super().__init__(
+            path,
+            TRACK_DTYPE,
+            row_group_size,
+            ("t", "track_id"),
+            format,
+            checkpointing,
+            resume,
+        )
+        self.n_tracks = 0 if resume is None else resume["n_tracks"]
+
+    def checkpoint(self):
+        state = super().checkpoint()
+        state["n_tracks"] = self.n_tracks
+        return state
+
+    def write_tracks(self, tracks, track_ids=None):
+        """
+        Append finished tracks in the format of `ev_particletracker`.
+
+        Parameters
+        ----------
+        tracks : list of dict
+            Tracks with "X", "Y" and "T" lists.
+        track_ids : sequence of int, optional
+            Ids of the tracks, e.g. their index in the `ev_particletracker`
+            output. By default tracks are numbered in the order written.
+
+        Returns
+        -------
+        track_ids : np.ndarray
+            The ids of the tracks.
+        """
+        if track_ids is None:
+            track_ids = np.arange(self.n_tracks, self.n_tracks + len(tracks))
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        self.write(tracks_to_records(tracks, track_ids=track_ids))
+        self.n_tracks += len(tracks)
+        return track_ids
+
+
+def tracks_to_records(tracks, first_id=0, track_ids=None):
+    """
+    Flatten tracks in the format of `ev_particletracker` to one TRACK_DTYPE
+    record per track point, numbering the tracks from first_id (or with the
+    given track_ids).
+    """
+    if track_ids is None:
+        track_ids = first_id + np.arange(len(tracks))
+    lengths = np.array([len(track["T"]) for track in tracks], dtype=np.int64)
+    records = np.empty(int(lengths.sum()), dtype=TRACK_DTYPE)
+    records["track_id"] = np.repeat(track_ids, lengths)
+    for key, name in (("X", "x"), ("Y", "y"), ("T", "t")):
+        if len(tracks) > 0:
+            records[name] = np.concatenate([track[key] for track in tracks])
+    return records
+
+
+### readers
+def _table_to_records(table, dtype):
+    records = np.empty(table.num_rows, dtype=dtype)
+    for name in dtype.names:
+        records[name] = table.column(name).to_numpy()
+    return records
+
+
+def _read_groups(path, format, dtype):
+    """every row group of a file, in order"""
+    if format == "npz":
+        with np.load(path, allow_pickle=False) as f:
+            return [f[name] for name in sorted(f.files) if name.startswith("group_")]
+    if format == "parquet":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        return [
+            _table_to_records(pf.read_row_group(i), dtype)
+            for i in range(pf.num_row_groups)
+        ]
+    import h5py
+
+    with h5py.File(path, "r") as f:
+        index = f["index"][()]
+        return [
+            f["records"][a:b]
+            for a, b in zip(index["start"], index["stop"], strict=True)
+        ]
+
+
+def _selected(index, ranges):
+    """row groups of a writer index overlapping every (lo, hi) range"""
+    keep = np.ones(len(index), dtype=bool)
+    for name, (lo, hi) in ranges.items():
+        keep &= (index[f"{name}_max"] >= lo) & (index[f"{name}_min"] < hi)
+    return np.flatnonzero(keep)
+
+
+def _in_ranges(records, ranges):
+    keep = np.ones(len(records), dtype=bool)
+    for name, (lo, hi) in ranges.items():
+        keep &= (records[name] >= lo) & (records[name] < hi)
+    return records[keep]
+
+
+def read_records(path, dtype, ranges=None, format=None):
+    """
+    Read the records of a file written by `RecordWriter`.
+
+    Parameters
+    ----------
+    path : str or Path
+        File to read.
+    dtype : np.dtype
+        Dtype of the records.
+    ranges : dict, optional
+        Maps field names to half-open (lo, hi) ranges; only records inside
+        every range are returned, and row groups outside them are not read.
+    format : {"npz", "parquet", "hdf5"}, optional
+        Overrides the format inferred from the suffix.
+
+    Returns
+    -------
+    records : np.ndarray
+    """
+    ranges = ranges or {}
+    format = _format_of(path, format)
+    dtype = np.dtype(dtype)
+    if format == "npz":
+        with np.load(path, allow_pickle=False) as f:
+            groups = sorted(name for name in f.files if name.startswith("group_"))
+            if "index" in f.files:
+                groups = [groups[i] for i in _selected(f["index"], ranges)]
+            parts = [f[name] for name in groups]
+    elif format == "parquet":
+        import pyarrow.parquet as pq
+
+        filters = [
+            c
+            for name, (lo, hi) in ranges.items()
+            for c in ((name, ">=", lo), (name, "<", hi))
+        ]
+        table = pq.read_table(path, filters=filters or None)
+        parts = [_table_to_records(table, dtype)]
+    else:
+        import h5py
+
+        with h5py.File(path, "r") as f:
+            table = f["records"]
+            if "index" in f:
+                index = f["index"][()]
+                parts = [
+                    table[index["start"][i] : index["stop"][i]]
+                    for i in _selected(index, ranges)
+                ]
+            else:  # file of an interrupted run
+                parts = [table[()]]
+
+    if len(parts) == 0:
+        return np.empty(0, dtype=dtype)
+    return _in_ranges(np.concatenate(parts).astype(dtype, copy=False), ranges)
+
+
+def read_particles(path, t_range=None, format=None):
+    """
+    Read particles written by `ParticleWriter`, optionally only those with
+    t_range[0] <= t < t_range[1].
+    """
+    ranges = {} if t_range is None else {"t": t_range}
+    return read_records(path, PARTICLE_DTYPE, ranges, format)
+
+
+def read_tracks(path, t_range=None, track_ids=None, format=None):
+    """
+    Read track points written by `TrackWriter`.
+
+    Parameters
+    ----------
+    path : str or Path
+        File to read.
+    t_range : tuple, optional
+        Only points with t_range[0] <= t < t_range[1].
+    track_ids : tuple, optional
+        Only points with track_ids[0] <= track_id < track_ids[1].
+
+    Returns
+    -------
+    points : np.ndarray
+        TRACK_DTYPE records, ordered by track and time within each track.
+    """
+    ranges = {}
+    if t_range is not None:
+        ranges["t"] = t_range
+    if track_ids is not None:
+        ranges["track_id"] = track_ids
+    return read_records(path, TRACK_DTYPE, ranges, format)
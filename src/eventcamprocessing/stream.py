@@ -0,0 +1,553 @@
+"""
+Shared-memory transport of a live event stream to several consumers.
+
+One producer (the camera reader, or `replay` of a recording) writes event
+chunks into an `EventRing`, a ring buffer in shared memory, and any number
+of consumers (e.g. a detector, a recorder and a preview, each in its own
+process) read them through a `RingConsumer` with their own read cursor. The
+producer never copies a chunk more than once, however many consumers there
+are.
+
+By default the producer never waits, like a camera that cannot be paused: a
+consumer that falls more than the ring's capacity behind loses the oldest
+chunks (counted in `RingConsumer.dropped`) and continues with the oldest
+chunk still in the ring. With ``block=True`` the producer instead waits for
+the slowest consumer, e.g. when replaying to a recorder that must not lose
+events. Consumer slots are claimed with a lock file, which the operating
+system releases when the consumer's process exits, so a consumer that dies
+without closing frees its slot and is not waited for.
+
+Every chunk carries the time it was published (``time.monotonic_ns``, which
+is shared by the processes of one machine), so consumers can measure their
+end-to-end latency; `live_detection` does so for the accumulate -> filter ->
+detect loop.
+
+Examples
+--------
+Producer process:
+
+>>> with EventRing(capacity=1 << 24) as ring:
+>>>     print(ring.name)  # passed to the consumers
+>>>     replay(read_chunks("recording.raw", delta_t=10000), ring, speed=2.0)
+
+Consumer processes:
+
+>>> particles, stats = live_detection(RingConsumer(name, slot=0), 20000, min_area=100)
+>>> np.percentile(stats["latency_s"], 99)
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE, ev_particlefinder
+from eventcamprocessing.synthetic import EVENT_DTYPE
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# header fields (int64)
+_CAPACITY, _N_SLOTS, _MAX_CONSUMERS, _RESERVED, _WRITTEN, _N_CHUNKS, _CLOSED = range(7)
+_HEADER_SIZE = 16
+_DESCR_BYTES = 512
+# chunk table rows: first and end event position, publication time
+
+# consumer table columns
+_ATTACHED, _CHUNK_CURSOR, _EVENT_CURSOR, _DROPPED = range(4)
+_POLL_S = 0.0005
+_ATTACH_LOCK = threading.Lock()
+
+
+def _slot_lock_path(name, slot):
+    return os.path.join(tempfile.gettempdir(), f"{name.lstrip('/')}.{slot}.lock")
+
+
+def _lock_slot(name, slot):
+    """
+    Take the lock of a consumer slot without waiting.
+
+    Returns the file descriptor holding the lock, or None if another open
+    file holds it. The lock goes away with the descriptor, also when its
+    process is killed.
+    """
+    fd = os.open(_slot_lock_path(name, slot), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if os.name == "nt":
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _attach(name):
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Python < 3.13 registers attached segments with this process's resource
+    # tracker, which unlinks them when the process exits and so would remove
+    # the producer's ring; attach untracked like track=False does
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class _RingViews:
+    """numpy views of the header, tables and events of a ring segment"""
+
+    def __init__(self, shm):
+        self.shm = shm
+        buf = shm.buf
+        self.header = np.ndarray(_HEADER_SIZE, dtype=np.int64, buffer=buf)
+        offset = self.header.nbytes
+        descr = bytes(buf[offset : offset + _DESCR_BYTES]).rstrip(b"\0")
+        self.dtype = np.lib.format.descr_to_dtype(json.loads(descr))
+        offset += _DESCR_BYTES
+        capacity, n_slots, max_consumers = self.header[:3]
+        self.chunks = np.ndarray((n_slots, 3), np.int64, buffer=buf, offset=offset)
+        offset += self.chunks.nbytes
+        self.consumers = np.ndarray(
+            (max_consumers, 4), np.int64, buffer=buf, offset=offset
+        )
+        offset += self.consumers.nbytes
+        self.events = np.ndarray(capacity, self.dtype, buffer=buf, offset=offset)
+
+    def release(self):
+        # the views must go before the segment can be closed
+        del self.header, self.chunks, self.consumers, self.events
+        self.shm.close()
+
+
+def _ring_bytes(capacity, dtype, n_slots, max_consumers):
+    return (
+        8 * _HEADER_SIZE
+        + _DESCR_BYTES
+        + 8 * 3 * n_slots
+        + 8 * 4 * max_consumers
+        + capacity * dtype.itemsize
+    )
+
+
+class EventRing:
+    """
+    Producer side of a shared-memory ring buffer of event chunks.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of events the ring holds. A chunk must not be larger.
+    dtype : np.dtype
+        Dtype of the events (default: the Metavision event fields x, y, t, p).
+    n_slots : int
+        Number of chunks the ring holds.
+    max_consumers : int
+        Number of consumer slots.
+    block : bool
+        If True, `write` waits until every attached consumer has room instead
+        of overwriting chunks it has not read yet. Consumers whose process
+        has exited are detached rather than waited for.
+    timeout : float, optional
+        Seconds a blocking `write` waits for room before raising TimeoutError
+        (default: wait forever).
+    name : str, optional
+        Name of the shared-memory segment (default: chosen by the system).
+
+    Attributes
+    ----------
+    name : str
+        Name of the segment, used by consumers to attach.
+    n_chunks : int
+        Number of chunks written so far.
+    """
+
+    def __init__(
+        self,
+        capacity=1 << 22,
+        dtype=EVENT_DTYPE,
+        n_slots=1024,
+        max_consumers=8,
+        block=False,
+        timeout=None,
+        name=None,
+    ):
+        if n_slots < 2:
+            raise ValueError("The ring needs at least 2 chunk slots")
+        dtype = np.dtype(dtype)
+        descr = json.dumps(np.lib.format.dtype_to_descr(dtype)).encode()
+        if len(descr) > _DESCR_BYTES:
+            raise ValueError("Event dtype has too many fields for the ring header")
+        self._shm = SharedMemory(
+            name=name,
+            create=True,
+            size=_ring_bytes(capacity, dtype, n_slots, max_consumers),
+        )
+        header = np.ndarray(_HEADER_SIZE, dtype=np.int64, buffer=self._shm.buf)
+        header[:] = 0
+        header[[_CAPACITY, _N_SLOTS, _MAX_CONSUMERS]] = capacity, n_slots, max_consumers
+        self._shm.buf[header.nbytes : header.nbytes + len(descr)] = descr
+        del header
+        self._views = _RingViews(self._shm)
+        self._views.consumers[:] = 0
+        self._max_consumers = max_consumers
+        self.name = self._shm.name
+        self.block = block
+        self.timeout = timeout
+
+    @property
+    def n_chunks(self):
+        return int(self._views.header[_N_CHUNKS])
+
+    def _detach_exited(self):
+        v = self._views
+        for slot in np.flatnonzero(v.consumers[:, _ATTACHED] == 1):
+            # the slot's lock is free only if its consumer's process is gone
+            fd = _lock_slot(self.name, slot)
+            if fd is not None:
+                v.consumers[slot, _ATTACHED] = 0
+                os.close(fd)
+
+    def _wait_for_room(self, n_events, start):
+        v = self._views
+        capacity, n_slots = len(v.events), len(v.chunks)
+        k = int(v.header[_N_CHUNKS])
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            attached = v.consumers[:, _ATTACHED] == 1
+            chunk_cursor = v.consumers[attached, _CHUNK_CURSOR]
+            event_cursor = v.consumers[attached, _EVENT_CURSOR]
+            # see RingConsumer.read for when a read chunk counts as overwritten
+            if np.all(k + 2 <= chunk_cursor + n_slots) and np.all(
+                start + n_events - event_cursor <= capacity
+            ):
+                return
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("The consumers did not make room in time")
+            self._detach_exited()
+            time.sleep(_POLL_S)
+
+    def write(self, evs):
+        """
+        Publish a chunk of events to the consumers.
+
+        Parameters
+        ----------
+        evs : np.ndarray
+            Event chunk, e.g. from an EventsIterator. Empty chunks are
+            published too, so consumers see the passing of time.
+        """
+        v = self._views
+        if v.header[_CLOSED]:
+            raise ValueError("Cannot write to a closed ring")
+        capacity = len(v.events)
+        n = len(evs)
+        if n > capacity:
+            raise ValueError(f"Chunk of {n} events exceeds the ring capacity")
+        start = int(v.header[_WRITTEN])
+        if self.block:
+            self._wait_for_room(n, start)
+
+        # reserve the positions first, so readers of the old events there
+        # can tell their copy may be torn
+        v.header[_RESERVED] = start + n
+        pos = start % capacity
+        first = min(n, capacity - pos)
+        v.events[pos : pos + first] = evs[:first]
+        v.events[: n - first] = evs[first:]
+        v.header[_WRITTEN] = start + n
+
+        k = int(v.header[_N_CHUNKS])
+        v.chunks[k % len(v.chunks)] = start, start + n, time.monotonic_ns()
+        v.header[_N_CHUNKS] = k + 1
+
+    def close(self):
+        """Mark the end of the stream; consumers stop after the last chunk."""
+        self._views.header[_CLOSED] = 1
+
+    def consumers(self):
+        """
+        State of the attached consumers.
+
+        Returns
+        -------
+        consumers : dict
+            Maps consumer slots to {"behind": chunks published but not yet
+            read, "dropped": chunks lost to overruns}.
+        """
+        v = self._views
+        n_chunks = int(v.header[_N_CHUNKS])
+        return {
+            int(slot): {
+                "behind": n_chunks - int(v.consumers[slot, _CHUNK_CURSOR]),
+                "dropped": int(v.consumers[slot, _DROPPED]),
+            }
+            for slot in np.flatnonzero(v.consumers[:, _ATTACHED] == 1)
+        }
+
+    def unlink(self):
+        """Close the stream and free the shared memory and slot lock files."""
+        self.close()
+        self._views.release()
+        self._shm.unlink()
+        for slot in range(self._max_consumers):
+            try:
+                os.remove(_slot_lock_path(self.name, slot))
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
+
+
+class RingConsumer:
+    """
+    Reader of an `EventRing` with its own cursor.
+
+    The consumer starts at the next chunk written after it attached.
+    Iterating over it yields the event chunks until the producer closes the
+    ring, so it can replace an EventsIterator, e.g. as the chunks of
+    `pipeline.run_pipeline`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the ring (`EventRing.name`).
+    slot : int
+        Consumer slot, unique among the consumers of the ring. Claiming it is
+        atomic, so of several processes asking for one slot only one gets it.
+    timeout : float, optional
+        Seconds to wait for a chunk before raising TimeoutError (default:
+        wait forever).
+
+    Attributes
+    ----------
+    dropped : int
+        Number of chunks lost because the producer overwrote them before
+        they were read.
+    last_sent_ns : int
+        Publication time (``time.monotonic_ns``) of the last chunk read.
+    """
+
+    def __init__(self, name, slot=0, timeout=None):
+        self._views = _RingViews(_attach(name))
+        v = self._views
+        if not 0 <= slot < len(v.consumers):
+            v.release()
+            raise ValueError(f"Consumer slot {slot} out of range")
+        self._lock = _lock_slot(name, slot)
+        if self._lock is None:
+            v.release()
+            raise ValueError(f"Consumer slot {slot} is already in use")
+        self.slot = slot
+        self.timeout = timeout
+        self.dropped = 0
+        self.last_sent_ns = None
+        self._cursor = int(v.header[_N_CHUNKS])
+        v.consumers[slot] = 0, self._cursor, int(v.header[_WRITTEN]), 0
+        v.consumers[slot, _ATTACHED] = 1
+
+    @property
+    def dtype(self):
+        return self._views.dtype
+
+    def _drop(self, n):
+        self.dropped += n
+        self._views.consumers[self.slot, _DROPPED] = self.dropped
+
+    def read(self):
+        """
+        Next chunk of events.
+
+        Returns
+        -------
+        evs : np.ndarray or None
+            Copy of the next chunk, or None once the ring is closed and every
+            chunk is read.
+
+        Raises
+        ------
+        TimeoutError
+            If no chunk arrives within the consumer's timeout.
+        """
+        v = self._views
+        capacity, n_slots = len(v.events), len(v.chunks)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            closed = v.header[_CLOSED]
+            n_chunks = int(v.header[_N_CHUNKS])
+            if self._cursor == n_chunks:
+                if closed:
+                    return None
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError("No chunk arrived in time")
+                time.sleep(_POLL_S)
+                continue
+            if n_chunks - self._cursor >= n_slots:
+                # the chunk's slot may be overwritten; skip to the oldest safe one
+                self._drop(n_chunks - n_slots + 1 - self._cursor)
+                self._cursor = n_chunks - n_slots + 1
+
+            start, end, sent = v.chunks[self._cursor % n_slots]
+            pos = start % capacity
+            first = min(end - start, capacity - pos)
+            evs = np.concatenate(
+                [v.events[pos : pos + first], v.events[: end - start - first]]
+            )
+            # the copy is valid if the producer did not reach the chunk's slot
+            # or events while it was made
+            torn = (
+                int(v.header[_N_CHUNKS]) - self._cursor >= n_slots
+                or int(v.header[_RESERVED]) - start > capacity
+            )
+            self._cursor += 1
+            v.consumers[self.slot, _CHUNK_CURSOR] = self._cursor
+            v.consumers[self.slot, _EVENT_CURSOR] = end
+            if torn:
+                self._drop(1)
+                continue
+            self.last_sent_ns = int(sent)
+            return evs
+
+    def __iter__(self):
+        while (evs := self.read()) is not None:
+            yield evs
+
+    def close(self):
+        """Detach from the ring, freeing the consumer slot."""
+        self._views.consumers[self.slot, _ATTACHED] = 0
+        self._views.release()
+        os.close(self._lock)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replay(chunks, ring, speed=1.0, n_consumers=0, close=True):
+    """
+    Stream recorded event chunks into a ring as a live camera would.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray
+        Event chunks in time order, e.g. ``batch.read_chunks(path, dt)``.
+    ring : EventRing
+        Ring to write to.
+    speed : float or None
+        Playback speed: each chunk is published once speed times the wall time
+        since the start has passed its last event's timestamp (1.0 is real
+        time). None publishes as fast as the ring allows.
+    n_consumers : int
+        Wait until this many consumers are attached before starting.
+    close : bool
+        Close the ring after the last chunk.
+
+    Returns
+    -------
+    stats : dict
+        "chunks", "events", "wall_s" and "max_late_s", the largest delay of a
+        publication behind its schedule (the producer falling behind).
+    """
+    while len(ring.consumers()) < n_consumers:
+        time.sleep(_POLL_S)
+
+    n_chunks = n_events = 0
+    max_late_s = 0.0
+    t_origin = None
+    wall_t0 = time.monotonic()
+    for evs in chunks:
+        if speed is not None and len(evs) > 0:
+            if t_origin is None:
+                t_origin = evs["t"][0]
+            due = wall_t0 + (evs["t"][-1] - t_origin) / 1e6 / speed
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                max_late_s = max(max_late_s, -wait)
+        ring.write(evs)
+        n_chunks += 1
+        n_events += len(evs)
+    if close:
+        ring.close()
+    return {
+        "chunks": n_chunks,
+        "events": n_events,
+        "wall_s": time.monotonic() - wall_t0,
+        "max_late_s": max_late_s,
+    }
+
+
+def live_detection(consumer, t_accum_us, min_area, filters=(), h=720, w=1280, roi=None):
+    """
+    Run the accumulate -> filter -> detect loop on a live stream and measure
+    its latency.
+
+    Parameters
+    ----------
+    consumer : RingConsumer
+        Source of the event chunks.
+    t_accum_us : int
+        Timespan (in us) of the rolling accumulation window.
+    min_area : int
+        Minimum area (event count) passed to `ev_particlefinder`.
+    filters : sequence of callables
+        Filters applied in order to each window.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    roi : ROI, optional
+        Region of interest and decimation (`roi.ROI`) applied to each chunk.
+
+    Returns
+    -------
+    all_particles : np.ndarray
+        Structured array of every detected particle, in window order.
+    stats : dict
+        "latency_s", the time from the publication of each chunk until its
+        window's particles were found, "chunks" (number of chunks processed)
+        and "dropped" (number of chunks lost to overruns).
+    """
+    window = []
+    particles = []
+    latency_ns = []
+    for evs in consumer:
+        if roi is not None:
+            evs = roi.apply(evs)
+        window = accumulate_events(window, evs, t_accum_us)
+        filtered = window
+        for f in filters:
+            filtered = f(filtered)
+        found = ev_particlefinder(evs=filtered, min_area=min_area, h=h, w=w, roi=roi)
+        latency_ns.append(time.monotonic_ns() - consumer.last_sent_ns)
+        if len(found) > 0:
+            particles.append(found.astype(PARTICLE_DTYPE, copy=False))
+
+    all_particles = (
+        np.concatenate(particles) if particles else np.empty(0, dtype=PARTICLE_DTYPE)
+    )
+    stats = {
+        "latency_s": np.array(latency_ns, dtype=np.float64) / 1e9,
+        "chunks": len(latency_ns),
+        "dropped": consumer.dropped,
+    }
+    return all_particles, stats
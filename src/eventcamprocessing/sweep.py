@@ -0,0 +1,286 @@
+"""
+Parameter sweeps over filter, detection and tracking settings.
+
+Each window of the recording is decoded and accumulated once, then sent to a
+worker process that evaluates every parameter combination on it. Work that
+only depends on part of the parameters is shared between combinations: the
+KD-tree neighbor counts of `isolated_noise_filter` are computed once per
+(spatial_radius, time_window) and thresholded for every min_neighbors, and
+connected components are labeled once per filtered window and thresholded for
+every min_area. max_disp only affects tracking, which reuses the particles.
+"""
+
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from eventcamprocessing.filter_funcs import accumulate_events, isolated_neighbor_counts
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE, label_clusters
+from eventcamprocessing.particle_tracking import ev_particletracker
+from eventcamprocessing.tiling import tiled_particlefinder
+
+SWEEP_PARAMS = (
+    "spatial_radius",
+    "time_window",
+    "min_neighbors",
+    "min_area",
+    "max_disp",
+)
+
+
+def expand_grid(param_grid):
+    """
+    Expand a dict of parameter lists into a list of parameter dicts.
+
+    Parameters
+    ----------
+    param_grid : dict
+        Maps each name in SWEEP_PARAMS to a value or a list of values. A
+        spatial_radius of None disables the isolated noise filter, and a
+        max_disp of None disables tracking.
+
+    Returns
+    -------
+    configs : list of dict
+        Every combination, in itertools.product order.
+    """
+
+    unknown = set(param_grid) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+
+    defaults = {
+        "spatial_radius": None,
+        "time_window": 1000,
+        "min_neighbors": 3,
+        "min_area": 100,
+        "max_disp": None,
+    }
+    values = []
+    for name in SWEEP_PARAMS:
+        v = param_grid.get(name, defaults[name])
+        values.append(list(v) if isinstance(v, list | tuple | np.ndarray) else [v])
+    return [
+        dict(zip(SWEEP_PARAMS, combo, strict=True))
+        for combo in itertools.product(*values)
+    ]
+
+
+def _detect_all(window, configs, h, w, tile_shape=None):
+    """
+    Detect particles in one window for every config, sharing neighbor counts
+    and cluster labeling between configs that only differ in thresholds.
+    Clusters are labeled one tile at a time if tile_shape is given. Returns
+    one particle array per config.
+    """
+    counts = {}
+    clusters = {}
+    out = []
+    for cfg in configs:
+        if cfg["spatial_radius"] is None:
+            filter_key = None
+        else:
+            nb_key = (cfg["spatial_radius"], cfg["time_window"])
+            if nb_key not in counts:
+                counts[nb_key] = isolated_neighbor_counts(window, *nb_key)
+            filter_key = (*nb_key, cfg["min_neighbors"])
+
+        if filter_key not in clusters:
+            if filter_key is None:
+                filtered = window
+            else:
+                filtered = window[counts[filter_key[:2]] > cfg["min_neighbors"]]
+            if tile_shape is None:
+                clusters[filter_key] = label_clusters(filtered, h=h, w=w)
+            else:
+                clusters[filter_key] = tiled_particlefinder(
+                    filtered, 0, tile_shape, h=h, w=w, max_workers=1
+                )
+
+        found = clusters[filter_key]
+        out.append(found[found["area"] >= cfg["min_area"]])
+    return out
+
+
+def _track(particles, max_disp, time_array):
+    if max_disp is None or len(time_array) < 2:
+        return None
+    return ev_particletracker(particles, max_disp, time_array)
+
+
+def run_sweep(
+    chunks,
+    t_accum_us,
+    param_grid,
+    dt=None,
+    h=720,
+    w=1280,
+    max_workers=None,
+    out_dir=None,
+    memory_plan=None,
+):
+    """
+    Run the accumulate -> filter -> detect -> track loop for every parameter
+    combination while decoding the recording only once.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray
+        Source of event chunks, e.g. an EventsIterator.
+    t_accum_us : int
+        Timespan (in us) of the rolling accumulation window.
+    param_grid : dict
+        Values to sweep, see `expand_grid`.
+    dt : int, optional
+        Timestep (in us) of the chunk source, used to build the tracker's
+        time_array. Required for tracking.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    max_workers : int, optional
+        Number of worker processes. With max_workers=1 everything runs in the
+        calling process.
+    out_dir : str or Path, optional
+        If given, a results table is written for every config (see Notes).
+    memory_plan : MemoryPlan, optional
+        Limits from `memory.plan_memory`. Windows are capped at
+        max_window_events, max_workers defaults to n_workers and at most
+        n_workers + max_in_flight windows are submitted at a time. If the
+        plan splits the frame into tiles, clusters are labeled one tile at a
+        time with `tiling.tiled_particlefinder`.
+
+    Returns
+    -------
+    results : list of dict
+        One entry per config with keys "params", "particles" and
+        "track_info" (None if max_disp is None or dt was not given).
+
+    Notes
+    -----
+    With out_dir, the sweep writes ``configs.csv`` (one row per config) and,
+    for config number i, ``config_<i>/particles.csv`` with columns
+    x, y, t, area and ``config_<i>/tracks.csv`` with columns
+    track_id, x, y, t (one row per track point).
+    """
+
+    configs = expand_grid(param_grid)
+    max_events = None
+    tile_shape = None
+    limit = 2 * (max_workers or os.cpu_count() or 1)
+    if memory_plan is not None:
+        max_events = memory_plan.max_window_events
+        tile_shape = memory_plan.detection_tiles(h, w)
+        max_workers = max_workers or memory_plan.n_workers
+        limit = memory_plan.n_workers + memory_plan.max_in_flight
+    per_config = [[] for _ in configs]
+    t_start, t_end = None, None
+
+    def windows():
+        nonlocal t_start, t_end
+        window = []
+        for evs in chunks:
+            if len(evs) > 0:
+                if t_start is None:
+                    t_start = evs["t"][0]
+                t_end = evs["t"][-1]
+            window = accumulate_events(
+                window=window,
+                new_chunk=evs,
+                t_accum_us=t_accum_us,
+                max_events=max_events,
+            )
+            yield window
+
+    if max_workers == 1:
+        for window in windows():
+            for store, found in zip(
+                per_config, _detect_all(window, configs, h, w, tile_shape), strict=True
+            ):
+                store.append(found)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as ex:
+            in_flight = []
+            for window in windows():
+                in_flight.append(
+                    ex.submit(_detect_all, window, configs, h, w, tile_shape)
+                )
+                if len(in_flight) >= limit:
+                    for store, found in zip(
+                        per_config, in_flight.pop(0).result(), strict=True
+                    ):
+                        store.append(found)
+            for fut in in_flight:
+                for store, found in zip(per_config, fut.result(), strict=True):
+                    store.append(found)
+
+    all_particles = [
+        np.concatenate(store) if store else np.empty(0, dtype=PARTICLE_DTYPE)
+        for store in per_config
+    ]
+
+    if dt is not None and t_start is not None:
+        time_array = np.arange(t_start, t_end + dt, dt)
+    else:
+        time_array = np.empty(0)
+    max_disps = [cfg["max_disp"] for cfg in configs]
+    if max_workers == 1:
+        tracks = [
+            _track(p, m, time_array)
+            for p, m in zip(all_particles, max_disps, strict=True)
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as ex:
+            tracks = list(
+                ex.map(_track, all_particles, max_disps, itertools.repeat(time_array))
+            )
+
+    results = [
+        {"params": cfg, "particles": p, "track_info": tr}
+        for cfg, p, tr in zip(configs, all_particles, tracks, strict=True)
+    ]
+    if out_dir is not None:
+        write_sweep_results(results, out_dir)
+    return results
+
+
+def write_sweep_results(results, out_dir):
+    """
+    Write the output of `run_sweep` as one tidy table per config (see
+    `run_sweep` Notes for the layout).
+    """
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(out_dir / "configs.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["config", *SWEEP_PARAMS, "n_particles", "n_tracks"])
+        for i, res in enumerate(results):
+            n_tracks = "" if res["track_info"] is None else len(res["track_info"])
+            writer.writerow(
+                [
+                    i,
+                    *(res["params"][k] for k in SWEEP_PARAMS),
+                    len(res["particles"]),
+                    n_tracks,
+                ]
+            )
+
+    for i, res in enumerate(results):
+        cfg_dir = out_dir / f"config_{i}"
+        cfg_dir.mkdir(exist_ok=True)
+        with open(cfg_dir / "particles.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(PARTICLE_DTYPE.names)
+            writer.writerows(res["particles"].tolist())
+        if res["track_info"] is None:
+            continue
+        with open(cfg_dir / "tracks.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["track_id", "x", "y", "t"])
+            for track_id, track in enumerate(res["track_info"]):
+                for x, y, t in zip(track["X"], track["Y"], track["T"], strict=True):
+                    writer.writerow([track_id, x, y, t])
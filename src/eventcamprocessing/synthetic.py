@@ -0,0 +1,200 @@
+"""
+Synthetic event streams for benchmarks and load tests.
+
+The generator mixes the kinds of events seen in particle-tracking recordings:
+particles moving across the sensor, uniform background noise, hot pixels that
+fire with a constant polarity, and flickering pixels that fire at a high rate
+with alternating polarity.
+"""
+
+import numpy as np
+
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE
+
+EVENT_DTYPE = np.dtype([("x", "i4"), ("y", "i4"), ("t", "i8"), ("p", "i1")])
+
+
+def synthetic_events(
+    n_events,
+    event_rate=10e6,
+    h=720,
+    w=1280,
+    n_particles=50,
+    particle_radius=6,
+    speed=2000.0,
+    noise_frac=0.2,
+    hot_frac=0.02,
+    flicker_frac=0.02,
+    t0=0,
+    seed=0,
+):
+    """
+    Generate a time-ordered synthetic event recording.
+
+    Parameters
+    ----------
+    n_events : int
+        Total number of events to generate.
+    event_rate : float
+        Mean event rate in events per second. Together with n_events this
+        sets the duration of the recording.
+    h, w : int
+        Height and width of the sensor in pixels.
+    n_particles : int
+        Number of particles moving across the sensor.
+    particle_radius : float
+        Radius of each particle in pixels.
+    speed : float
+        Typical particle speed in pixels per second.
+    noise_frac, hot_frac, flicker_frac : float
+        Fractions of n_events that are background noise, hot pixel events and
+        flicker events. The remainder are particle events.
+    t0 : int
+        Timestamp (in us) of the start of the recording.
+    seed : int
+        Seed for the random number generator.
+
+    Returns
+    -------
+    evs : np.ndarray
+        Structured array with fields ['x', 'y', 't', 'p'] (EVENT_DTYPE),
+        sorted by t. ON events have p = 1 and OFF events p = -1.
+
+    Examples
+    --------
+    >>> evs = synthetic_events(100_000, event_rate=5e6)
+    >>> duration_us = evs["t"][-1] - evs["t"][0]  # about 20 ms
+    """
+
+    rng = np.random.default_rng(seed)
+    duration_us = max(int(n_events / event_rate * 1e6), 1)
+
+    n_noise = int(n_events * noise_frac)
+    n_hot = int(n_events * hot_frac)
+    n_flicker = int(n_events * flicker_frac)
+    n_particle = n_events - n_noise - n_hot - n_flicker
+
+    evs = np.empty(n_events, dtype=EVENT_DTYPE)
+    parts = [
+        _particle_events(
+            rng, n_particle, duration_us, h, w, n_particles, particle_radius, speed
+        ),
+        _noise_events(rng, n_noise, duration_us, h, w),
+        _hot_pixel_events(rng, n_hot, duration_us, h, w),
+        _flicker_events(rng, n_flicker, duration_us, h, w),
+    ]
+    start = 0
+    for x, y, t, p in parts:
+        stop = start + len(x)
+        evs["x"][start:stop] = x
+        evs["y"][start:stop] = y
+        evs["t"][start:stop] = t
+        evs["p"][start:stop] = p
+        start = stop
+
+    evs["t"] += t0
+    return evs[np.argsort(evs["t"], kind="stable")]
+
+
+def _particle_events(rng, n, duration_us, h, w, n_particles, radius, speed):
+    if n == 0 or n_particles == 0:
+        return _empty()
+    start = rng.uniform((0, 0), (w, h), size=(n_particles, 2))
+    angle = rng.uniform(0, 2 * np.pi, n_particles)
+    vel = speed * rng.uniform(0.5, 1.5, n_particles)[:, None]
+    vel = vel * np.stack([np.cos(angle), np.sin(angle)], axis=1) / 1e6  # px/us
+
+    which = rng.integers(0, n_particles, n)
+    t = rng.integers(0, duration_us, n)
+    r = radius * np.sqrt(rng.uniform(0, 1, n))
+    theta = rng.uniform(0, 2 * np.pi, n)
+    offset = np.stack([r * np.cos(theta), r * np.sin(theta)], axis=1)
+    pos = start[which] + vel[which] * t[:, None] + offset
+
+    x = np.mod(np.round(pos[:, 0]), w).astype(np.int32)
+    y = np.mod(np.round(pos[:, 1]), h).astype(np.int32)
+    # leading edge of a moving particle is ON, trailing edge is OFF
+    leading = np.einsum("ij,ij->i", offset, vel[which]) >= 0
+    p = np.where(leading, 1, -1).astype(np.int8)
+    return x, y, t, p
+
+
+def _noise_events(rng, n, duration_us, h, w):
+    x = rng.integers(0, w, n, dtype=np.int32)
+    y = rng.integers(0, h, n, dtype=np.int32)
+    t = rng.integers(0, duration_us, n)
+    p = rng.choice(np.array([-1, 1], dtype=np.int8), n)
+    return x, y, t, p
+
+
+def _hot_pixel_events(rng, n, duration_us, h, w, n_pixels=8):
+    if n == 0:
+        return _empty()
+    px = rng.integers(0, w, n_pixels, dtype=np.int32)
+    py = rng.integers(0, h, n_pixels, dtype=np.int32)
+    pp = rng.choice(np.array([-1, 1], dtype=np.int8), n_pixels)
+    which = rng.integers(0, n_pixels, n)
+    t = rng.integers(0, duration_us, n)
+    return px[which], py[which], t, pp[which]
+
+
+def _flicker_events(rng, n, duration_us, h, w, n_pixels=8):
+    if n == 0:
+        return _empty()
+    px = rng.integers(0, w, n_pixels, dtype=np.int32)
+    py = rng.integers(0, h, n_pixels, dtype=np.int32)
+    which = np.arange(n) % n_pixels
+    k = np.arange(n) // n_pixels
+    n_per_pixel = max(n // n_pixels, 1)
+    t = (k * duration_us) // n_per_pixel
+    p = np.where(k % 2 == 0, 1, -1).astype(np.int8)
+    return px[which], py[which], t, p
+
+
+def _empty():
+    return (
+        np.empty(0, np.int32),
+        np.empty(0, np.int32),
+        np.empty(0, np.int64),
+        np.empty(0, np.int8),
+    )
+
+
+def synthetic_particles(n_steps, particles_per_step, dt=10000, speed=2.0, seed=0):
+    """
+    Generate particle detections for benchmarking `ev_particletracker`.
+
+    Parameters
+    ----------
+    n_steps : int
+        Number of tracker timesteps.
+    particles_per_step : int
+        Number of particles detected in each timestep.
+    dt : int
+        Timestep (in us) between detections.
+    speed : float
+        Displacement of each particle per timestep in pixels.
+    seed : int
+        Seed for the random number generator.
+
+    Returns
+    -------
+    all_particles : np.ndarray
+        Structured array with the output fields of `ev_particlefinder`.
+    time_array : np.ndarray
+        Matching time_array for `ev_particletracker`.
+    """
+
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0, 1000, size=(particles_per_step, 2))
+    vel = rng.uniform(-speed, speed, size=(particles_per_step, 2))
+    step = np.repeat(np.arange(n_steps), particles_per_step)
+    which = np.tile(np.arange(particles_per_step), n_steps)
+
+    particles = np.empty(n_steps * particles_per_step, dtype=PARTICLE_DTYPE)
+    particles["x"] = start[which, 0] + vel[which, 0] * step
+    particles["y"] = start[which, 1] + vel[which, 1] * step
+    particles["t"] = dt * step + dt / 2 + rng.uniform(-dt / 10, dt / 10, len(step))
+    particles["area"] = 100
+    time_array = np.arange(0, (n_steps + 1) * dt, dt)
+    return particles, time_array
@@ -0,0 +1,268 @@
+"""
+Spatially tiled parallel processing of event windows.
+
+The sensor is split into tiles that are processed on a thread pool; the
+KD-tree queries of the filters and skimage's labeling release the GIL, so
+tiles run concurrently. Each tile only holds its own events and frames, so
+tiles also keep frames small when a `memory.MemoryPlan` asks for a
+tile_shape smaller than the sensor.
+
+- `tiled_filter` runs an event filter on each tile plus a halo of the
+  filter's neighborhood radius and keeps the result for the events of the
+  tile itself, so every event sees the same neighbors as in a full-sensor
+  run.
+- `tiled_particlefinder` labels the 8-connected ON clusters of each tile and
+  stitches clusters that touch across tile borders with a union-find, giving
+  the same particles as `ev_particlefinder`.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from eventcamprocessing.instrumentation import instrumented
+from eventcamprocessing.kernels import get_kernel
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE
+from eventcamprocessing.timebase import time_offsets
+
+
+def tile_bounds(h, w, tile_shape):
+    """
+    Tiles covering an (h, w) sensor.
+
+    Parameters
+    ----------
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    tile_shape : tuple of int
+        (height, width) of the tiles, e.g. `MemoryPlan.tile_shape`. Tiles at
+        the bottom and right edges may be smaller.
+
+    Returns
+    -------
+    tiles : list of tuple
+        (y0, y1, x0, x1) of each tile in row-major order.
+    """
+    th, tw = tile_shape
+    return [
+        (y0, min(y0 + th, h), x0, min(x0 + tw, w))
+        for y0 in range(0, h, th)
+        for x0 in range(0, w, tw)
+    ]
+
+
+def _in_box(evs, y0, y1, x0, x1):
+    x = evs["x"]
+    y = evs["y"]
+    return (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+
+
+def _map_tiles(fn, tiles, max_workers):
+    if max_workers == 1 or len(tiles) == 1:
+        return [fn(tile) for tile in tiles]
+    with ThreadPoolExecutor(max_workers or os.cpu_count()) as pool:
+        return list(pool.map(fn, tiles))
+
+
+def tiled_filter(evs, filter_fn, halo, tile_shape, h=720, w=1280, max_workers=None):
+    """
+    Run an event filter tile by tile.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y', 't', 'p'].
+    filter_fn : callable
+        Filter taking and returning an event array, e.g.
+        ``functools.partial(isolated_noise_filter, spatial_radius=5)``. Whether
+        an event is kept may only depend on events within halo pixels of it.
+    halo : int
+        Neighborhood radius of the filter in pixels: spatial_radius for
+        `isolated_noise_filter` and `opposite_polarity_filter`, 0 for the
+        per-pixel `low_pass_filter` and `hot_pixel_filter`.
+    tile_shape : tuple of int
+        (height, width) of the tiles.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    max_workers : int, optional
+        Number of threads (default: number of CPUs).
+
+    Returns
+    -------
+    filtered_evs : np.ndarray
+        The events kept by the filter, in their input order. For filters
+        that keep the order of time-sorted input this equals
+        ``filter_fn(evs)``.
+    """
+    halo = int(np.ceil(halo))
+    # tag every event with its index so each tile reports what it kept
+    tagged = np.empty(len(evs), dtype=[*evs.dtype.descr, ("_index", "i8")])
+    for name in evs.dtype.names:
+        tagged[name] = evs[name]
+    tagged["_index"] = np.arange(len(evs))
+
+    def run_tile(tile):
+        y0, y1, x0, x1 = tile
+        near = tagged[_in_box(tagged, y0 - halo, y1 + halo, x0 - halo, x1 + halo)]
+        if len(near) == 0:
+            return np.empty(0, dtype=np.int64)
+        kept = filter_fn(near)
+        return kept["_index"][_in_box(kept, y0, y1, x0, x1)]
+
+    keep = np.zeros(len(evs), dtype=bool)
+    for idx in _map_tiles(run_tile, tile_bounds(h, w, tile_shape), max_workers):
+        keep[idx] = True
+    return evs[keep]
+
+
+def _label_tile(ON_events, t_origin, tile, w):
+    """per-label sums and border labels of one tile, as in label_clusters"""
+    from skimage.measure import label
+
+    y0, y1, x0, x1 = tile
+    th, tw = y1 - y0, x1 - x0
+    ON_events = ON_events[_in_box(ON_events, y0, y1, x0, x1)]
+    ys = ON_events["y"] - y0
+    xs = ON_events["x"] - x0
+
+    binary_frame = np.zeros((th, tw), dtype=np.uint8)
+    binary_frame[ys, xs] = 1
+    # int32 time offsets from the same origin as the full-frame labeling
+    t_offsets, _ = time_offsets(ON_events["t"], t_origin)
+    ts_frame = np.zeros((th, tw), dtype=t_offsets.dtype)
+    count_frame = np.zeros((th, tw), dtype=np.uint32)
+    ts_frame[ys, xs] += t_offsets
+    count_frame[ys, xs] += 1
+
+    labels = label(binary_frame, connectivity=2)
+    flat = labels.ravel()
+    n = int(flat.max()) if len(flat) else 0
+    rows, cols = np.divmod(np.arange(th * tw), tw)
+    sums = {
+        "area": np.bincount(flat, minlength=n + 1)[1:],
+        "x": np.bincount(flat, cols + x0, minlength=n + 1)[1:],
+        "y": np.bincount(flat, rows + y0, minlength=n + 1)[1:],
+        "t": np.bincount(flat, ts_frame.ravel(), minlength=n + 1)[1:],
+        "count": np.bincount(flat, count_frame.ravel(), minlength=n + 1)[1:],
+    }
+    # labels are numbered in raster order, so the first pixel of each label
+    # is also its first pixel in the full frame
+    _, first = np.unique(flat, return_index=True)
+    sums["first"] = (rows[first[1:]] + y0) * w + cols[first[1:]] + x0
+
+    borders = {
+        "top": labels[0],
+        "bottom": labels[-1],
+        "left": labels[:, 0],
+        "right": labels[:, -1],
+    }
+    return n, sums, borders
+
+
+def _border_edges(a, b):
+    """pairs of labels (0 = background) touching across a border, incl. diagonals"""
+    src, dst = [], []
+    for d in (-1, 0, 1):
+        la = a[max(d, 0) : len(a) + min(d, 0)]
+        lb = b[max(-d, 0) : len(b) + min(-d, 0)]
+        hit = (la > 0) & (lb > 0)
+        src.append(la[hit])
+        dst.append(lb[hit])
+    return np.concatenate(src), np.concatenate(dst)
+
+
+@instrumented("tiled_particlefinder", output="particles")
+def tiled_particlefinder(
+    evs, min_area, tile_shape, h=720, w=1280, max_workers=None, backend="numpy"
+):
+    """
+    Detect particles like `ev_particlefinder`, labeling tiles in parallel.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array of current event window (updated by accumulate_events).
+    min_area : int
+        Minimum area (event count) for an event cluster to be considered a particle.
+    tile_shape : tuple of int
+        (height, width) of the tiles.
+    h, w : int
+        Height and width of the EVK sensor in pixels.
+    max_workers : int, optional
+        Number of threads (default: number of CPUs).
+    backend : {"numpy", "numba"}
+        Union-find implementation used for stitching, see `kernels.get_kernel`.
+
+    Returns
+    -------
+    particle_info : np.ndarray
+        The particles `ev_particlefinder` finds in the full frame, in the
+        same order.
+    """
+    ON_events = evs[evs["p"] == 1]
+    _, t_origin = time_offsets(ON_events["t"])
+    tiles = tile_bounds(h, w, tile_shape)
+    results = _map_tiles(
+        lambda tile: _label_tile(ON_events, t_origin, tile, w), tiles, max_workers
+    )
+
+    # global label ids: tile k's label l becomes offsets[k] + l - 1
+    counts = np.array([n for n, _, _ in results], dtype=np.int64)
+    offsets = np.r_[0, np.cumsum(counts)[:-1]]
+    n_total = int(counts.sum())
+    if n_total == 0:
+        return np.empty(0, dtype=PARTICLE_DTYPE)
+
+    # full-sensor columns and rows on both sides of every tile border, with
+    # labels shifted by one so that 0 stays background
+    x_edges = sorted({x1 for _, _, _, x1 in tiles if x1 < w})
+    y_edges = sorted({y1 for _, y1, _, _ in tiles if y1 < h})
+    left = {x: np.zeros(h, np.int64) for x in x_edges}
+    right = {x: np.zeros(h, np.int64) for x in x_edges}
+    above = {y: np.zeros(w, np.int64) for y in y_edges}
+    below = {y: np.zeros(w, np.int64) for y in y_edges}
+    for (y0, y1, x0, x1), offset, (_, _, borders) in zip(
+        tiles, offsets, results, strict=True
+    ):
+
+        def shift(labels, offset=offset):
+            return np.where(labels > 0, labels + offset, 0)
+
+        if x1 in left:
+            left[x1][y0:y1] = shift(borders["right"])
+        if x0 in right:
+            right[x0][y0:y1] = shift(borders["left"])
+        if y1 in above:
+            above[y1][x0:x1] = shift(borders["bottom"])
+        if y0 in below:
+            below[y0][x0:x1] = shift(borders["top"])
+
+    src, dst = [np.arange(n_total)], [np.arange(n_total)]
+    for x in x_edges:
+        a, b = _border_edges(left[x], right[x])
+        src.append(a - 1)
+        dst.append(b - 1)
+    for y in y_edges:
+        a, b = _border_edges(above[y], below[y])
+        src.append(a - 1)
+        dst.append(b - 1)
+    union_find = get_kernel("union_find", backend)
+    component = union_find(n_total, np.concatenate(src), np.concatenate(dst))
+
+    def merged(key):
+        values = np.concatenate([sums[key] for _, sums, _ in results])
+        return np.bincount(component, values)
+
+    area = merged("area")
+    first = np.full(len(area), np.iinfo(np.int64).max)
+    np.minimum.at(first, component, np.concatenate([s["first"] for _, s, _ in results]))
+
+    particles = np.empty(len(area), dtype=PARTICLE_DTYPE)
+    particles["x"] = merged("x") / area
+    particles["y"] = merged("y") / area
+    particles["t"] = merged("t") / merged("count") + t_origin
+    particles["area"] = area
+    # full-frame labels are numbered by their first pixel in raster order
+    particles = particles[np.argsort(first, kind="stable")]
+    return particles[particles["area"] >= min_area]
@@ -0,0 +1,105 @@
+"""
+Relative-time encoding of event timestamps.
+
+Absolute timestamps are microseconds since the camera started and quickly
+exceed 1e10, so they need 64 bits. Within one window or segment, the
+timestamps relative to a time origin (e.g. the first event of the window)
+span at most a few seconds and fit in int32, which halves the memory (and
+memory traffic) of time arrays and accumulation frames. Integer offsets are
+exact, so adding the origin back reconstructs the absolute timestamps, and
+means of offsets plus the origin give the same centroids as means of
+absolute timestamps. The detection frames accumulate such offsets, and
+`cache.cached_detection` stores its filtered windows with `encode_times`.
+
+Examples
+--------
+>>> rel, origin = encode_times(window)
+>>> rel["t"].dtype
+dtype('int32')
+>>> np.array_equal(decode_times(rel, origin), window)
+True
+"""
+
+import numpy as np
+
+_INT32 = np.iinfo(np.int32)
+
+
+def time_offsets(t, origin=None):
+    """
+    Timestamps relative to a time origin, as int32 if they fit.
+
+    Parameters
+    ----------
+    t : np.ndarray
+        Timestamps. Float timestamps are only shifted, not converted.
+    origin : int, optional
+        Time origin (default: the earliest timestamp).
+
+    Returns
+    -------
+    offsets : np.ndarray
+        t - origin; for integer timestamps int32 if every offset fits and
+        int64 otherwise.
+    origin : int or float
+        The time origin.
+    """
+    t = np.asarray(t)
+    if origin is None:
+        origin = t.min() if len(t) else 0
+    if not np.issubdtype(t.dtype, np.integer):
+        return t - origin, origin
+    offsets = t - np.int64(origin)
+    if len(t) == 0 or (offsets.min() >= _INT32.min and offsets.max() <= _INT32.max):
+        offsets = offsets.astype(np.int32)
+    return offsets, int(origin)
+
+
+def encode_times(evs, origin=None):
+    """
+    Copy of an event array with int32 timestamps relative to origin.
+
+    Parameters
+    ----------
+    evs : np.ndarray
+        Numpy array with N-events, containing fields ['x', 'y', 't', 'p'].
+    origin : int, optional
+        Time origin (default: the earliest timestamp).
+
+    Returns
+    -------
+    rel_evs : np.ndarray
+        Events with the same fields, 't' being the int32 offset from origin.
+    origin : int
+        The time origin.
+
+    Raises
+    ------
+    ValueError
+        If the offsets do not fit in int32 (a span of about 35 minutes).
+    """
+    offsets, origin = time_offsets(evs["t"], origin)
+    if offsets.dtype != np.int32:
+        raise ValueError("Timestamps span more than int32 offsets can hold")
+    descr = [
+        (name, "i4" if name == "t" else evs.dtype[name]) for name in evs.dtype.names
+    ]
+    rel_evs = np.empty(len(evs), dtype=descr)
+    for name in evs.dtype.names:
+        rel_evs[name] = offsets if name == "t" else evs[name]
+    return rel_evs, origin
+
+
+def decode_times(rel_evs, origin, t_dtype="i8"):
+    """
+    Inverse of `encode_times`: events with absolute timestamps of t_dtype.
+    """
+    descr = [
+        (name, t_dtype if name == "t" else rel_evs.dtype[name])
+        for name in rel_evs.dtype.names
+    ]
+    evs = np.empty(len(rel_evs), dtype=descr)
+    for name in rel_evs.dtype.names:
+        evs[name] = rel_evs[name]
+    evs["t"] += origin
+    return evs
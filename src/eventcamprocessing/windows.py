@@ -0,0 +1,199 @@
+"""
+Sliding windows over time-sorted event arrays.
+
+The window edges for the whole recording are located with a single
+`np.searchsorted` call on the sorted `t` column, and every window is yielded
+as a slice (a view, so no events are copied). This also works on memmapped
+arrays, where only the pages holding a window are read.
+
+Three kinds of windows are supported:
+
+- centered: windows of t_window centered on t_start, t_start + t_step, ...
+  (same windows as figures/figure_utils.basic_event_iterator)
+- trailing: the window `accumulate_events` holds after each EventsIterator
+  chunk of t_step
+- count: windows of a fixed number of events
+"""
+
+import numpy as np
+
+from eventcamprocessing.filter_funcs import is_time_sorted
+
+
+def _check_sorted(events):
+    if not is_time_sorted(events):
+        raise ValueError("events must be sorted by t")
+
+
+def centered_window_bounds(t, t_step, t_window, t_start=None, t_end=None):
+    """
+    Start and stop indices of windows [c - t_window/2, c + t_window/2) for
+    centers c = t_start, t_start + t_step, ... < t_end.
+
+    Parameters
+    ----------
+    t : np.ndarray
+        Sorted timestamps.
+    t_step : float
+        Distance between window centers in microseconds.
+    t_window : float
+        Window length in microseconds.
+    t_start, t_end : float, optional
+        Range of window centers. Default to the first and last timestamp.
+
+    Returns
+    -------
+    starts, stops : np.ndarray
+        Index arrays such that window i is events[starts[i]:stops[i]].
+    """
+    if len(t) == 0:
+        return np.empty(0, np.intp), np.empty(0, np.intp)
+    t_start = t[0] if t_start is None else t_start
+    t_end = t[-1] if t_end is None else t_end
+    centers = np.arange(t_start, t_end, t_step)
+    starts = np.searchsorted(t, centers - t_window / 2, side="left")
+    stops = np.searchsorted(t, centers + t_window / 2, side="left")
+    return starts, stops
+
+
+def trailing_window_bounds(t, t_step, t_accum_us, t_start=None):
+    """
+    Start and stop indices of the windows held by `accumulate_events` after
+    each chunk [t_start + k * t_step, t_start + (k + 1) * t_step).
+
+    Parameters
+    ----------
+    t : np.ndarray
+        Sorted timestamps.
+    t_step : int
+        Chunk length in microseconds (delta_t of the EventsIterator).
+    t_accum_us : int
+        Timespan (in us) of the rolling accumulation window.
+    t_start : int, optional
+        Start of the first chunk. Defaults to the multiple of t_step at or
+        before the first timestamp, as for an EventsIterator starting at 0.
+
+    Returns
+    -------
+    starts, stops : np.ndarray
+        Index arrays such that window i is events[starts[i]:stops[i]].
+
+    Notes
+    -----
+    Like `accumulate_events`, the cutoff is t_accum_us before the newest
+    event in the window (not before the chunk edge), and the first non-empty
+    window holds its whole chunk.
+    """
+    if len(t) == 0:
+        return np.empty(0, np.intp), np.empty(0, np.intp)
+    if t_start is None:
+        t_start = (t[0] // t_step) * t_step
+    n_chunks = int((t[-1] - t_start) // t_step) + 1
+    edges = t_start + t_step * np.arange(1, n_chunks + 1)
+    stops = np.searchsorted(t, edges, side="left")
+
+    newest = t[np.maximum(stops - 1, 0)]
+    starts = np.searchsorted(t, newest - t_accum_us, side="left")
+    # the first non-empty window is the whole first chunk; events before it
+    # are never part of a later window either
+    first = int(np.searchsorted(t, t_start, side="left"))
+    starts = np.maximum(starts, first)
+    starts[stops == first] = first
+    non_empty = np.flatnonzero(stops > first)
+    if len(non_empty) > 0:
+        starts[non_empty[0]] = first
+    return starts, stops
+
+
+def count_window_bounds(n_total, n_events, n_step=None):
+    """
+    Start and stop indices of windows of n_events events, advancing by n_step
+    events (default: n_events, i.e. non-overlapping). The last window may be
+    shorter.
+
+    Returns
+    -------
+    starts, stops : np.ndarray
+        Index arrays such that window i is events[starts[i]:stops[i]].
+    """
+    n_step = n_events if n_step is None else n_step
+    if n_total == 0:
+        return np.empty(0, np.intp), np.empty(0, np.intp)
+    n_windows = max(-(-(n_total - n_events) // n_step), 0) + 1
+    starts = np.arange(n_windows) * n_step
+    stops = np.minimum(starts + n_events, n_total)
+    return starts, stops
+
+
+def iter_windows(events, starts, stops):
+    """Yield events[start:stop] for each pair of bounds."""
+    for start, stop in zip(starts.tolist(), stops.tolist(), strict=True):
+        yield events[start:stop]
+
+
+def time_windows(
+    events, t_step, t_window, mode="centered", t_start=None, check_sorted=True
+):
+    """
+    Iterate over sliding time windows of a sorted event array.
+
+    Parameters
+    ----------
+    events : np.ndarray
+        In-memory or memmapped array with N-events, sorted by the 't' field.
+    t_step : float
+        Step between windows in microseconds.
+    t_window : float
+        Window length in microseconds (t_accum_us for trailing windows).
+    mode : {"centered", "trailing"}
+        Window placement, see `centered_window_bounds` and
+        `trailing_window_bounds`.
+    t_start : float, optional
+        First window center (centered) or chunk start (trailing).
+    check_sorted : bool
+        Raise ValueError if events are not sorted by t. Disable to avoid a
+        full pass over very large memmapped files that are known to be sorted.
+
+    Yields
+    ------
+    window : np.ndarray
+        Slice (view) of events.
+
+    Examples
+    --------
+    >>> for window in time_windows(events, t_step=10000, t_window=20000,
+    ...                            mode="trailing"):
+    ...     particles = ev_particlefinder(window, min_area=100)
+    """
+    t = events["t"]
+    if check_sorted:
+        _check_sorted(events)
+    if mode == "centered":
+        starts, stops = centered_window_bounds(t, t_step, t_window, t_start)
+    elif mode == "trailing":
+        starts, stops = trailing_window_bounds(t, t_step, t_window, t_start)
+    else:
+        raise ValueError(f"Unknown window mode: {mode!r}")
+    yield from iter_windows(events, starts, stops)
+
+
+def count_windows(events, n_events, n_step=None):
+    """
+    Iterate over windows of a fixed number of events.
+
+    Parameters
+    ----------
+    events : np.ndarray
+        In-memory or memmapped event array.
+    n_events : int
+        Number of events per window.
+    n_step : int, optional
+        Number of events between window starts (default n_events).
+
+    Yields
+    ------
+    window : np.ndarray
+        Slice (view) of events.
+    """
+    starts, stops = count_window_bounds(len(events), n_events, n_step)
+    yield from iter_windows(events, starts, stops)
@@ -28,3 +28,27 @@ def array_events(list_of_events):
 
 def event():
     return event_dtype
+
+
+def moving_blob_chunks(n_chunks=10, dt=1000, n_blobs=2, size=4, speed=2, seed=0):
+    """
+    Chunks of events from square blobs moving diagonally, with ON events on the
+    blob and a few OFF events at its trailing edge. Returns a list of
+    time-ordered event arrays, one per dt.
+    """
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for k in range(n_chunks):
+        rows = []
+        for b in range(n_blobs):
+            x0 = 10 + speed * k
+            y0 = 20 + 30 * b + speed * k
+            for i in range(size * size):
+                t = k * dt + rng.integers(0, dt)
+                rows.append((x0 + i % size, y0 + i // size, t, 1))
+            for j in range(size):
+                t = k * dt + rng.integers(0, dt)
+                rows.append((x0 - 1, y0 + j, t, -1))
+        arr = array_events(rows)
+        chunks.append(arr[np.argsort(arr["t"], kind="stable")])
+    return chunks
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from eventcamprocessing.analytics import (
+    accelerations,
+    eulerian_grid,
+    filter_tracks,
+    sort_tracks,
+    track_lengths,
+    velocities,
+)
+from eventcamprocessing.storage import tracks_to_records
+
+
+@pytest.fixture
+def points():
+    """
+    A track with constant acceleration on uneven time steps, a track with
+    constant velocity and a single point, shuffled.
+    """
+    t = np.array([0.0, 10.0, 30.0, 35.0, 60.0])
+    tracks = [
+        {
+            "L": 5,
+            "X": list(1 + 0.5 * t + 0.01 * t**2),
+            "Y": list(2 - 0.2 * t),
+            "T": list(t),
+        },
+        {"L": 1, "X": [5.0], "Y": [5.0], "T": [20.0]},
+        {"L": 3, "X": [0.0, 3.0, 6.0], "Y": [1.0, 1.0, 1.0], "T": [0.0, 1.0, 2.0]},
+    ]
+    records = tracks_to_records(tracks)
+    return sort_tracks(records[np.random.default_rng(0).permutation(len(records))])
+
+
+def test_lengths_and_filtering(points):
+    """
+    Test that track lengths are counted per track id and that filtering keeps
+    only the points of tracks within the length bounds.
+    """
+    ids, lengths = track_lengths(points)
+    assert ids.tolist() == [0, 1, 2]
+    assert lengths.tolist() == [5, 1, 3]
+    kept = filter_tracks(points, min_length=2, max_length=4)
+    assert kept["track_id"].tolist() == [2, 2, 2]
+
+
+def test_finite_differences_respect_tracks(points):
+    """
+    Test that velocities and accelerations use central differences within a
+    track and are NaN where a track is too short or ends.
+    """
+    vx, vy = velocities(points)
+    t = points["t"][:5]
+    # central differences of a quadratic on uneven steps are exact at the
+    # midpoint of the neighbors
+    mid = (t[2:] + t[:-2]) / 2
+    np.testing.assert_allclose(vx[1:4], 0.5 + 0.02 * mid)
+    np.testing.assert_allclose(vy[:5], -0.2)
+    assert np.isnan(vx[5])
+    np.testing.assert_allclose(vx[6:], 3.0)
+
+    ax, ay = accelerations(points)
+    np.testing.assert_allclose(ax[1:4], 0.02)
+    np.testing.assert_allclose(ay[1:4], 0.0, atol=1e-12)
+    assert np.isnan(ax[[0, 4, 5, 6, 8]]).all()
+    assert ax[7] == 0.0
+
+
+def test_eulerian_grid_matches_loop():
+    """
+    Test that the binned means, variances and counts of the Eulerian grid
+    match a direct selection of the samples in each cell, ignoring NaNs.
+    """
+    rng = np.random.default_rng(1)
+    n = 2000
+    x, y = rng.uniform(0, 64, n), rng.uniform(0, 32, n)
+    t = rng.uniform(0, 100, n)
+    v = rng.normal(size=n)
+    v[::50] = np.nan
+
+    grid = eulerian_grid(x, y, {"v": v}, bin_size=8, h=32, w=64, t=t, t_bin=50)
+    assert grid["count"].shape == (2, 4, 8)
+    ok = ~np.isnan(v)
+    it = ((t - t[ok].min()) // 50).astype(int)
+    for k, i, j in [(0, 0, 0), (1, 3, 7), (0, 2, 5)]:
+        sel = ok & (it == k) & (y // 8 == i) & (x // 8 == j)
+        assert grid["count"][k, i, j] == sel.sum()
+        assert grid["v_mean"][k, i, j] == pytest.approx(v[sel].mean())
+        assert grid["v_var"][k, i, j] == pytest.approx(v[sel].var())
+
+    empty = eulerian_grid(x[1:2], y[1:2], {"v": v[1:2]}, bin_size=8, h=32, w=64)
+    assert empty["count"].sum() == 1
+    assert np.isnan(empty["v_mean"]).sum() == 4 * 8 - 1
@@ -0,0 +1,94 @@
+import json
+from functools import partial
+
+import numpy as np
+from conftest import moving_blob_chunks
+
+from eventcamprocessing.batch import load_config, output_paths, read_manifest
+from eventcamprocessing.cli import main
+from eventcamprocessing.filter_funcs import isolated_noise_filter
+from eventcamprocessing.recording import run_recording
+from eventcamprocessing.storage import read_particles
+
+CONFIG = """
+t_accum_us = 2000
+dt = 1000
+min_area = 4
+max_disp = 8
+h = 128
+w = 128
+checkpoint_every_s = 0
+
+[[filters]]
+name = "isolated_noise_filter"
+spatial_radius = 2
+time_window = 1000
+"""
+
+
+def _recordings(tmp_path):
+    data = tmp_path / "raw_files"
+    data.mkdir()
+    for name, n_chunks in [("short", 4), ("long", 12), ("medium", 8)]:
+        np.save(data / f"{name}.npy", np.concatenate(moving_blob_chunks(n_chunks)))
+    (data / "broken.npy").write_bytes(b"not an event file")
+    cfg = tmp_path / "cfg.toml"
+    cfg.write_text(CONFIG)
+    return data, cfg
+
+
+def _status_lines(capsys):
+    out = capsys.readouterr().out.splitlines()
+    return [line for line in out if line.endswith((": done", ": failed"))]
+
+
+def test_run_processes_directory_largest_first(tmp_path, capsys):
+    """
+    Test the batch CLI: largest files first, failures recorded in the manifest,
+    and up-to-date files skipped on rerun.
+    """
+    data, cfg = _recordings(tmp_path)
+    argv = ["run", str(data), "--config", str(cfg), "--pattern", "*.npy"]
+
+    assert main(argv) == 1
+    assert _status_lines(capsys) == [
+        "long.npy: done",
+        "medium.npy: done",
+        "short.npy: done",
+        "broken.npy: failed",
+    ]
+    manifest = read_manifest(data / "processed")
+    assert manifest["long.npy"]["status"] == "done"
+    assert manifest["long.npy"]["wall_s"] > 0
+    assert "error" in manifest["broken.npy"]
+
+    # the outputs match a direct run
+    config = load_config(cfg)
+    paths = output_paths(data / "medium.npy", data / "processed", config)
+    expected, _ = run_recording(
+        moving_blob_chunks(8),
+        t_accum_us=2000,
+        min_area=4,
+        dt=1000,
+        max_disp=8,
+        filters=[partial(isolated_noise_filter, spatial_radius=2, time_window=1000)],
+        h=128,
+        w=128,
+    )
+    np.testing.assert_array_equal(read_particles(paths["particles"]), expected)
+    assert not paths["checkpoint"].exists()
+
+    # rerun: only the failed file is retried
+    (data / "broken.npy").unlink()
+    np.save(data / "broken.npy", np.concatenate(moving_blob_chunks(2)))
+    assert main([*argv, "-j", "2"]) == 0
+    out = capsys.readouterr().out
+    assert "4 files, 3 up to date" in out
+    assert "broken.npy: done" in out
+
+    # a changed config reprocesses everything
+    cfg.write_text(CONFIG.replace("min_area = 4", "min_area = 6"))
+    assert main(argv) == 0
+    assert "4 files, 0 up to date" in capsys.readouterr().out
+    with open(data / "processed" / "manifest.json") as f:
+        assert len(json.load(f)["files"]) == 4
@@ -0,0 +1,148 @@
+import os
+from functools import partial
+
+import numpy as np
+import pytest
+from conftest import moving_blob_chunks
+
+from eventcamprocessing.cache import StageCache, cached_detection, describe, file_digest
+from eventcamprocessing.filter_funcs import accumulate_events, isolated_noise_filter
+from eventcamprocessing.particle_detection import ev_particlefinder
+
+FILTERS = [partial(isolated_noise_filter, spatial_radius=2, time_window=1000)]
+SOURCE = {"file": "moving_blobs", "delta_t": 1000}
+
+
+def _serial(chunks, min_area):
+    window = []
+    found = []
+    for evs in chunks:
+        window = accumulate_events(window=window, new_chunk=evs, t_accum_us=2000)
+        filtered = FILTERS[0](window)
+        found.append(ev_particlefinder(filtered, min_area=min_area, h=128, w=128))
+    return np.concatenate(found)
+
+
+def _unreadable():
+    raise AssertionError("chunks were read")
+    yield
+
+
+def _detect(chunks, cache, min_area=4):
+    return cached_detection(
+        chunks,
+        cache,
+        SOURCE,
+        2000,
+        min_area,
+        filters=FILTERS,
+        h=128,
+        w=128,
+        segment_chunks=4,
+    )
+
+
+def _filter_params():
+    return {
+        "t_accum_us": 2000,
+        "filters": FILTERS,
+        "roi": None,
+        "segment_chunks": 4,
+    }
+
+
+def test_cached_detection_reuses_segments(tmp_path):
+    """
+    Test that reruns reuse cached particles, and filtered windows when only
+    min_area changes, with results identical to the serial loop.
+    """
+    chunks = moving_blob_chunks(n_chunks=10)
+    cache = StageCache(tmp_path)
+
+    particles = _detect(chunks, cache)
+    np.testing.assert_array_equal(particles, _serial(chunks, min_area=4))
+    assert cache.stats["filter"] == {"hits": 0, "misses": 3}
+
+    # only tracker parameters changed: no chunk is read
+    np.testing.assert_array_equal(_detect(_unreadable(), cache), particles)
+    assert cache.stats["particles"]["hits"] == 3
+
+    # new min_area: filtered windows come from the cache
+    particles = _detect(chunks, cache, min_area=10)
+    np.testing.assert_array_equal(particles, _serial(chunks, min_area=10))
+    assert cache.stats["filter"] == {"hits": 3, "misses": 3}
+
+    # filtered events are stored with int32 time offsets
+    entry = cache.load(cache.key("filter", SOURCE, segment=0, **_filter_params()))
+    assert entry["events"]["t"].dtype == np.int32
+    assert entry["events"]["t"].min() == 0
+
+    # another filter setting is a different entry
+    other = [partial(isolated_noise_filter, spatial_radius=3, time_window=1000)]
+    keys = {cache.key("filter", SOURCE, filters=f) for f in (FILTERS, other)}
+    assert len(keys) == 2
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """
+    Test that storing over max_bytes deletes the least recently used entries
+    and that loading an entry counts as a use.
+    """
+    data = np.zeros(100)
+    cache = StageCache(tmp_path)
+    cache.store("a", data=data)
+    cache.max_bytes = 3 * cache.size  # room for three entries
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.store(key, data=data)
+        os.utime(cache._path(key), ns=(i, i))
+    cache.load("a")  # a becomes the most recently used
+    cache.store("d", data=data)
+
+    assert cache.load("b") is None
+    assert all(cache.load(key) is not None for key in "acd")
+    assert cache.size <= cache.max_bytes
+
+
+def test_keys_describe_parameters(tmp_path):
+    """
+    Test that keys depend on every parameter and that partials, dataclasses
+    and numpy scalars are described by their contents.
+    """
+    path = tmp_path / "rec.raw"
+    path.write_bytes(b"events")
+    digest = file_digest(path)
+    path.write_bytes(b"other events")
+    assert file_digest(path) != digest
+
+    assert describe(FILTERS[0]) == {
+        "func": "eventcamprocessing.filter_funcs.isolated_noise_filter",
+        "args": [],
+        "keywords": {"spatial_radius": 2, "time_window": 1000},
+    }
+    assert describe(np.int64(3)) == 3
+
+
+def test_lambdas_cannot_share_cache_entries(tmp_path):
+    """
+    Test that different lambda filters are refused instead of being keyed by
+    their shared name, which would return one filter's cached results for
+    the other.
+    """
+    chunks = moving_blob_chunks(n_chunks=3)
+    cache = StageCache(tmp_path / "cache")
+    keep_all = lambda evs: evs
+    keep_none = lambda evs: evs[:0]
+
+    for f in (keep_all, keep_none):
+        with pytest.raises(TypeError, match="lambda"):
+            cached_detection(chunks, cache, "src", 2000, 4, filters=[f])
+    with pytest.raises(TypeError, match="locals"):
+        describe(partial(_local_filter(), spatial_radius=5))
+    assert cache.size == 0
+
+
+def _local_filter():
+    def f(evs, spatial_radius):
+        return evs
+
+    return f
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+from eventcamprocessing import instrumentation
+from eventcamprocessing.chunking import (
+    adaptive_chunks,
+    adaptive_windows,
+    split_bounds,
+    subsample,
+)
+from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.synthetic import synthetic_events
+
+
+@pytest.fixture
+def bursty_chunks():
+    """quiet 1 ms chunks around one 1 ms chunk with a burst of events"""
+    quiet = synthetic_events(300, event_rate=1e5)
+    burst = synthetic_events(5000, event_rate=5e6, t0=3000)
+    return [
+        quiet[quiet["t"] < 1000],
+        quiet[(quiet["t"] >= 1000) & (quiet["t"] < 2000)],
+        burst[burst["t"] < 4000],
+    ]
+
+
+def test_split_keeps_every_event(bursty_chunks):
+    """
+    Test that split chunks are bounded in count and span and keep all events
+    in order.
+    """
+    report = []
+    out = list(
+        adaptive_chunks(bursty_chunks, max_events=1000, max_span_us=500, report=report)
+    )
+
+    assert all(len(c) <= 1000 for c in out)
+    assert all(c["t"][-1] - c["t"][0] < 500 for c in out)
+    np.testing.assert_array_equal(np.concatenate(out), np.concatenate(bursty_chunks))
+    assert [r["action"] for r in report] == ["split", "split", "split"]
+    assert report[2]["parts"] >= len(bursty_chunks[2]) // 1000
+    assert sum(r["parts"] for r in report) == len(out)
+
+
+def test_subsample_keeps_one_chunk_per_span(bursty_chunks):
+    """
+    Test that subsampling bounds the events without adding steps.
+    """
+    report = []
+    out = list(
+        adaptive_chunks(
+            bursty_chunks, max_events=1000, overload="subsample", report=report
+        )
+    )
+
+    assert len(out) == len(bursty_chunks)
+    assert [r["action"] for r in report] == ["pass", "pass", "subsample"]
+    assert report[2]["events_out"] == len(out[2]) == 1000
+    assert np.all(np.diff(out[2]["t"]) >= 0)
+
+
+def test_adaptive_chunks_recorded():
+    """
+    Test that each input chunk is recorded as a stage with events in and out.
+    """
+    chunks = [synthetic_events(2000, event_rate=1e6)]
+    with instrumentation.recording() as rec:
+        list(adaptive_chunks(chunks, max_events=500, overload="subsample"))
+    summary = rec.summary()["adaptive_chunks"]
+    assert (summary["events_in"], summary["events_out"]) == (2000, 500)
+
+    with pytest.raises(ValueError, match="overload"):
+        list(adaptive_chunks(chunks, max_events=500, overload="drop"))
+
+
+def test_empty_chunks_pass_through(bursty_chunks):
+    """
+    Test that an empty chunk is yielded as one empty chunk, so quiet periods
+    keep their step.
+    """
+    empty = bursty_chunks[0][:0]
+    for overload in ("split", "subsample"):
+        report = []
+        out = list(
+            adaptive_chunks(
+                [bursty_chunks[0], empty, bursty_chunks[1]],
+                max_events=500,
+                max_span_us=500,
+                overload=overload,
+                report=report,
+            )
+        )
+        assert [len(r) for r in out].count(0) == 1
+        assert report[1]["parts"] == 1
+        assert report[1]["action"] == "pass"
+
+
+@pytest.mark.parametrize("overload", ["split", "subsample"])
+def test_adaptive_windows_are_bounded(bursty_chunks, overload):
+    """
+    Test that the accumulation windows stay within max_events during and
+    after a burst, and that bounding them processes fewer events than
+    accumulating the adapted chunks or the original chunks.
+    """
+    after = synthetic_events(300, event_rate=1e5, t0=4000)
+    chunks = [*bursty_chunks, after[after["t"] < 5000]]
+    t_accum_us = 2000
+
+    def window_sizes(chunks):
+        sizes = []
+        window = None
+        for chunk in chunks:
+            window = accumulate_events(window, chunk, t_accum_us)
+            sizes.append(len(window))
+        return sizes
+
+    plain = window_sizes(chunks)
+    adapted = window_sizes(adaptive_chunks(chunks, 1000, overload=overload))
+    assert max(plain) > 1000
+    assert max(adapted) > 1000
+
+    windows = list(
+        adaptive_windows(chunks, t_accum_us, max_events=1000, overload=overload)
+    )
+    assert len(windows) == len(adapted)
+    assert max(len(w) for w in windows) <= 1000
+    assert sum(len(w) for w in windows) < min(sum(plain), sum(adapted))
+    # the newest events are always kept
+    assert windows[-1]["t"][-1] == chunks[-1]["t"][-1]
+
+
+def test_split_bounds_and_subsample():
+    """
+    Test that split_bounds cuts at the event and span limits and that
+    subsample keeps evenly spread entries.
+    """
+    t = np.array([0, 1, 2, 10, 11, 30])
+    starts, stops = split_bounds(t, max_events=2, max_span_us=10)
+    assert list(zip(starts.tolist(), stops.tolist(), strict=True)) == [
+        (0, 2),
+        (2, 3),
+        (3, 5),
+        (5, 6),
+    ]
+    assert subsample(np.arange(10), 4).tolist() == [0, 2, 5, 7]
@@ -0,0 +1,82 @@
+import tracemalloc
+
+import numpy as np
+from conftest import array_events, moving_blob_chunks
+
+from eventcamprocessing.cluster_tracking import CLUSTER_DTYPE, ClusterTracker
+
+
+def test_cluster_tracker_follows_moving_blobs():
+    """
+    Test that each moving blob is tracked by one cluster whose position and
+    velocity follow the blob.
+    """
+    chunks = moving_blob_chunks(n_chunks=10, dt=1000, n_blobs=2, size=4, speed=2)
+    tracker = ClusterTracker(h=128, w=128, radius=6, min_events=8)
+    for chunk in chunks:
+        clusters = tracker.update(chunk)
+
+    assert clusters.dtype == CLUSTER_DTYPE
+    assert sorted(clusters["id"].tolist()) == [0, 1]
+    clusters = np.sort(clusters, order="y")
+    assert clusters["n_events"].tolist() == [160, 160]
+    # blob centers in the last chunk are x0 + 1.5, y0 + 1.5
+    np.testing.assert_allclose(clusters["x"], [29.5, 29.5])
+    np.testing.assert_allclose(clusters["y"], [39.5, 69.5])
+    np.testing.assert_allclose(clusters["vx"], 0.002, rtol=0.3)
+    np.testing.assert_allclose(clusters["vy"], 0.002, rtol=0.3)
+
+
+def test_cluster_tracker_spawns_and_expires():
+    """
+    Test that sparse events do not spawn clusters and idle clusters are dropped.
+    """
+    tracker = ClusterTracker(h=64, w=64, radius=4, min_events=5, max_idle_us=2000)
+    sparse = array_events([(5, 5, 0, 1), (30, 30, 10, 1), (50, 5, 20, 1)])
+    assert len(tracker.update(sparse)) == 0
+
+    blob = array_events([(20 + i % 3, 20 + i // 3, 100 + i, 1) for i in range(9)])
+    assert len(tracker.update(blob)) == 1
+
+    assert len(tracker.update(array_events([(60, 60, 1500, 1)]))) == 1
+    assert len(tracker.update(array_events([(60, 60, 3000, 1)]))) == 0
+    assert len(tracker.update(array_events([]))) == 0
+
+
+def test_cluster_tracker_expires_in_quiet_periods():
+    """
+    Test that idle clusters are dropped by chunks without events of the
+    tracked polarity, and by empty chunks given the current time.
+    """
+    blob = array_events([(20 + i % 3, 20 + i // 3, 100 + i, 1) for i in range(9)])
+    off_only = array_events([(40, 40, 5000, -1)])
+    for quiet, t_now in [(off_only, None), (off_only[:0], 5000)]:
+        tracker = ClusterTracker(h=64, w=64, radius=4, min_events=5, max_idle_us=2000)
+        assert len(tracker.update(blob)) == 1
+        assert len(tracker.update(quiet[:0])) == 1  # no time, nothing expires
+        assert len(tracker.update(quiet, t_now=t_now)) == 0
+
+
+def test_cluster_tracker_spawns_without_sensor_allocations():
+    """
+    Test that spawning reuses the tracker's labeling grids, so an update
+    allocates far less than a sensor-sized grid and leaves the grids clean.
+    """
+    chunks = moving_blob_chunks(n_chunks=4, dt=1000, n_blobs=2, size=4, speed=2)
+    tracker = ClusterTracker(h=2048, w=2048, radius=6, min_events=8)
+    tracker.update(chunks[0])  # warm up imports and caches
+
+    tracemalloc.start()
+    for chunk in chunks[1:]:
+        # new blobs in opposite corners, far apart from each other
+        far = np.concatenate([chunk, chunk])
+        far["x"][: len(chunk)] += 1900
+        far["y"][len(chunk) :] += 1900
+        tracker.update(np.sort(far, order="t"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(tracker.clusters) > 2
+    assert peak < 2048 * 2048
+    for grid in tracker._label_grids:
+        assert np.all(grid == -1)
@@ -0,0 +1,87 @@
+import numpy as np
+from conftest import moving_blob_chunks
+
+from eventcamprocessing.dedup import DedupParticleFinder, tracking_bins
+from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.particle_detection import ev_particlefinder
+from eventcamprocessing.particle_tracking import ev_particletracker
+
+
+def _windows(chunks, t_accum_us):
+    window = []
+    for evs in chunks:
+        window = accumulate_events(window=window, new_chunk=evs, t_accum_us=t_accum_us)
+        yield window
+
+
+def test_overlapping_windows_report_each_particle_once():
+    """
+    Test that with t_accum_us = 2 * dt every other detection of a blob is dropped.
+    """
+    chunks = moving_blob_chunks(n_chunks=12, n_blobs=2)
+    finder = DedupParticleFinder(min_area=4, h=128, w=128)
+
+    found, reported = [], []
+    for window in _windows(chunks, t_accum_us=2000):
+        plain = ev_particlefinder(window, min_area=4, h=128, w=128)
+        particles = finder.update(window)
+        # reported particles are a subset of the plain ones, in the same order
+        assert np.isin(particles, plain).all()
+        found.append(plain)
+        reported.append(particles)
+
+    assert finder.n_detected == sum(len(p) for p in found) == 24
+    assert finder.n_reported == sum(len(p) for p in reported)
+    # both blobs are reported in every second window
+    assert [len(p) for p in reported] == [2, 0] * 6
+
+
+def test_disjoint_windows_are_unchanged():
+    """
+    Test that without overlapping windows the finder reports the particles
+    of ev_particlefinder unchanged.
+    """
+    chunks = moving_blob_chunks(n_chunks=8)
+    finder = DedupParticleFinder(min_area=4, h=128, w=128)
+    for evs in chunks:
+        np.testing.assert_array_equal(
+            finder.update(evs), ev_particlefinder(evs, min_area=4, h=128, w=128)
+        )
+
+
+def test_distant_clusters_are_not_duplicates():
+    """
+    Test that shared events alone do not merge clusters whose centroids moved
+    farther than max_dist.
+    """
+    chunks = moving_blob_chunks(n_chunks=6)
+    strict = DedupParticleFinder(min_area=4, h=128, w=128, max_dist=0.1)
+    for window in _windows(chunks, t_accum_us=2000):
+        strict.update(window)
+    assert strict.n_reported == strict.n_detected
+
+
+def test_tracks_of_deduplicated_particles(capsys):
+    """
+    Test that the deduplicated particles, tracked in t_accum_us bins, give one
+    track per blob through every window.
+    """
+    chunks = moving_blob_chunks(n_chunks=12, n_blobs=2)
+    finder = DedupParticleFinder(min_area=4, h=128, w=128)
+    particles = np.concatenate(
+        [finder.update(window) for window in _windows(chunks, t_accum_us=2000)]
+    )
+    t_end = chunks[-1]["t"][-1]
+    dt_tracks = ev_particletracker(particles, 8, np.arange(0, t_end + 1000, 1000))
+    tracks = ev_particletracker(
+        particles, 8, tracking_bins(0, t_end, dt=1000, t_accum_us=2000)
+    )
+    capsys.readouterr()
+
+    assert len(particles) == 12
+    # dt bins are empty every other step, so no track is ever extended
+    assert max(t["L"] for t in dt_tracks) == 1
+    # in t_accum_us bins every step links to the previous one (the tracker
+    # never links the first particle of a step, leaving one link per step)
+    assert sum(t["L"] - 1 for t in tracks) == 5
+    assert np.array_equal(tracking_bins(0, 5000, 1000, 1000), np.arange(0, 6000, 1000))
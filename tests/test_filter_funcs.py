@@ -38,8 +38,10 @@ from conftest import array_events
 
 from eventcamprocessing.filter_funcs import (
     hot_pixel_filter,
+    is_time_sorted,
     low_pass_filter,
     opposite_polarity_filter,
+    sort_by_time,
 )
 
 
@@ -100,3 +102,47 @@ def test_filter_opposite_polarity_keeps_pairs():
     assert any((out["x"] == 10) & (out["y"] == 10))
     assert any((out["x"] == 12) & (out["y"] == 11))
     assert not any((out["x"] == 200) & (out["y"] == 200))
+
+
+def test_sort_by_time_is_stable_and_skips_sorted_input():
+    """
+    Test that sorting by time keeps ties in input order and returns sorted
+    input unchanged.
+    """
+    arr = array_events([(1, 1, 20, 1), (2, 2, 10, 1), (0, 0, 10, -1)])
+    out = sort_by_time(arr)
+    assert out["t"].tolist() == [10, 10, 20]
+    assert out["x"].tolist() == [2, 0, 1]  # ties keep their input order
+    assert sort_by_time(out) is out
+    assert sort_by_time(arr, assume_sorted=True) is arr
+
+
+def test_filters_return_time_sorted_output():
+    """
+    Test that the event filters return time-sorted events for shuffled input,
+    and that presorted input gives the same result with the presorted flag.
+    """
+    fast = [(5, 5, t, 1) for t in range(0, 1000, 50)]
+    slow = [(6, 6, t + 25, (-1) ** (t // 500)) for t in range(0, 2000, 500)]
+    arr = array_events(fast + slow)
+    shuffled = arr[np.random.default_rng(0).permutation(len(arr))]
+
+    outs = [
+        low_pass_filter(shuffled, min_dt=300, min_count=5),
+        hot_pixel_filter(shuffled, min_duration=800),
+        opposite_polarity_filter(shuffled, spatial_radius=5, time_scale=1e-2),
+    ]
+    for out in outs:
+        assert is_time_sorted(out)
+
+    # sorted input gives the same result with or without the presorted flag
+    window = sort_by_time(arr)
+    for flt, kwargs in [
+        (low_pass_filter, {"min_dt": 300, "min_count": 5}),
+        (hot_pixel_filter, {"min_duration": 800}),
+        (opposite_polarity_filter, {"spatial_radius": 5, "time_scale": 1e-2}),
+    ]:
+        expected = flt(window, **kwargs)
+        np.testing.assert_array_equal(
+            flt(window, assume_sorted=True, **kwargs), expected
+        )
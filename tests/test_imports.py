@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+import pytest
+
+import eventcamprocessing
+
+HEAVY_MODULES = ["matplotlib", "skimage", "scipy", "numba"]
+
+
+def _loaded_after(statement):
+    code = (
+        f"import sys; {statement}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return out.stdout.strip()
+
+
+def test_import_does_not_load_heavy_dependencies():
+    """
+    Test that importing the package (and its core filter module) does not
+    import matplotlib, skimage, scipy or numba.
+    """
+    assert _loaded_after("import eventcamprocessing") == ""
+    assert _loaded_after("import eventcamprocessing.filter_funcs") == ""
+    assert _loaded_after("import eventcamprocessing.particle_tracking") == ""
+
+
+def test_lazy_attributes_resolve():
+    """
+    Test that lazily imported functions and submodules are reachable from the package.
+    """
+    from eventcamprocessing.particle_detection import ev_particlefinder
+
+    assert eventcamprocessing.ev_particlefinder is ev_particlefinder
+    assert eventcamprocessing.windows.__name__ == "eventcamprocessing.windows"
+    assert "run_pipeline" in dir(eventcamprocessing)
+    with pytest.raises(AttributeError):
+        _ = eventcamprocessing.not_a_function
+
+
+def test_plot_last_frame_old_import_path():
+    """
+    Test that plot_last_frame is still importable from particle_tracking.
+    """
+    pytest.importorskip("matplotlib")
+    from eventcamprocessing.particle_tracking import plot_last_frame
+    from eventcamprocessing.plotting import plot_last_frame as moved
+
+    assert plot_last_frame is moved
@@ -0,0 +1,76 @@
+import json
+import logging
+
+import numpy as np
+from conftest import moving_blob_chunks
+
+from eventcamprocessing import instrumentation
+from eventcamprocessing.filter_funcs import accumulate_events, isolated_noise_filter
+from eventcamprocessing.particle_detection import ev_particlefinder
+from eventcamprocessing.particle_tracking import ev_particletracker
+
+
+def _run(chunks):
+    window = []
+    found = []
+    for evs in chunks:
+        with instrumentation.stage("decode") as st:
+            st["events_out"] = len(evs)
+        window = accumulate_events(window, evs, t_accum_us=1000)
+        filtered = isolated_noise_filter(window, spatial_radius=2, min_neighbors=1)
+        found.append(ev_particlefinder(filtered, min_area=4, h=128, w=128))
+    return np.concatenate(found)
+
+
+def test_disabled_instrumentation_records_nothing():
+    """
+    Test that instrumented functions run normally without an active recorder.
+    """
+    assert instrumentation.active_recorder() is None
+    assert len(_run(moving_blob_chunks(n_chunks=3))) > 0
+    assert instrumentation.active_recorder() is None
+
+
+def test_recording_counts_each_stage():
+    """
+    Test that each stage gets one record per chunk with consistent event counts.
+    """
+    chunks = moving_blob_chunks(n_chunks=4)
+    with instrumentation.recording(trace_memory=True) as rec:
+        found = _run(chunks)
+
+    summary = rec.summary()
+    assert summary["decode"]["calls"] == 4
+    assert summary["decode"]["events_out"] == sum(len(c) for c in chunks)
+    assert summary["accumulate_events"]["calls"] == 4
+    noise = summary["isolated_noise_filter"]
+    assert noise["events_out"] <= noise["events_in"]
+    assert noise["peak_alloc"] > 0
+    assert summary["ev_particlefinder"]["particles"] == len(found)
+    assert [r["chunk"] for r in rec.records if r["stage"] == "decode"] == [0, 1, 2, 3]
+    assert instrumentation.active_recorder() is None
+
+
+def test_recording_exports(tmp_path, caplog):
+    """
+    Test the CSV, JSON and logging exports of a recording.
+    """
+    chunks = moving_blob_chunks(n_chunks=4)
+    with instrumentation.recording() as rec:
+        found = _run(chunks)
+        ev_particletracker(found, max_disp=8, time_array=np.array([0, 1000, 2000]))
+
+    rec.to_csv(tmp_path / "summary.csv")
+    rec.to_csv(tmp_path / "records.csv", per_chunk=True)
+    rec.to_json(tmp_path / "timings.json")
+    with caplog.at_level(logging.INFO, logger="eventcamprocessing.instrumentation"):
+        rec.log()
+
+    summary_lines = (tmp_path / "summary.csv").read_text().splitlines()
+    assert summary_lines[0].startswith("stage,calls,total_s")
+    assert len(summary_lines) == 1 + len(rec.summary())
+    records_lines = (tmp_path / "records.csv").read_text().splitlines()
+    assert len(records_lines) == 1 + len(rec.records)
+    data = json.loads((tmp_path / "timings.json").read_text())
+    assert data["summary"]["ev_particletracker"]["tracks"] > 0
+    assert any("ev_particlefinder" in m for m in caplog.messages)
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from eventcamprocessing import kernels
+from eventcamprocessing.filter_funcs import hot_pixel_filter
+from eventcamprocessing.particle_detection import ev_particlefinder3d
+from eventcamprocessing.particle_tracking import ev_particletracker
+from eventcamprocessing.representations import decayed_time_surface, time_surface
+from eventcamprocessing.synthetic import synthetic_events, synthetic_particles
+
+
+@pytest.fixture(scope="module")
+def events():
+    return synthetic_events(30_000, event_rate=2e6, hot_frac=0.05, flicker_frac=0.05)
+
+
+def _hot_pixel_reference(window, min_duration):
+    # per-pixel loop of the original hot_pixel_filter
+    window = window[np.argsort(window["t"], kind="stable")]
+    pixel_ids = window["x"].astype(np.int32) << 16 | window["y"].astype(np.int32)
+    unique_pixel_id, inverse = np.unique(pixel_ids, return_inverse=True)
+    remove_mask = np.zeros(len(unique_pixel_id), dtype=bool)
+    for i in range(len(unique_pixel_id)):
+        idx = np.where(inverse == i)[0]
+        runs = np.split(
+            window["t"][idx], np.where(np.diff(window["p"][idx]) != 0)[0] + 1
+        )
+        remove_mask[i] = any(len(r) >= 2 and r[-1] - r[0] >= min_duration for r in runs)
+    return window[~remove_mask[inverse]]
+
+
+@pytest.mark.parametrize("backend", kernels.BACKENDS)
+def test_hot_pixel_filter_backends_match_reference(events, backend):
+    """
+    Test that every backend of the hot pixel filter matches the per-pixel loop.
+    """
+    window = events[:5000]
+    expected = _hot_pixel_reference(window, min_duration=500)
+    out = hot_pixel_filter(window, min_duration=500, backend=backend)
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_tracker_backends_identical():
+    """
+    Test that the NumPy and Numba tracking kernels produce identical tracks.
+    """
+    particles, time_array = synthetic_particles(n_steps=20, particles_per_step=30)
+    tracks = {
+        backend: ev_particletracker(particles, 8, time_array, backend=backend)
+        for backend in kernels.BACKENDS
+    }
+
+    assert len(tracks["numpy"]) == len(tracks["numba"])
+    for a, b in zip(tracks["numpy"], tracks["numba"], strict=True):
+        assert a["L"] == b["L"]
+        assert a["X"] == b["X"]
+        assert a["T"] == b["T"]
+
+
+def test_link_tracks_nan_cost_ends_track():
+    """
+    Test that a track whose cost is NaN (zero displacement) is not linked by
+    either backend instead of failing.
+    """
+    pos_est = np.array([[1.0, 1.0, 10.0]])
+    delta = np.array([[0.0, 0.0, 5.0]])
+    new = np.array([1.0, 2.0])
+    for backend in kernels.BACKENDS:
+        link = kernels.get_kernel("link_tracks", backend)
+        pairs = link(pos_est, delta, np.array([True]), new, new, new + 9, 8)
+        assert pairs.tolist() == [0]
+
+
+@pytest.mark.parametrize("backend", kernels.BACKENDS)
+def test_time_surface_backends_identical(events, backend):
+    """
+    Test that the per-event surface updates match np.maximum.at for every backend.
+    """
+    shape = (720, 1280)
+    np.testing.assert_array_equal(
+        time_surface(events, shape, backend=backend), time_surface(events, shape)
+    )
+    t_ref = events["t"][-1]
+    np.testing.assert_array_equal(
+        decayed_time_surface(events, shape, t_ref, 1000, backend=backend),
+        decayed_time_surface(events, shape, t_ref, 1000),
+    )
+
+
+def test_union_find_backends_identical():
+    """
+    Test that both union-find backends number the same clusters in the same
+    order.
+    """
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        n = int(rng.integers(1, 200))
+        a, b = rng.integers(0, n, (2, int(rng.integers(0, n))))
+        labels = [
+            kernels.get_kernel("union_find", backend)(n, a, b)
+            for backend in kernels.BACKENDS
+        ]
+        np.testing.assert_array_equal(labels[0], labels[1])
+
+
+@pytest.mark.parametrize("backend", kernels.BACKENDS)
+def test_particlefinder3d_backends_identical(events, backend):
+    """
+    Test that the 3D detector gives the same particles with every backend.
+    """
+    expected = ev_particlefinder3d(events, min_area=5)
+    out = ev_particlefinder3d(events, min_area=5, backend=backend)
+    np.testing.assert_array_equal(out, expected)
+    assert len(out) > 0
+
+
+def test_unknown_backend():
+    """
+    Test that an unknown backend name is rejected.
+    """
+    with pytest.raises(ValueError, match="backend"):
+        kernels.get_kernel("hot_pixels", "cuda")
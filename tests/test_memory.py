@@ -0,0 +1,132 @@
+import dataclasses
+
+import numpy as np
+import pytest
+from conftest import array_events, event_dtype, moving_blob_chunks
+
+from eventcamprocessing import instrumentation
+from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.memory import FRAME_BYTES_PER_PIXEL, plan_memory
+from eventcamprocessing.pipeline import run_pipeline
+from eventcamprocessing.sweep import run_sweep
+
+
+def test_plan_memory_large_budget_uses_full_frames():
+    """
+    Test that a generous budget keeps full sensor frames and all requested workers.
+    """
+    plan = plan_memory(8 * 2**30, event_dtype, h=720, w=1280, n_workers=4)
+
+    assert plan.tile_shape == (720, 1280)
+    assert plan.n_workers == 4
+    assert plan.max_in_flight == 4
+    assert plan.max_window_events > 1_000_000
+    assert plan.stage_bytes["ev_particlefinder"] >= 720 * 1280 * FRAME_BYTES_PER_PIXEL
+
+
+def test_plan_memory_reduces_workers_before_tiling():
+    """
+    Test that a budget that only fits one full frame plans a single worker
+    with untiled frames.
+    """
+    budget = 40 * 2**20
+    plan = plan_memory(budget, event_dtype, h=720, w=1280, n_workers=8)
+
+    assert plan.n_workers == 1
+    assert plan.tile_shape == (720, 1280)
+    assert max(plan.stage_bytes.values()) <= budget
+
+
+def test_plan_memory_small_budget_tiles():
+    """
+    Test that a budget too small for one full frame splits the frame into tiles.
+    """
+    budget = 16 * 2**20
+    plan = plan_memory(budget, event_dtype, h=720, w=1280, n_workers=8)
+
+    assert plan.n_workers == 1
+    assert plan.tile_shape[0] * plan.tile_shape[1] < 720 * 1280
+    assert max(plan.stage_bytes.values()) <= budget
+
+
+def test_plan_memory_rejects_impossible_budget():
+    """
+    Test that a budget too small for a minimal window raises an error.
+    """
+    with pytest.raises(ValueError, match="cannot hold"):
+        plan_memory(1000, event_dtype, min_window_events=10_000)
+
+
+def test_accumulate_events_max_events_keeps_newest():
+    """
+    Test that capping the window size drops the oldest events first.
+    """
+    window = array_events([(1, 1, t, 1) for t in range(0, 10)])
+    chunk = array_events([(2, 2, t, 1) for t in range(10, 15)])
+
+    out = accumulate_events(window, chunk, t_accum_us=1000, max_events=8)
+
+    assert len(out) == 8
+    np.testing.assert_array_equal(out["t"], np.arange(7, 15))
+
+
+def test_run_pipeline_enforces_memory_plan():
+    """
+    Test that the pipeline caps windows at the planned size and that the plan
+    reports peak usage per stage.
+    """
+    plan = plan_memory(
+        40 * 2**20, event_dtype, h=128, w=128, n_workers=1, min_window_events=10
+    )
+    plan = dataclasses.replace(plan, max_window_events=50)
+    chunks = moving_blob_chunks(n_chunks=6)
+
+    with instrumentation.recording(trace_memory=True) as rec:
+        _, _, stats = run_pipeline(
+            chunks, t_accum_us=5000, min_area=4, h=128, w=128, memory_plan=plan
+        )
+
+    accumulated = [r for r in rec.records if r["stage"] == "ev_particlefinder"]
+    assert max(r["events_in"] for r in accumulated) == 50
+    report = plan.report(rec)
+    assert report["ev_particlefinder"]["peak"] > 0
+    assert report["ev_particlefinder"]["estimated"] is not None
+    # the pool holds the planned number of windows, and no more are live
+    assert stats["buffers"]["count"] == plan.n_workers + plan.max_in_flight
+    assert 2 <= stats["buffers"]["peak_in_use"] <= stats["buffers"]["count"]
+
+
+def test_tiled_plan_detects_tile_by_tile():
+    """
+    Test that a plan that splits the frame makes the pipeline and the sweep
+    detect the same particles tile by tile, without a full-frame labeling.
+    """
+    plan = plan_memory(
+        300_000, event_dtype, h=128, w=128, n_workers=1, min_window_events=10
+    )
+    assert plan.detection_tiles(128, 128) == plan.tile_shape != (128, 128)
+    chunks = moving_blob_chunks(n_chunks=6)
+    expected, _, _ = run_pipeline(chunks, t_accum_us=2000, min_area=4, h=128, w=128)
+
+    with instrumentation.recording() as rec:
+        particles, _, _ = run_pipeline(
+            chunks, t_accum_us=2000, min_area=4, h=128, w=128, memory_plan=plan
+        )
+        swept = run_sweep(
+            chunks,
+            2000,
+            {"min_area": 4},
+            h=128,
+            w=128,
+            max_workers=1,
+            memory_plan=plan,
+        )
+    stages = {r["stage"] for r in rec.records}
+    assert "tiled_particlefinder" in stages
+    assert "ev_particlefinder" not in stages
+    assert "tiled_particlefinder" in plan.stage_bytes
+
+    assert len(particles) == len(expected) > 0
+    np.testing.assert_array_equal(particles["area"], expected["area"])
+    np.testing.assert_allclose(particles["x"], expected["x"], rtol=1e-6)
+    np.testing.assert_allclose(swept[0]["particles"]["x"], expected["x"], rtol=1e-6)
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE
+from eventcamprocessing.particle_store import ParticleStore
+from eventcamprocessing.particle_tracking import ev_particletracker
+from eventcamprocessing.synthetic import synthetic_particles
+
+
+def _batches(particles, size=7):
+    return [particles[i : i + size] for i in range(0, len(particles), size)]
+
+
+def test_extend_grows_by_doubling():
+    """
+    Test that extending the store doubles its capacity as needed and keeps the
+    records in order.
+    """
+    particles, _ = synthetic_particles(n_steps=10, particles_per_step=10)
+    store = ParticleStore(capacity=4)
+    capacities = set()
+    for batch in _batches(particles):
+        store.extend(batch)
+        capacities.add(store.capacity)
+    store.extend(particles[:0])
+
+    assert len(store) == len(particles)
+    assert store.capacity < 2 * len(particles)
+    assert len(capacities) <= int(np.log2(len(particles))) + 1
+    np.testing.assert_array_equal(np.asarray(store), particles)
+    assert np.asarray(store).dtype == PARTICLE_DTYPE
+
+
+def test_spill_to_memmap(tmp_path):
+    """
+    Test that records past the spill threshold move to a file and stay intact
+    while the file keeps growing.
+    """
+    particles, _ = synthetic_particles(n_steps=20, particles_per_step=20)
+    path = tmp_path / "particles.bin"
+    store = ParticleStore(
+        capacity=8, spill_bytes=64 * PARTICLE_DTYPE.itemsize, spill_path=path
+    )
+    for batch in _batches(particles):
+        store.extend(batch)
+
+    assert store.spilled
+    assert isinstance(store.array, np.memmap)
+    np.testing.assert_array_equal(store.array, particles)
+    assert os.path.getsize(path) == store.capacity * PARTICLE_DTYPE.itemsize
+
+    with ParticleStore(capacity=8, spill_bytes=0) as temp_store:
+        temp_store.extend(particles)
+        spill_path = temp_store.spill_path
+        assert os.path.exists(spill_path)
+    assert not os.path.exists(spill_path)
+    assert len(temp_store) == 0
+
+
+def test_tracker_accepts_store():
+    """
+    Test that tracking particles held in a store gives the same tracks as
+    tracking the plain array.
+    """
+    particles, time_array = synthetic_particles(n_steps=15, particles_per_step=10)
+    store = ParticleStore(capacity=16)
+    for batch in _batches(particles):
+        store.extend(batch)
+
+    expected = ev_particletracker(particles, 8, time_array)
+    tracks = ev_particletracker(store, 8, time_array)
+    assert len(tracks) == len(expected)
+    for a, b in zip(tracks, expected, strict=True):
+        assert a["X"] == b["X"]
+        assert a["T"] == b["T"]
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from eventcamprocessing import kernels
+from eventcamprocessing.particle_tracking import _link_tracks_strips, ev_particletracker
+from eventcamprocessing.synthetic import synthetic_particles
+
+
+@pytest.mark.parametrize("n_strips", [2, 3, 7])
+def test_strip_tracker_matches_serial(capsys, n_strips):
+    """
+    Test that linking tracks strip by strip gives the serial tracks, also for
+    dense particles with competing and duplicated detections.
+    """
+    particles, time_array = synthetic_particles(
+        n_steps=15, particles_per_step=400, speed=4.0, seed=n_strips
+    )
+    # duplicates tie for the same tracks
+    particles = np.sort(np.concatenate([particles, particles[::7]]), order="t")
+    serial = ev_particletracker(particles, 8, time_array)
+    strips = ev_particletracker(
+        particles, 8, time_array, n_strips=n_strips, max_workers=2
+    )
+    capsys.readouterr()
+
+    assert len(serial) == len(strips)
+    for a, b in zip(serial, strips, strict=True):
+        assert a["L"] == b["L"]
+        assert a["X"] == b["X"]
+        assert a["T"] == b["T"]
+
+
+def test_strip_linking_matches_kernel():
+    """
+    Test that the strip linking returns the kernel's pairs for random
+    estimates, including zero displacements whose costs are NaN.
+    """
+    rng = np.random.default_rng(0)
+    link = kernels.get_kernel("link_tracks", "numpy")
+    for _ in range(20):
+        pos_est = rng.uniform(0, 100, size=(60, 3))
+        delta = rng.integers(-3, 4, size=(60, 3)).astype(np.float64)
+        extended = rng.random(60) < 0.5
+        new_x = np.round(rng.uniform(0, 100, 80))
+        new_y = np.round(rng.uniform(0, 100, 80))
+        new_t = rng.uniform(0, 100, 80)
+        args = (pos_est, delta, extended, new_x, new_y, new_t, 8)
+        expected = link(*args)
+        np.testing.assert_array_equal(_link_tracks_strips(*args, 4, None), expected)
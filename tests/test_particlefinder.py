@@ -1,6 +1,7 @@
 # author = Joanna Van Liew
 
 import sys
+import tracemalloc
 import types
 
 # Create a fake metavision_core package to run tests without having to download the metavision_core package on your own system"""
@@ -20,7 +21,7 @@ sys.modules["metavision_core.event_io"] = event_io
 import numpy as np
 from conftest import array_events
 
-from eventcamprocessing import ev_particlefinder
+from eventcamprocessing import ev_particlefinder, ev_particlefinder3d
 
 
 def test_ev_particlefinder_cluster():
@@ -53,3 +54,62 @@ def test_min_area_particlefinder():
     arr = array_events(events)
     particles = ev_particlefinder(arr, min_area=3, h=128, w=128)
     assert len(particles) == 0
+
+
+def test_particlefinder3d_separates_crossing_particles():
+    """
+    Test that two particles passing the same pixels at different times are
+    one cluster in the 2D frame but two in (x, y, t).
+    """
+    first = [(50 + i % 3, 60 + i // 3, 1000 + i, 1) for i in range(9)]
+    second = [(51 + i % 3, 60 + i // 3, 9000 + i, 1) for i in range(9)]
+    arr = array_events(first + second)
+
+    assert len(ev_particlefinder(arr, min_area=5, h=128, w=128)) == 1
+    particles = ev_particlefinder3d(arr, min_area=5, eps_t=1000, h=128, w=128)
+    assert len(particles) == 2
+    assert particles["area"].tolist() == [9, 9]
+    np.testing.assert_allclose(particles["x"], [51, 52])
+    np.testing.assert_allclose(particles["t"], [1004, 9004])
+
+
+def test_particlefinder3d_matches_frame_labeling():
+    """
+    Test that with one time bin per window the 3D clusters are the 8-connected
+    clusters of ev_particlefinder.
+    """
+    blob = [(10 + i % 4, 10 + i // 4, 100 * i, 1) for i in range(16)]
+    corner = [(14, 14, 50, 1), (15, 15, 60, 1)]  # touches the blob by a corner
+    other = [(40 + i % 3, 40 + i // 3, 30 * i, 1) for i in range(9)]
+    off = [(30, 30, 10, -1)]
+    arr = array_events(blob + corner + other + off)
+
+    frame = ev_particlefinder(arr, min_area=1, h=64, w=64)
+    voxels = ev_particlefinder3d(arr, min_area=1, eps_t=10_000, h=64, w=64)
+    assert sorted(voxels["area"].tolist()) == sorted(frame["area"].tolist())
+    assert len(ev_particlefinder3d(arr[:0], min_area=1, h=64, w=64)) == 0
+
+
+def test_particlefinder3d_grids_cover_only_the_events():
+    """
+    Test that the voxel grids are sized to the events' bounding box, so
+    labeling a few events on a huge sensor allocates no sensor-sized grid
+    and finds the same clusters as near the origin of a small sensor.
+    """
+    blob = [(i % 3, i // 3, 100 * i, 1) for i in range(9)]
+    pair = [(5, 0, 0, 1), (6, 1, 10, 1)]
+    arr = array_events(blob + pair)
+    expected = ev_particlefinder3d(arr, min_area=2, h=16, w=16)
+    far = arr.copy()
+    far["x"] += 70_000
+    far["y"] += 90_000
+
+    tracemalloc.start()
+    particles = ev_particlefinder3d(far, min_area=2, h=100_000, w=100_000)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < 2**20
+    assert particles["area"].tolist() == expected["area"].tolist() == [9, 2]
+    np.testing.assert_allclose(particles["x"], expected["x"] + 70_000)
+    np.testing.assert_allclose(particles["y"], expected["y"] + 90_000)
@@ -0,0 +1,78 @@
+from functools import partial
+
+import numpy as np
+import pytest
+from conftest import moving_blob_chunks
+
+from eventcamprocessing.filter_funcs import accumulate_events, isolated_noise_filter
+from eventcamprocessing.particle_detection import ev_particlefinder
+from eventcamprocessing.particle_tracking import ev_particletracker
+from eventcamprocessing.pipeline import run_pipeline
+
+
+def _serial(chunks, filters, t_accum_us, min_area):
+    window = []
+    found = []
+    for evs in chunks:
+        window = accumulate_events(window=window, new_chunk=evs, t_accum_us=t_accum_us)
+        filtered = window
+        for f in filters:
+            filtered = f(filtered)
+        found.append(ev_particlefinder(filtered, min_area=min_area, h=128, w=128))
+    return np.concatenate(found)
+
+
+def test_run_pipeline_matches_serial_loop():
+    """
+    Test that the threaded pipeline produces exactly the particles of the serial loop.
+    """
+    chunks = moving_blob_chunks(n_chunks=12)
+    filters = [partial(isolated_noise_filter, spatial_radius=2, time_window=1000)]
+
+    expected = _serial(chunks, filters, t_accum_us=2000, min_area=4)
+    particles, track_info, stats = run_pipeline(
+        chunks, t_accum_us=2000, min_area=4, filters=filters, h=128, w=128, queue_size=2
+    )
+
+    assert track_info is None
+    assert len(particles) == len(expected)
+    for name in expected.dtype.names:
+        np.testing.assert_array_equal(particles[name], expected[name])
+    assert stats["reader"]["items"] == len(chunks)
+    assert stats["finder"]["items"] == len(chunks)
+    assert 0.0 <= stats["filter"]["utilization"] <= 1.0
+
+
+@pytest.mark.parametrize("t_accum_us", [1000, 2000])
+def test_run_pipeline_tracks_particles(capsys, t_accum_us):
+    """
+    Test that tracking while the stream is read, when max_disp and dt are
+    given, gives the tracks of ev_particletracker on the collected particles.
+    """
+    chunks = moving_blob_chunks(n_chunks=8)
+    particles, track_info, _ = run_pipeline(
+        chunks, t_accum_us=t_accum_us, min_area=4, max_disp=8, dt=1000, h=128, w=128
+    )
+    t_start, t_end = chunks[0]["t"][0], chunks[-1]["t"][-1]
+    time_array = np.arange(t_start, t_end + 1000, 1000)
+    expected = ev_particletracker(particles, 8, time_array)
+    capsys.readouterr()
+
+    assert len(particles) > 0
+    assert len(track_info) > 0
+    assert track_info == expected
+
+
+def test_run_pipeline_propagates_errors():
+    """
+    Test that an exception raised in a stage is re-raised by run_pipeline.
+    """
+
+    def broken(window):
+        raise ValueError("bad filter")
+
+    chunks = moving_blob_chunks(n_chunks=20)
+    with pytest.raises(ValueError, match="bad filter"):
+        run_pipeline(
+            chunks, t_accum_us=2000, min_area=4, filters=[broken], h=128, w=128
+        )
@@ -0,0 +1,118 @@
+from functools import partial
+
+import numpy as np
+import pytest
+from conftest import moving_blob_chunks
+
+from eventcamprocessing.batch import read_chunks
+from eventcamprocessing.filter_funcs import isolated_noise_filter
+from eventcamprocessing.particle_tracking import ev_particletracker
+from eventcamprocessing.pipeline import run_pipeline
+from eventcamprocessing.recording import run_recording
+from eventcamprocessing.storage import read_particles, read_tracks, tracks_to_records
+
+FILTERS = [partial(isolated_noise_filter, spatial_radius=2, time_window=1000)]
+KWARGS = dict(t_accum_us=2000, min_area=4, dt=1000, max_disp=8, h=128, w=128)
+
+
+class Crash(Exception):
+    pass
+
+
+def _crashing(chunks, n):
+    yield from chunks[:n]
+    raise Crash
+
+
+def test_run_recording_matches_offline_tracking():
+    """
+    Test that tracking while reading gives the tracks of ev_particletracker.
+    """
+    chunks = moving_blob_chunks(n_chunks=15)
+    expected_particles, expected_tracks, _ = run_pipeline(
+        chunks, filters=FILTERS, queue_size=2, **KWARGS
+    )
+
+    particles, tracks = run_recording(chunks, filters=FILTERS, **KWARGS)
+
+    np.testing.assert_array_equal(particles, expected_particles)
+    assert len(tracks) > 0
+    assert tracks == expected_tracks
+
+
+@pytest.mark.parametrize("to_files", [False, True])
+def test_resume_after_crash_is_identical(tmp_path, to_files):
+    """
+    Test that a run resumed from its checkpoint matches an uninterrupted run.
+    """
+    chunks = moving_blob_chunks(n_chunks=15)
+    particles, tracks = run_recording(chunks, filters=FILTERS, **KWARGS)
+
+    paths = {}
+    if to_files:
+        paths = dict(
+            particles_path=tmp_path / "particles.npz",
+            tracks_path=tmp_path / "tracks.npz",
+        )
+    checkpoint = tmp_path / "run.ckpt.npz"
+    kwargs = dict(
+        filters=FILTERS,
+        checkpoint_path=checkpoint,
+        checkpoint_every_s=0,
+        **paths,
+        **KWARGS,
+    )
+    with pytest.raises(Crash):
+        run_recording(_crashing(chunks, 9), **kwargs)
+    assert checkpoint.exists()
+
+    resumed_particles, resumed_tracks = run_recording(chunks, **kwargs)
+    assert not checkpoint.exists()
+    if to_files:
+        resumed_particles = read_particles(paths["particles_path"])
+        points = read_tracks(paths["tracks_path"])
+        resumed_tracks = points[np.argsort(points["track_id"], kind="stable")]
+        tracks = tracks_to_records(tracks)
+        assert not list(tmp_path.glob("*.part*"))
+    np.testing.assert_array_equal(resumed_particles, particles)
+    if to_files:
+        np.testing.assert_array_equal(resumed_tracks, tracks)
+    else:
+        assert resumed_tracks == tracks
+
+
+def test_resume_restarts_reader_at_checkpoint(tmp_path):
+    """
+    Test that a resumed run restarts a chunk source factory at the saved
+    reader position instead of decoding the processed chunks again.
+    """
+    chunks = moving_blob_chunks(n_chunks=15)
+    path = tmp_path / "rec.npy"
+    np.save(path, np.concatenate(chunks))
+    particles, tracks = run_recording(chunks, filters=FILTERS, **KWARGS)
+
+    starts, n_read = [], []
+
+    def source(start_ts, crash_after=None):
+        starts.append(start_ts)
+        n_read.append(0)
+        for evs in read_chunks(path, KWARGS["dt"], start_ts):
+            if n_read[-1] == crash_after:
+                raise Crash
+            n_read[-1] += 1
+            yield evs
+
+    kwargs = dict(
+        filters=FILTERS,
+        checkpoint_path=tmp_path / "run.ckpt.npz",
+        checkpoint_every_s=0,
+        **KWARGS,
+    )
+    with pytest.raises(Crash):
+        run_recording(partial(source, crash_after=9), **kwargs)
+    resumed_particles, resumed_tracks = run_recording(source, **kwargs)
+
+    assert starts == [0, 9 * KWARGS["dt"]]
+    assert n_read == [9, 6]
+    np.testing.assert_array_equal(resumed_particles, particles)
+    assert resumed_tracks == tracks
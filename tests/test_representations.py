@@ -0,0 +1,108 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+from conftest import array_events
+
+from eventcamprocessing.representations import (
+    decayed_time_surface,
+    event_counts,
+    polarity_counts,
+    time_surface,
+    voxel_grid,
+)
+
+SHAPE = (4, 5)
+EVENTS = [(1, 2, 30, 1), (1, 2, 10, -1), (1, 2, 20, 1), (4, 0, 5, -1), (0, 3, 40, 1)]
+
+
+def _loop_counts(evs, shape):
+    img = np.zeros(shape, dtype=np.int32)
+    for ev in evs:
+        img[ev["y"], ev["x"]] += 1
+    return img
+
+
+def test_event_counts_matches_loop():
+    """
+    Test that bincount rendering gives the same image as a per-event loop.
+    """
+    rng = np.random.default_rng(0)
+    evs = array_events([(rng.integers(5), rng.integers(4), t, 1) for t in range(200)])
+    np.testing.assert_array_equal(event_counts(evs, SHAPE), _loop_counts(evs, SHAPE))
+
+
+def test_polarity_counts_splits_on_and_off():
+    """
+    Test that ON and OFF events are counted in separate frames.
+    """
+    img = polarity_counts(array_events(EVENTS), SHAPE)
+
+    assert img.shape == (2, 4, 5)
+    assert img[0, 2, 1] == 2
+    assert img[1, 2, 1] == 1
+    assert img[1, 0, 4] == 1
+    assert img.sum() == len(EVENTS)
+
+
+def test_time_surfaces():
+    """
+    Test the latest-timestamp surface and its exponential decay.
+    """
+    evs = array_events(EVENTS)
+    surface = time_surface(evs, SHAPE, fill=-1)
+    assert surface[2, 1] == 30
+    assert surface[3, 0] == 40
+    assert surface[0, 0] == -1
+
+    decayed = decayed_time_surface(evs, SHAPE, t_ref=40, tau=10)
+    assert decayed[3, 0] == pytest.approx(1.0)
+    assert decayed[2, 1] == pytest.approx(np.exp(-1))
+    assert decayed[0, 0] == 0
+
+
+def test_voxel_grid_bins_in_time():
+    """
+    Test that the voxel grid sums signed polarity into the right time bin.
+    """
+    grid = voxel_grid(array_events(EVENTS), SHAPE, n_bins=2, t_range=(0, 40))
+
+    assert grid.shape == (2, 4, 5)
+    assert grid[0, 2, 1] == -1  # t=10 OFF in bin 0, t=20 and t=30 ON in bin 1
+    assert grid[1, 2, 1] == 2
+    assert grid[1, 3, 0] == 1  # t=40 falls in the last bin
+
+
+def test_out_buffer_is_reused():
+    """
+    Test that rendering into an output buffer overwrites and returns it.
+    """
+    out = np.full(SHAPE, 7, dtype=np.int32)
+    img = event_counts(array_events(EVENTS), SHAPE, out=out)
+
+    assert img is out
+    assert out.sum() == len(EVENTS)
+    with pytest.raises(ValueError, match="shape"):
+        event_counts(array_events(EVENTS), SHAPE, out=np.zeros((5, 4), np.int32))
+
+
+def test_rendering_into_out_allocates_no_frame():
+    """
+    Test that rendering into output buffers accumulates in place, without a
+    temporary array of the frame's size.
+    """
+    shape = (720, 1280)
+    evs = array_events([(x, 2 * x, 10 * x, 1 - 2 * (x % 2)) for x in range(100)])
+    renders = [
+        (event_counts, np.zeros(shape, np.int32), {}),
+        (polarity_counts, np.zeros((2, *shape), np.int32), {}),
+        (voxel_grid, np.zeros((5, *shape), np.int32), {"n_bins": 5}),
+    ]
+    for render, out, kwargs in renders:
+        render(evs, shape, out=out, **kwargs)  # warm up
+        tracemalloc.start()
+        render(evs, shape, out=out, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert peak < shape[0] * shape[1] // 10
+        assert out.sum() == (len(evs) if render is not voxel_grid else 0)
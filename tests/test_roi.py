@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from conftest import array_events, moving_blob_chunks
+
+from eventcamprocessing.particle_detection import (
+    ev_particlefinder,
+    ev_particlefinder3d,
+)
+from eventcamprocessing.pipeline import run_pipeline
+from eventcamprocessing.roi import ROI
+
+
+def test_roi_selects_shifts_and_bins():
+    """
+    Test that only events inside the rectangle are kept, in ROI pixels.
+    """
+    evs = array_events([(5, 5, 0, 1), (10, 20, 1, 1), (13, 21, 2, -1), (40, 20, 3, 1)])
+    roi = ROI(x0=10, y0=20, x1=30, y1=30, binning=2)
+
+    out = roi.apply(evs)
+    assert roi.shape == (5, 10)
+    assert out["t"].tolist() == [1, 2]
+    assert out["x"].tolist() == [0, 1]
+    assert out["y"].tolist() == [0, 0]
+    assert evs["x"].tolist() == [5, 10, 13, 40]  # input is not modified
+
+    every_other = ROI(x0=0, y0=0, x1=64, y1=64, event_stride=2).apply(evs)
+    assert every_other["t"].tolist() == [0, 2]
+
+
+def test_roi_from_mask():
+    """
+    Test that an ROI built from a mask is the bounding box of the mask, and
+    that an empty mask is rejected.
+    """
+    mask = np.zeros((32, 32), dtype=bool)
+    mask[10:12, 4:8] = True
+    mask[11, 4] = False
+    roi = ROI.from_mask(mask)
+    assert (roi.x0, roi.y0, roi.x1, roi.y1) == (4, 10, 8, 12)
+
+    evs = array_events([(4, 10, 0, 1), (4, 11, 1, 1), (7, 11, 2, 1), (9, 11, 3, 1)])
+    assert roi.apply(evs)["t"].tolist() == [0, 2]
+
+    with pytest.raises(ValueError, match="empty"):
+        ROI.from_mask(np.zeros((4, 4), dtype=bool))
+
+
+def test_particlefinders_with_roi_return_sensor_coordinates():
+    """
+    Test that detecting on ROI events with a frame of roi.shape finds the
+    same particles as the full sensor frame.
+    """
+    window = np.concatenate(moving_blob_chunks(n_chunks=2))
+    roi = ROI(x0=8, y0=16, x1=40, y1=60)
+
+    for finder in (ev_particlefinder, ev_particlefinder3d):
+        full = finder(window, min_area=4, h=128, w=128)
+        reduced = finder(roi.apply(window), min_area=4, roi=roi)
+        np.testing.assert_allclose(reduced["x"], full["x"])
+        np.testing.assert_allclose(reduced["y"], full["y"])
+        np.testing.assert_array_equal(reduced["area"], full["area"])
+
+
+def test_run_pipeline_with_roi():
+    """
+    Test that running the pipeline on an ROI finds the particles of the full
+    sensor run that lie inside it.
+    """
+    chunks = moving_blob_chunks(n_chunks=6)
+    full, _, _ = run_pipeline(chunks, t_accum_us=2000, min_area=4, h=128, w=128)
+    # keep only the first blob
+    roi = ROI(x0=0, y0=0, x1=64, y1=40)
+    reduced, _, _ = run_pipeline(chunks, t_accum_us=2000, min_area=4, roi=roi)
+
+    first = full[full["y"] < 40]
+    assert len(reduced) == len(first) > 0
+    np.testing.assert_allclose(reduced["x"], first["x"])
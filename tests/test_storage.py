@@ -0,0 +1,130 @@
+import zipfile
+from importlib.util import find_spec
+
+import numpy as np
+import pytest
+
+from eventcamprocessing.particle_detection import PARTICLE_DTYPE
+from eventcamprocessing.storage import (
+    ParticleWriter,
+    TrackWriter,
+    read_particles,
+    read_tracks,
+    tracks_to_records,
+)
+from eventcamprocessing.synthetic import synthetic_particles
+
+SUFFIXES = [
+    ".npz",
+    pytest.param(
+        ".parquet",
+        marks=pytest.mark.skipif(not find_spec("pyarrow"), reason="needs pyarrow"),
+    ),
+    pytest.param(
+        ".h5", marks=pytest.mark.skipif(not find_spec("h5py"), reason="needs h5py")
+    ),
+]
+
+
+@pytest.fixture
+def particles():
+    return synthetic_particles(n_steps=30, particles_per_step=20)[0]
+
+
+@pytest.mark.parametrize("suffix", SUFFIXES)
+def test_particles_round_trip(tmp_path, particles, suffix):
+    """
+    Test that particles written in batches are read back whole and by time range.
+    """
+    path = tmp_path / f"particles{suffix}"
+    with ParticleWriter(path, row_group_size=64) as writer:
+        for i in range(0, len(particles), 25):
+            writer.write(particles[i : i + 25])
+    assert writer.n_groups == -(-len(particles) // 64)
+
+    np.testing.assert_array_equal(read_particles(path), particles)
+    t_range = (particles["t"][100], particles["t"][300])
+    selected = read_particles(path, t_range=t_range)
+    mask = (particles["t"] >= t_range[0]) & (particles["t"] < t_range[1])
+    np.testing.assert_array_equal(selected, particles[mask])
+    assert read_particles(path, t_range=(-2, -1)).dtype == PARTICLE_DTYPE
+
+
+@pytest.mark.parametrize("suffix", SUFFIXES)
+def test_tracks_round_trip(tmp_path, suffix):
+    """
+    Test that tracks written in batches read back with consecutive track ids,
+    filtered by time range and track ids.
+    """
+    tracks = [
+        {"L": 3, "X": [1.0, 2.0, 3.0], "Y": [0.0, 0.0, 1.0], "T": [10.0, 20.0, 30.0]},
+        {"L": 1, "X": [5.0], "Y": [5.0], "T": [20.0]},
+        {"L": 2, "X": [7.0, 8.0], "Y": [1.0, 2.0], "T": [40.0, 50.0]},
+    ]
+    path = tmp_path / f"tracks{suffix}"
+    with TrackWriter(path, row_group_size=2) as writer:
+        assert writer.write_tracks(tracks[:2]).tolist() == [0, 1]
+        assert writer.write_tracks(tracks[2:]).tolist() == [2]
+
+    points = read_tracks(path)
+    np.testing.assert_array_equal(points, tracks_to_records(tracks))
+    assert points["track_id"].tolist() == [0, 0, 0, 1, 2, 2]
+    assert read_tracks(path, track_ids=(1, 3))["x"].tolist() == [5.0, 7.0, 8.0]
+    assert read_tracks(path, t_range=(20, 40), track_ids=(0, 1))["t"].tolist() == [
+        20.0,
+        30.0,
+    ]
+
+
+def test_npz_reader_skips_row_groups(tmp_path, particles):
+    """
+    Test that a range read only loads the row groups overlapping the range.
+    """
+    path = tmp_path / "particles.npz"
+    with ParticleWriter(path, row_group_size=100) as writer:
+        writer.write(particles)
+
+    loaded = []
+    original = np.lib.npyio.NpzFile.__getitem__
+
+    def spy(self, key):
+        loaded.append(key)
+        return original(self, key)
+
+    np.lib.npyio.NpzFile.__getitem__ = spy
+    try:
+        read_particles(path, t_range=(particles["t"][0], particles["t"][50]))
+    finally:
+        np.lib.npyio.NpzFile.__getitem__ = original
+    assert loaded == ["index", "group_000000"]
+
+    # files of interrupted runs have no index and are read whole
+    with zipfile.ZipFile(path) as zf:
+        names = [n for n in zf.namelist() if n != "index.npy"]
+        with zipfile.ZipFile(tmp_path / "partial.npz", "w") as out:
+            for name in names:
+                out.writestr(name, zf.read(name))
+    np.testing.assert_array_equal(read_particles(tmp_path / "partial.npz"), particles)
+
+
+@pytest.mark.parametrize("suffix", SUFFIXES)
+def test_writer_resumes_from_checkpoint(tmp_path, particles, suffix):
+    """
+    Test that rows written after the last checkpoint are replaced on resume.
+    """
+    path = tmp_path / f"particles{suffix}"
+    writer = ParticleWriter(path, row_group_size=64, checkpointing=True)
+    writer.write(particles[:150])
+    state = writer.checkpoint()
+    writer.write(particles[150:400])  # lost in a crash
+    writer.flush()
+
+    with ParticleWriter(path, row_group_size=64, resume=state) as writer:
+        writer.write(particles[150:])
+    np.testing.assert_array_equal(read_particles(path), particles)
+    t_range = (particles["t"][100], particles["t"][300])
+    mask = (particles["t"] >= t_range[0]) & (particles["t"] < t_range[1])
+    np.testing.assert_array_equal(
+        read_particles(path, t_range=t_range), particles[mask]
+    )
+    assert list(tmp_path.iterdir()) == [path]
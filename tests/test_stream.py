@@ -0,0 +1,209 @@
+import multiprocessing
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+from conftest import moving_blob_chunks
+
+from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.particle_detection import ev_particlefinder
+from eventcamprocessing.stream import EventRing, RingConsumer, live_detection, replay
+
+
+def _assert_chunks_equal(got, expected):
+    assert len(got) == len(expected)
+    for a, b in zip(got, expected, strict=True):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_consumers_read_every_chunk():
+    """
+    Test that each consumer reads every chunk in order, also when the chunks
+    wrap around the end of the ring.
+    """
+    chunks = moving_blob_chunks(n_chunks=12)
+    with EventRing(capacity=2 * len(chunks[0]) + 7, n_slots=4) as ring:
+        consumers = [RingConsumer(ring.name, slot) for slot in range(2)]
+        got = [[], []]
+        for evs in chunks:
+            ring.write(evs)
+            for c, out in zip(consumers, got, strict=True):
+                out.append(c.read())
+        ring.close()
+        for c in consumers:
+            assert c.read() is None
+            assert c.dropped == 0
+            c.close()
+    for out in got:
+        _assert_chunks_equal(out, chunks)
+
+
+def test_slow_consumer_drops_oldest_chunks():
+    """
+    Test that a consumer overrun by the producer loses the oldest chunks and
+    reads the newest ones intact.
+    """
+    chunks = moving_blob_chunks(n_chunks=10)
+    with EventRing(capacity=3 * len(chunks[0]), n_slots=16) as ring:
+        with RingConsumer(ring.name) as consumer:
+            for evs in chunks:
+                ring.write(evs)
+            ring.close()
+            got = list(consumer)
+            assert ring.consumers()[0]["dropped"] == consumer.dropped
+    assert consumer.dropped > 0
+    assert len(got) + consumer.dropped == len(chunks)
+    _assert_chunks_equal(got, chunks[-len(got) :])
+
+
+def test_consumer_slot_in_use():
+    """Test that two consumers cannot share a slot."""
+    with EventRing(capacity=16) as ring:
+        with RingConsumer(ring.name, slot=1), pytest.raises(ValueError, match="in use"):
+            RingConsumer(ring.name, slot=1)
+
+
+def test_independent_consumer_leaves_ring():
+    """
+    Test that a consumer in an independent process reads from the ring and,
+    when it exits, leaves the ring to the producer and the other consumers.
+    """
+    chunks = moving_blob_chunks(n_chunks=2)
+    code = (
+        "import sys\n"
+        "from eventcamprocessing.stream import RingConsumer\n"
+        "consumer = RingConsumer(sys.argv[1], slot=0, timeout=30)\n"
+        "print(len(consumer.read()))\n"
+        "consumer.close()\n"
+    )
+    with EventRing(capacity=1024) as ring:
+        proc = subprocess.Popen(
+            [sys.executable, "-c", code, ring.name],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        while not ring.consumers():
+            assert proc.poll() is None
+        ring.write(chunks[0])
+        out, err = proc.communicate(timeout=30)
+        assert proc.returncode == 0, err
+        assert int(out) == len(chunks[0])
+        assert "leaked" not in err
+
+        with RingConsumer(ring.name, slot=1) as consumer:
+            ring.write(chunks[1])
+            np.testing.assert_array_equal(consumer.read(), chunks[1])
+
+
+def test_blocking_write_skips_exited_consumers():
+    """
+    Test that a blocking producer stops waiting for a consumer whose process
+    was killed without closing, and that its slot can be claimed again.
+    """
+    chunks = moving_blob_chunks(n_chunks=6)
+    code = (
+        "import sys, time\n"
+        "from eventcamprocessing.stream import RingConsumer\n"
+        "consumer = RingConsumer(sys.argv[1], slot=0)\n"
+        "print('attached', flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    with EventRing(capacity=2 * len(chunks[0]), block=True, timeout=30) as ring:
+        proc = subprocess.Popen(
+            [sys.executable, "-c", code, ring.name], stdout=subprocess.PIPE, text=True
+        )
+        assert proc.stdout.readline() == "attached\n"
+        with pytest.raises(ValueError, match="in use"):
+            RingConsumer(ring.name, slot=0)
+        proc.kill()
+        proc.communicate()
+
+        for evs in chunks:
+            ring.write(evs)
+        assert ring.consumers() == {}
+        with RingConsumer(ring.name, slot=0) as consumer:
+            ring.write(chunks[0])
+            np.testing.assert_array_equal(consumer.read(), chunks[0])
+
+
+def test_blocking_write_times_out():
+    """
+    Test that a blocking write raises TimeoutError when a live consumer does
+    not make room in time.
+    """
+    chunks = moving_blob_chunks(n_chunks=3)
+    with EventRing(capacity=2 * len(chunks[0]), block=True, timeout=0.05) as ring:
+        with RingConsumer(ring.name):
+            ring.write(chunks[0])
+            ring.write(chunks[1])
+            with pytest.raises(TimeoutError, match="room"):
+                ring.write(chunks[2])
+
+
+def _detect(name, queue):
+    with RingConsumer(name, slot=0, timeout=30) as consumer:
+        particles, stats = live_detection(consumer, t_accum_us=2000, min_area=4)
+    queue.put((particles, stats))
+
+
+def test_live_detection_in_other_process(capsys):
+    """
+    Test that a consumer process detects the same particles as the serial
+    loop while a blocking producer replays the chunks, and reports the
+    latency of every chunk.
+    """
+    chunks = moving_blob_chunks(n_chunks=20)
+    window = []
+    expected = []
+    for evs in chunks:
+        window = accumulate_events(window, evs, 2000)
+        expected.append(ev_particlefinder(evs=window, min_area=4))
+    expected = np.concatenate(expected)
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    # a small ring, so the producer has to wait for the consumer
+    with EventRing(capacity=2 * len(chunks[0]), n_slots=2, block=True) as ring:
+        proc = ctx.Process(target=_detect, args=(ring.name, queue))
+        proc.start()
+        stats = replay(chunks, ring, speed=None, n_consumers=1)
+        particles, live_stats = queue.get(timeout=30)
+        proc.join(timeout=30)
+    capsys.readouterr()
+
+    assert stats["chunks"] == len(chunks)
+    np.testing.assert_array_equal(particles, expected)
+    assert live_stats["chunks"] == len(chunks)
+    assert live_stats["dropped"] == 0
+    assert np.all(live_stats["latency_s"] >= 0)
+
+
+def test_replay_paces_chunks():
+    """
+    Test that replay publishes chunks no earlier than their timestamps allow
+    at the requested speed.
+    """
+    chunks = moving_blob_chunks(n_chunks=10, dt=20000)
+    span_s = (chunks[-1]["t"][-1] - chunks[0]["t"][0]) / 1e6
+    sent = []
+    with EventRing(capacity=1024) as ring:
+        consumer = RingConsumer(ring.name)
+
+        def read():
+            for _ in consumer:
+                sent.append(consumer.last_sent_ns)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        stats = replay(chunks, ring, speed=4.0)
+        reader.join()
+        consumer.close()
+
+    assert stats["wall_s"] >= span_s / 4.0
+    assert len(sent) == len(chunks)
+    assert (sent[-1] - sent[0]) / 1e9 >= (
+        chunks[-1]["t"][-1] - chunks[0]["t"][-1]
+    ) / 1e6 / 4.0 - 1e-3
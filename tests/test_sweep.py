@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from conftest import moving_blob_chunks
+
+from eventcamprocessing.filter_funcs import accumulate_events, isolated_noise_filter
+from eventcamprocessing.particle_detection import ev_particlefinder
+from eventcamprocessing.sweep import expand_grid, run_sweep
+
+
+def test_expand_grid_rejects_unknown_parameter():
+    """
+    Test that a typo in the parameter grid is reported instead of silently ignored.
+    """
+    with pytest.raises(ValueError, match="min_areaa"):
+        expand_grid({"min_areaa": [1, 2]})
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_run_sweep_matches_individual_runs(max_workers):
+    """
+    Test that every config of a sweep gives the same particles as running the
+    filter and finder with that config directly.
+    """
+    chunks = moving_blob_chunks(n_chunks=6)
+    grid = {"spatial_radius": [2], "min_neighbors": [1, 20], "min_area": [4, 10]}
+    results = run_sweep(
+        chunks, t_accum_us=1000, param_grid=grid, h=128, w=128, max_workers=max_workers
+    )
+
+    assert len(results) == 4
+    for res in results:
+        cfg = res["params"]
+        window = []
+        expected = []
+        for evs in chunks:
+            window = accumulate_events(window, evs, t_accum_us=1000)
+            filtered = isolated_noise_filter(
+                window,
+                spatial_radius=cfg["spatial_radius"],
+                time_window=cfg["time_window"],
+                min_neighbors=cfg["min_neighbors"],
+            )
+            expected.append(
+                ev_particlefinder(filtered, min_area=cfg["min_area"], h=128, w=128)
+            )
+        expected = np.concatenate(expected)
+        np.testing.assert_array_equal(res["particles"], expected)
+        assert res["track_info"] is None
+
+
+def test_run_sweep_writes_tables(tmp_path):
+    """
+    Test that a sweep with tracking writes the config index and per-config tables.
+    """
+    chunks = moving_blob_chunks(n_chunks=6)
+    grid = {"min_area": 4, "max_disp": [4, 8]}
+    results = run_sweep(
+        chunks,
+        t_accum_us=1000,
+        param_grid=grid,
+        dt=1000,
+        h=128,
+        w=128,
+        max_workers=1,
+        out_dir=tmp_path,
+    )
+
+    assert all(res["track_info"] is not None for res in results)
+    assert (tmp_path / "configs.csv").read_text().count("\n") == 3
+    tracks = (tmp_path / "config_1" / "tracks.csv").read_text().splitlines()
+    assert tracks[0] == "track_id,x,y,t"
+    assert len(tracks) - 1 == sum(t["L"] for t in results[1]["track_info"])
@@ -0,0 +1,43 @@
+import numpy as np
+
+from eventcamprocessing.synthetic import synthetic_events, synthetic_particles
+
+
+def test_synthetic_events_rate_and_order():
+    """
+    Test that the generator returns the requested number of time-ordered events
+    on the sensor, spanning n_events / event_rate seconds.
+    """
+    evs = synthetic_events(50_000, event_rate=5e6, h=720, w=1280, t0=100)
+
+    assert len(evs) == 50_000
+    assert np.all(np.diff(evs["t"]) >= 0)
+    assert evs["t"][0] >= 100
+    assert evs["t"][-1] < 100 + 10_000
+    assert evs["x"].min() >= 0
+    assert evs["x"].max() < 1280
+    assert evs["y"].max() < 720
+    assert set(np.unique(evs["p"])) == {-1, 1}
+
+
+def test_synthetic_events_hot_and_flicker_pixels():
+    """
+    Test that hot-pixel and flicker events make a few pixels much busier than the rest.
+    """
+    evs = synthetic_events(20_000, noise_frac=0.5, hot_frac=0.1, flicker_frac=0.1)
+    pixel_id = evs["x"].astype(np.int64) * 720 + evs["y"]
+    counts = np.sort(np.bincount(pixel_id))[::-1]
+
+    assert counts[:16].sum() >= 0.2 * len(evs)
+
+
+def test_synthetic_particles_time_array():
+    """
+    Test that every synthetic detection falls inside one tracker timestep.
+    """
+    particles, time_array = synthetic_particles(n_steps=5, particles_per_step=10)
+
+    assert len(particles) == 50
+    assert len(time_array) == 6
+    counts, _ = np.histogram(particles["t"], bins=time_array)
+    assert np.all(counts == 10)
@@ -0,0 +1,63 @@
+from functools import partial
+
+import numpy as np
+import pytest
+
+from eventcamprocessing.filter_funcs import (
+    hot_pixel_filter,
+    isolated_noise_filter,
+    opposite_polarity_filter,
+)
+from eventcamprocessing.particle_detection import ev_particlefinder
+from eventcamprocessing.synthetic import synthetic_events
+from eventcamprocessing.tiling import tile_bounds, tiled_filter, tiled_particlefinder
+
+
+@pytest.fixture(scope="module")
+def events():
+    return synthetic_events(
+        20_000, event_rate=2e6, h=200, w=300, n_particles=30, particle_radius=8
+    )
+
+
+def test_tile_bounds_cover_sensor():
+    """
+    Test that the tiles cover the sensor exactly once, with smaller tiles at
+    the borders.
+    """
+    tiles = tile_bounds(100, 250, (64, 64))
+    assert len(tiles) == 2 * 4
+    assert tiles[-1] == (64, 100, 192, 250)
+    assert sum((y1 - y0) * (x1 - x0) for y0, y1, x0, x1 in tiles) == 100 * 250
+
+
+@pytest.mark.parametrize(
+    ("filter_fn", "halo"),
+    [
+        (partial(isolated_noise_filter, spatial_radius=5, time_window=500), 5),
+        (partial(opposite_polarity_filter, spatial_radius=4, time_scale=1e-2), 4),
+        (partial(hot_pixel_filter, min_duration=500), 0),
+    ],
+)
+def test_tiled_filter_matches_full_sensor(events, filter_fn, halo):
+    """
+    Test that filtering tiles with a halo keeps exactly the events of the
+    full-sensor run.
+    """
+    expected = filter_fn(events)
+    out = tiled_filter(events, filter_fn, halo, (64, 64), h=200, w=300)
+    np.testing.assert_array_equal(out, expected)
+
+
+@pytest.mark.parametrize("tile_shape", [(64, 64), (37, 50), (200, 300)])
+def test_tiled_particlefinder_matches_full_frame(events, tile_shape):
+    """
+    Test that clusters stitched across tile borders are the full-frame clusters.
+    """
+    expected = ev_particlefinder(events, min_area=3, h=200, w=300)
+    out = tiled_particlefinder(events, 3, tile_shape, h=200, w=300, max_workers=4)
+
+    assert len(out) == len(expected) > 0
+    np.testing.assert_array_equal(out["area"], expected["area"])
+    for name in ("x", "y", "t"):
+        np.testing.assert_allclose(out[name], expected[name], rtol=1e-6)
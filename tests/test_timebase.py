@@ -0,0 +1,49 @@
+import numpy as np
+from conftest import array_events, moving_blob_chunks
+
+from eventcamprocessing.particle_detection import ev_particlefinder
+from eventcamprocessing.tiling import tiled_particlefinder
+from eventcamprocessing.timebase import decode_times, encode_times, time_offsets
+
+T0 = 10**10 + 123
+
+
+def test_encode_round_trip():
+    """
+    Test that encoding stores int32 offsets from the earliest timestamp and
+    that decoding restores the original events.
+    """
+    evs = np.concatenate(moving_blob_chunks(n_chunks=4))
+    evs["t"] += T0
+    rel, origin = encode_times(evs)
+    assert rel["t"].dtype == np.int32
+    assert rel.dtype.itemsize < evs.dtype.itemsize
+    assert origin == evs["t"].min()
+    np.testing.assert_array_equal(decode_times(rel, origin), evs)
+
+
+def test_offsets_fall_back_to_int64():
+    """
+    Test that offsets too large for int32 stay int64 and that float times keep
+    their dtype when an origin is given.
+    """
+    t = np.array([0, 2**40], dtype=np.int64) + T0
+    offsets, origin = time_offsets(t)
+    assert offsets.dtype == np.int64
+    assert origin == T0
+    offsets, origin = time_offsets(t.astype(np.float64), origin=T0)
+    assert offsets.tolist() == [0.0, 2.0**40]
+
+
+def test_particle_times_keep_full_precision():
+    """
+    Test that centroids of timestamps near 1e10 are the exact mean offset
+    plus the origin.
+    """
+    evs = array_events(
+        [(10, 10, T0 + 1, 1), (11, 10, T0 + 2, 1), (10, 11, T0 + 4, 1), (30, 30, T0, 1)]
+    )
+    particles = ev_particlefinder(evs, min_area=3, h=64, w=64)
+    assert particles["t"].tolist() == [T0 + 7 / 3]
+    tiled = tiled_particlefinder(evs, min_area=3, tile_shape=(11, 11), h=64, w=64)
+    np.testing.assert_array_equal(tiled, particles)
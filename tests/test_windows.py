@@ -0,0 +1,72 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from eventcamprocessing.filter_funcs import accumulate_events
+from eventcamprocessing.synthetic import synthetic_events
+from eventcamprocessing.windows import count_windows, time_windows
+
+
+@pytest.fixture
+def events():
+    return synthetic_events(20_000, event_rate=1e6, t0=1234)
+
+
+def test_centered_windows_match_masks(events):
+    """
+    Test that centered windows hold the same events as a boolean mask per window.
+    """
+    windows = list(time_windows(events, t_step=1000, t_window=3000))
+    centers = np.arange(events["t"].min(), events["t"].max(), 1000)
+
+    assert len(windows) == len(centers)
+    for window, c in zip(windows, centers, strict=True):
+        mask = (events["t"] >= c - 1500) & (events["t"] < c + 1500)
+        np.testing.assert_array_equal(window, events[mask])
+        assert window.base is not None  # a view, not a copy
+
+
+@pytest.mark.parametrize(("t_step", "t_accum_us"), [(1000, 2500), (2000, 500)])
+def test_trailing_windows_match_accumulate_events(events, t_step, t_accum_us):
+    """
+    Test that trailing windows equal the windows built by accumulate_events
+    from EventsIterator-like chunks.
+    """
+    t0 = (events["t"][0] // t_step) * t_step
+    edges = np.arange(t0, events["t"][-1] + t_step + 1, t_step)
+    chunks = [
+        events[(events["t"] >= a) & (events["t"] < b)]
+        for a, b in itertools.pairwise(edges)
+    ]
+
+    window = None
+    expected = []
+    for chunk in chunks:
+        window = accumulate_events(window, chunk, t_accum_us)
+        expected.append(window)
+
+    windows = list(time_windows(events, t_step, t_accum_us, mode="trailing"))
+    assert len(windows) == len(expected)
+    for got, want in zip(windows, expected, strict=True):
+        np.testing.assert_array_equal(got, want)
+
+
+def test_count_windows(events):
+    """
+    Test non-overlapping and overlapping event-count windows.
+    """
+    windows = list(count_windows(events, 3000))
+    assert [len(w) for w in windows] == [3000] * 6 + [2000]
+    np.testing.assert_array_equal(np.concatenate(windows), events)
+
+    overlapping = list(count_windows(events[:10], 4, n_step=2))
+    assert [len(w) for w in overlapping] == [4, 4, 4, 4]
+
+
+def test_time_windows_requires_sorted_events(events):
+    """
+    Test that unsorted input is rejected.
+    """
+    with pytest.raises(ValueError, match="sorted"):
+        next(time_windows(events[::-1], t_step=1000, t_window=1000))